@@ -1,25 +1,160 @@
-import json
+import re
+import threading
+import time
 import streamlit as st
-import google.generativeai as genai
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-def generate_draft_equipment(api_key, task_name, location, risk_factors, risk_context_manual, ref_vocab_text, ref_data_text):
-    """1단계: 장비 및 준비물 추천 초안 생성"""
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-3.1-flash-lite-preview', generation_config={"response_mime_type": "application/json"})
-        
-        req_prompt = f"""
-            건설 안전 전문가로서 다음 작업에 필요한 장비와 준비물을 제안하세요.
-            
-            [작업 정보]
-            - 작업명: {task_name}
-            - 장소: {location}
-            - 위험 특성: {', '.join(risk_factors)}
-            - 기타: {risk_context_manual}
-            
-            {ref_vocab_text}
-            {ref_data_text}
-            
+from modules import safety_cache as cache
+from modules import safety_llm as llm
+from modules import safety_scheduler as scheduler
+from modules import safety_latency as latency
+from modules import safety_json
+from modules import safety_prompt as prompt_builder
+from modules import safety_recommend as recommend
+from modules import safety_validate as validator
+
+MODEL_NAME = 'gemini-3.1-flash-lite-preview'
+GENERATION_CONFIG = {"response_mime_type": "application/json"}
+# 2단계 압축 응답 형식: 단계명은 한 번만 쓰고 그 아래 위험요인을 묶음, 대책은 배열, 짧은 키
+# (n: 단계명, r: 위험요인 목록, h: 위험요인, l: 빈도, s: 강도, t: 대책 목록)
+# Gemini는 속성을 키 알파벳 순서로 생성하므로 위험요인 -> 빈도 -> 강도 -> 대책 순서가 되도록 키를 정함
+RISK_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "n": {"type": "string"},
+            "r": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "h": {"type": "string"},
+                        "l": {"type": "integer"},
+                        "s": {"type": "integer"},
+                        "t": {"type": "array", "items": {"type": "string"}},
+                    },
+                    "required": ["h", "l", "s", "t"],
+                },
+            },
+        },
+        "required": ["n", "r"],
+    },
+}
+RISK_GENERATION_CONFIG = {**GENERATION_CONFIG, "response_schema": RISK_RESPONSE_SCHEMA}
+COMBINED_GENERATION_CONFIG = {**GENERATION_CONFIG, "response_schema": {
+    "type": "object",
+    "properties": {
+        "equipment": {
+            "type": "object",
+            "properties": {key: {"type": "string"} for key in ("protectors", "safety_equip", "tools", "docs")},
+            "required": ["protectors", "safety_equip", "tools", "docs"],
+        },
+        "risks": RISK_RESPONSE_SCHEMA,
+    },
+    "required": ["equipment", "risks"],
+}}
+PARALLEL_MAX_WORKERS = 4
+DRAFT_TIMEOUT_SECONDS = 60
+RISK_TIMEOUT_SECONDS = 180
+FIX_TIMEOUT_SECONDS = 60
+# 프롬프트 토큰 예산 (참고 자료는 우선순위가 낮은 것부터 줄여서 맞춤)
+DRAFT_PROMPT_MAX_TOKENS = 2500
+RISK_PROMPT_MAX_TOKENS = 3500
+COMBINED_PROMPT_MAX_TOKENS = 5000
+REF_VOCAB_MAX_TOKENS = 400
+REF_DATA_MAX_TOKENS = 300
+REF_RISKS_MAX_TOKENS = 1200
+USER_FIELD_MAX_TOKENS = 80
+
+def _clip_user_fields(*fields):
+    """직접 입력한 작업명/위치/기타 위험 특성이 지나치게 길면 USER_FIELD_MAX_TOKENS 이내로 자르기"""
+    return tuple(prompt_builder.clip_text(field, USER_FIELD_MAX_TOKENS) for field in fields)
+
+def _deadline_after(timeout):
+    return time.monotonic() + timeout if timeout else None
+
+def _generate(api_key, prompt, parse, use_cache=True, op="generate", deadline=None, cancel_event=None, report=None, generation_config=GENERATION_CONFIG):
+    """Gemini 호출 후 parse(응답 텍스트, report) 결과 반환
+
+    use_cache=True면 같은 모델/프롬프트의 저장된 응답을 먼저 사용하고, 파싱에 성공한 응답만 캐시에 저장합니다.
+    use_cache=False('새로 생성')면 캐시를 읽지 않고 새 응답으로 덮어씁니다.
+    deadline(time.monotonic() 기준)이 지나거나 cancel_event가 설정되면 중단하고, 응답이 op 종류의
+    최근 지연시간 p95보다 늦어지면 같은 요청을 한 번 더 보내 먼저 온 응답을 사용합니다.
+    손상된 응답에서 일부만 복구했으면(report["dropped"]) 캐시에 저장하지 않습니다.
+    """
+    report = safety_json.new_report(report)
+    backend = llm.get_backend(api_key, MODEL_NAME, generation_config)
+    key = cache.make_cache_key(backend.model_name, prompt, generation_config)
+    if use_cache:
+        cached_text = cache.get_cached_response(key)
+        if cached_text is not None:
+            try:
+                return parse(cached_text, report)
+            except Exception:
+                pass
+    else:
+        cache.record_bypass()
+    
+    # 분당 한도/동시 호출 수 안에서 호출, 같은 프롬프트가 이미 호출 중이면 그 응답을 함께 사용
+    # 한도와 동시 호출 슬롯은 업스트림 요청(첫 요청, 헤지 요청)마다 따로 잡고 그 요청이 끝날 때 반납
+    tokens = prompt_builder.count_tokens(prompt) + scheduler.OUTPUT_TOKEN_ESTIMATE
+    check = lambda: latency.check_deadline(op, deadline, cancel_event)
+
+    def hedged_call():
+        started = threading.Event()
+        attempt = lambda: scheduler.limited(
+            lambda: latency.timed_call(op, lambda: backend.generate(prompt)), tokens, check, started.set)
+        return latency.run_hedged(attempt, op, deadline, cancel_event, started=started)
+
+    while True:
+        try:
+            text = scheduler.call(key, hedged_call, check, deadline, cancel_event)
+            break
+        except (latency.GenerationCancelled, latency.DeadlineExceeded):
+            # 같은 프롬프트를 공유하던 다른 세션이 취소했거나 그 세션의 마감시간이 지난 경우에는 직접 다시 호출
+            if cancel_event is not None and cancel_event.is_set():
+                raise
+            latency.check_deadline(op, deadline)
+    result = parse(text, report)
+    if not report["dropped"]:
+        cache.store_response(key, text)
+    return result
+
+def build_ref_vocab_text(vocab):
+    """참고 용어 dict(카테고리별 용어 목록)를 프롬프트용 '현장 표준 용어' 블록으로 변환"""
+    return f"""[현장 표준 용어 참고 - 반드시 아래 용어를 우선 사용하세요]
+- 보호구 용어: {', '.join(vocab.get('protectors', []))}
+- 안전장비 용어: {', '.join(vocab.get('safety_equip', []))}
+- 공구/장비 용어: {', '.join(vocab.get('tools', []))}
+- 준비자료 용어: {', '.join(vocab.get('docs', []))}
+"""
+
+def build_ref_risks_text(ref_risk_rows):
+    """검색한 참고 위험요인 행 목록을 프롬프트용 '유사 작업 위험성평가 예시' 블록으로 변환"""
+    if not ref_risk_rows:
+        return ""
+    return ''.join([
+        chr(10) + '                [참고: 표준 데이터의 유사 작업 위험성평가 예시 - 아래 내용을 참고하여 비슷한 톤과 표현으로 작성하세요]' + chr(10) +
+        chr(10).join([
+            f"                - 단계: {r.get('step','')}, 위험요인: {r.get('factor','')}, 대책: {r.get('measure','')}"
+            for r in ref_risk_rows
+        ])
+    ])
+
+DRAFT_JSON_FORMAT = """{
+                "protectors": "안전모, 안전화, ...",
+                "safety_equip": "CCTV, 라바콘, ...",
+                "tools": "...",
+                "docs": "..."
+            }"""
+
+def _draft_rule_sections(task_name, ref_vocab_text, ref_data_text):
+    """1단계 참고 자료와 장비 추천 규칙 섹션 (빠른 생성 프롬프트와 공유)"""
+    return [
+        prompt_builder.section("ref_vocab", ref_vocab_text, 2, REF_VOCAB_MAX_TOKENS, per_category=True),
+        prompt_builder.section("ref_data", ref_data_text, 1, REF_DATA_MAX_TOKENS, per_category=True),
+        prompt_builder.section("rules", f"""
             [요청 사항]
             **작업명 "{task_name}"에 정확히 맞는** 장비와 준비물을 추천하세요.
             참고 데이터가 있더라도, 실제 작업 내용과 맞지 않으면 무시하고 작업명에 맞게 새로 작성하세요.
@@ -32,7 +167,7 @@ def generate_draft_equipment(api_key, task_name, location, risk_factors, risk_co
             [중요 규칙]
             - 모든 항목명에 괄호 안 부가설명을 넣지 마세요.
               예: "안전모" (O), "안전모(턱끈포함)" (X), "굴착기" (O), "굴착기(백호우)" (X)
-            - "안전대" 대신 반드시 "전체식 안전벨트"로 작성하세요.
+            - "안전대" 대신 반드시 "{recommend.SAFETY_BELT}"로 작성하세요.
             - 공구/장비명은 현장에서 실제 사용하는 용어를 쓰세요.
             - **[제외 항목]** 스패너, 렌치, 드라이버, 망치 등 작업자가 손으로 들고 다니는 소형 수공구는 절대 포함하지 마세요. (주요 대형 장비 위주로 작성)
             - **[제외 항목]** 샤클, 슬링벨트, 용접봉, 절단석 등 소모성 자재나 너무 세세한 부속품은 제외하세요.
@@ -47,42 +182,113 @@ def generate_draft_equipment(api_key, task_name, location, risk_factors, risk_co
               * 비계/가설: 공구→전동공구 / 안전장비→안전네트, 추락방지망
             - 해당 작업에 실제로 사용하지 않는 장비는 절대 포함하지 마세요.
             - 각 카테고리(보호구, 안전장비, 공구, 준비자료)별로 중요도 순으로 최대 4개까지만 제안하세요. (무조건 5개가 아니라, 해당 작업에 꼭 필요한 것들 위주로 최대 4개)
+            """),
+    ]
+
+def generate_draft_equipment(api_key, task_name, location, risk_factors, risk_context_manual, ref_vocab_text, ref_data_text, use_cache=True, timeout=DRAFT_TIMEOUT_SECONDS, cancel_event=None, repair_report=None, prompt_reports=None):
+    """1단계: 장비 및 준비물 추천 초안 생성"""
+    try:
+        task_name, location, risk_context_manual = _clip_user_fields(task_name, location, risk_context_manual)
+        req_prompt, _ = prompt_builder.build_prompt("draft", [
+            prompt_builder.section("task", f"""
+            건설 안전 전문가로서 다음 작업에 필요한 장비와 준비물을 제안하세요.
             
+            [작업 정보]
+            - 작업명: {task_name}
+            - 장소: {location}
+            - 위험 특성: {', '.join(risk_factors)}
+            - 기타: {risk_context_manual}
+            """),
+            *_draft_rule_sections(task_name, ref_vocab_text, ref_data_text),
+            prompt_builder.section("format", f"""
             [JSON 포맷]
-            {{
-                "protectors": "안전모, 안전화, ...",
-                "safety_equip": "CCTV, 라바콘, ...",
-                "tools": "...",
-                "docs": "..."
-            }}
-            """
+            {DRAFT_JSON_FORMAT}
+            """),
+        ], DRAFT_PROMPT_MAX_TOKENS, prompt_reports)
         
-        response = model.generate_content(req_prompt)
-        return json.loads(response.text)
+        return _generate(api_key, req_prompt, parse_draft_equipment, use_cache, "draft", _deadline_after(timeout), cancel_event, repair_report)
     except Exception as e:
         raise e
 
-def generate_risk_assessment(api_key, task_name, location, risk_factors, risk_context_manual, protectors, safety_equip, tools, materials, ref_vocab_text, ref_risks_text):
-    """2단계: 위험성평가표 생성"""
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-3.1-flash-lite-preview', generation_config={"response_mime_type": "application/json"})
+def parse_draft_equipment(text, report=None):
+    """1단계 응답 텍스트(JSON 객체)를 장비/준비물 dict로 변환 (잘린 응답이면 완성된 항목만 사용)"""
+    draft, _ = safety_json.repair_json_object(text, report)
+    return draft
 
-        prompt = f"""
-        건설 안전 기술사로서 아래 작업에 대한 위험성평가표(JSA)를 작성하세요.
-        
-        [작업 정보]
-        - 작업명: {task_name}
-        - 작업 위치: {location}
-        - 위험 특성: {', '.join(risk_factors)} / {risk_context_manual}
-        - 보호구: {', '.join(protectors)}
-        - 안전장비: {', '.join(safety_equip)}
-        - 사용장비: {', '.join(tools)}
-        - 준비자료: {', '.join(materials)}
-        
-        {ref_vocab_text}
-        {ref_risks_text}
+def explode_measures(row):
+    """위험요인 행 하나를 대책 한 줄당 한 행으로 분리 (DataEditor용)"""
+    measures_text = str(row.get("대책", ""))
+    
+    # Split by newline and remove empty lines
+    meas_lines = [line.strip() for line in measures_text.split('\n') if line.strip()]
+    
+    if not meas_lines:
+        # Fallback if somehow empty
+        meas_lines = ["- 대책을 입력하세요."]
         
+    exploded_rows = []
+    for meas in meas_lines:
+        new_row = row.copy()
+        new_row["대책"] = meas
+        exploded_rows.append(new_row)
+    return exploded_rows
+
+def decode_risk_factor(step_name, factor):
+    """압축 형식의 위험요인 객체({"h", "l", "s", "t": [대책]}) 하나를 대책별 행 목록으로 변환"""
+    if not isinstance(factor, dict):
+        return []
+    measures = factor.get("t") or []
+    if isinstance(measures, str):
+        measures = measures.split('\n')
+    # 모델이 "- "를 붙여 보냈어도 한 번만 붙도록 정리
+    measures = [re.sub(r'^[-•]\s*', '', str(m).strip()) for m in measures]
+    return explode_measures({
+        "단계": step_name,
+        "위험요인": factor.get("h", ""),
+        "대책": '\n'.join(f"- {m}" for m in measures if m),
+        "빈도": factor.get("l"),
+        "강도": factor.get("s"),
+    })
+
+def decode_risk_item(item):
+    """2단계 응답의 항목 하나를 대책별 행 목록으로 변환
+
+    압축 형식의 단계 객체({"n": 단계명, "r": [{"h", "l", "s", "t": [대책]}]})와
+    이전 형식의 행 객체({"단계", "위험요인", "대책", "빈도", "강도"}, 저장된 응답/기록 재생용)를 모두 받습니다.
+    """
+    if "r" not in item:
+        return explode_measures(item)
+    rows = []
+    for factor in item.get("r") or []:
+        rows.extend(decode_risk_factor(item.get("n", ""), factor))
+    return rows
+
+def parse_risk_rows(text, report=None):
+    """2단계 응답 텍스트(JSON 배열)를 DataEditor용 행 목록으로 변환 (대책은 한 줄에 하나씩 분리)
+
+    잘리거나 형식이 틀린 응답이어도 완성된 항목은 모두 살리고, 버린 부분은 report에 기록합니다.
+    """
+    # 코드 블록 표시/앞뒤 설명문/뒤에 붙은 쉼표 등은 복구 파서가 처리
+    raw_data, _ = safety_json.repair_json_array(text, report)
+    exploded_data = []
+    for item in raw_data:
+        exploded_data.extend(decode_risk_item(item))
+    if not exploded_data:
+        raise ValueError("응답에서 위험요인 행을 찾지 못했습니다.")
+    return exploded_data
+
+RISK_JSON_KEYS = 'n: 단계명(단계마다 한 번만), r: 그 단계의 위험요인 목록, h: 위험요인, l: 빈도, s: 강도, t: 대책 목록(대책마다 배열 항목 하나, 앞에 "- " 없이)'
+RISK_JSON_FORMAT = """[
+            {"n": "1) 작업준비", "r": [{"h": "...", "l": 2, "s": 3, "t": ["...", "..."]}, {"h": "...", "l": 1, "s": 2, "t": ["...", "..."]}]},
+            {"n": "2) 본작업: ...", "r": [{"h": "...", "l": 2, "s": 2, "t": ["...", "...", "..."]}]}
+        ]"""
+
+def _risk_rule_sections(ref_vocab_text, ref_risks_text):
+    """2단계 참고 자료와 위험성평가 작성 규칙 섹션 (빠른 생성 프롬프트와 공유)"""
+    return [
+        prompt_builder.section("ref_vocab", ref_vocab_text, 2, REF_VOCAB_MAX_TOKENS, per_category=True),
+        prompt_builder.section("ref_risks", ref_risks_text, 1, REF_RISKS_MAX_TOKENS),
+        prompt_builder.section("rules", f"""
         [작업 규칙]
         1. '작업준비' -> '본작업' -> '작업종료/정리' 3단계를 기본으로 하되, **'본작업'은 반드시 구체적인 단위 작업명으로 세분화해서 작성하세요.** (예: '본작업: 펌프카 설치', '본작업: 타설 진행')
         2. '작업준비' 단계의 맨 첫 번째 행은 반드시 '작업자 개인 보호구 및 복장 상태 확인'에 대한 내용이어야 합니다.
@@ -90,7 +296,7 @@ def generate_risk_assessment(api_key, task_name, location, risk_factors, risk_co
            - **상(6점 이상):** 반드시 **4개 ~ 5개**의 구체적 대책 작성
            - **중(3점 ~ 5점):** 반드시 **3개**의 대책 작성
            - **하(2점 이하):** 반드시 **2개**의 대책 작성
-           **(각 대책의 시작 부분에 반드시 "- "를 붙여서 구분하세요. 줄바꿈은 반드시 '\\n' 문자를 사용하세요. 실제 엔터키 사용 금지)**
+           **(대책은 하나씩 배열 항목으로 나누어 쓰세요.)**
         4. [중요] **위험성 평가 점수(빈도×강도)를 보수적으로 산정하세요.**
            - 무조건적인 고위험 평가를 지양하고, 현실적인 빈도(1~3)와 강도(1~2)를 우선 고려하세요.
            - 특별히 위험한 경우가 아니라면 '상' 등급(6점 이상)이 너무 많이 나오지 않도록 조절하세요.
@@ -106,41 +312,421 @@ def generate_risk_assessment(api_key, task_name, location, risk_factors, risk_co
            - 잘못된 예: "체인 이탈 또는 파손으로 인한 낙하 및 깔림 위험" (X)
            - 올바른 예: "체인 이탈로 인한 자재 낙하 위험" (O) → 별도 행: "인양 자재에 의한 작업자 깔림 위험" (O)
            각 위험요인에 대해 그에 맞는 구체적인 대책을 작성하세요.
+        """),
+    ]
+
+def build_risk_prompt(task_name, location, risk_factors, risk_context_manual, protectors, safety_equip, tools, materials, ref_vocab_text, ref_risks_text, prompt_reports=None):
+    """2단계 위험성평가표 생성 프롬프트 (토큰 예산 적용)"""
+    task_name, location, risk_context_manual = _clip_user_fields(task_name, location, risk_context_manual)
+    prompt, _ = prompt_builder.build_prompt("risk", [
+        prompt_builder.section("task", f"""
+        건설 안전 기술사로서 아래 작업에 대한 위험성평가표(JSA)를 작성하세요.
+        
+        [작업 정보]
+        - 작업명: {task_name}
+        - 작업 위치: {location}
+        - 위험 특성: {', '.join(risk_factors)} / {risk_context_manual}
+        - 보호구: {', '.join(protectors)}
+        - 안전장비: {', '.join(safety_equip)}
+        - 사용장비: {', '.join(tools)}
+        - 준비자료: {', '.join(materials)}
+        """),
+        *_risk_rule_sections(ref_vocab_text, ref_risks_text),
+        prompt_builder.section("format", f"""
+        [JSON 예시] ({RISK_JSON_KEYS})
+        {RISK_JSON_FORMAT}
+        """),
+    ], RISK_PROMPT_MAX_TOKENS, prompt_reports)
+    return prompt
+
+def generate_risk_assessment(api_key, task_name, location, risk_factors, risk_context_manual, protectors, safety_equip, tools, materials, ref_vocab_text, ref_risks_text, use_cache=True, timeout=RISK_TIMEOUT_SECONDS, cancel_event=None, repair_report=None, prompt_reports=None):
+    """2단계: 위험성평가표 생성"""
+    try:
+        prompt = build_risk_prompt(task_name, location, risk_factors, risk_context_manual,
+                                   protectors, safety_equip, tools, materials, ref_vocab_text, ref_risks_text, prompt_reports)
+        return _generate(api_key, prompt, parse_risk_rows, use_cache, "risk", _deadline_after(timeout), cancel_event, repair_report,
+                         RISK_GENERATION_CONFIG)
+    except Exception as e:
+        raise e
+
+def stream_risk_assessment(api_key, task_name, location, risk_factors, risk_context_manual, protectors, safety_equip, tools, materials, ref_vocab_text, ref_risks_text, use_cache=True, timeout=RISK_TIMEOUT_SECONDS, cancel_event=None, repair_report=None, prompt_reports=None):
+    """2단계: 위험성평가표 스트리밍 생성 (위험요인 객체가 완성될 때마다 대책별 행을 바로 반환)
+
+    스트리밍은 헤지하지 않고, 조각이 오지 않는 동안에도 마감시간과 취소 여부를 확인합니다.
+    """
+    deadline = _deadline_after(timeout)
+    repair_report = safety_json.new_report(repair_report)
+    prompt = build_risk_prompt(task_name, location, risk_factors, risk_context_manual,
+                               protectors, safety_equip, tools, materials, ref_vocab_text, ref_risks_text, prompt_reports)
+    backend = llm.get_backend(api_key, MODEL_NAME, RISK_GENERATION_CONFIG)
+    key = cache.make_cache_key(backend.model_name, prompt, RISK_GENERATION_CONFIG)
+    if use_cache:
+        cached_text = cache.get_cached_response(key)
+        if cached_text is not None:
+            try:
+                cached_rows = parse_risk_rows(cached_text, repair_report)
+            except Exception:
+                cached_rows = None
+            if cached_rows is not None:
+                yield from cached_rows
+                return
+    else:
+        cache.record_bypass()
+
+    received = []
+    started = time.monotonic()
+
+    def chunk_texts():
+        check = lambda: latency.check_deadline("risk_stream", deadline, cancel_event)
+        chunks = scheduler.stream(lambda: backend.stream(prompt), prompt_builder.count_tokens(prompt),
+                                  check, deadline, cancel_event)
+        # 첫 조각 전이나 조각 사이에서 응답이 멈춰도 마감시간/취소를 바로 지킴
+        for text in latency.iter_with_deadline(chunks, "risk_stream", deadline, cancel_event):
+            received.append(text)
+            yield text
+
+    texts = chunk_texts()
+    # 압축 형식에서는 단계 객체가 닫히기를 기다리지 않고 "r" 안의 위험요인이 완성될 때마다 먼저 온 "n"과 짝지어 반환
+    for head, item in safety_json.iter_nested_objects(texts, "r", repair_report):
+        if head is None:
+            yield from decode_risk_item(item)
+        else:
+            yield from decode_risk_factor(head.get("n", ""), item)
+    # 배열이 닫힌 뒤 남은 조각까지 받은 뒤, 손상 없이 받은 응답만 캐시에 저장
+    for _ in texts:
+        pass
+    latency.record_latency("risk_stream", time.monotonic() - started)
+    if not repair_report["recovered"]:
+        raise ValueError("응답에서 위험요인 행을 찾지 못했습니다.")
+    if not repair_report["dropped"]:
+        cache.store_response(key, ''.join(received))
+
+def build_step_plan_prompt(task_name, location, risk_factors, risk_context_manual, tools, prompt_reports=None):
+    """단계별 병렬 생성용: 작업 단계 목록만 정하는 짧은 계획 프롬프트"""
+    task_name, location, risk_context_manual = _clip_user_fields(task_name, location, risk_context_manual)
+    prompt, _ = prompt_builder.build_prompt("plan", [prompt_builder.section("task", f"""
+        건설 안전 기술사로서 아래 작업의 위험성평가표(JSA) 작업 단계만 정하세요.
+        
+        [작업 정보]
+        - 작업명: {task_name}
+        - 작업 위치: {location}
+        - 위험 특성: {', '.join(risk_factors)} / {risk_context_manual}
+        - 사용장비: {', '.join(tools)}
+        
+        [규칙]
+        1. 첫 단계는 '1) 작업준비', 마지막 단계는 '작업종료/정리'입니다.
+        2. 그 사이 '본작업'은 실제 작업 순서대로 2~4개의 구체적인 단위 작업명으로 나누세요. (예: '2) 본작업: 펌프카 설치', '3) 본작업: 타설 진행')
+        3. 반드시 JSON 포맷으로만 출력하세요.
         
         [JSON 예시]
+        {{"steps": ["1) 작업준비", "2) 본작업: ...", "3) 본작업: ...", "4) 작업종료/정리"]}}
+        """)], RISK_PROMPT_MAX_TOKENS, prompt_reports)
+    return prompt
+
+def parse_step_plan(text, report=None):
+    """계획 응답에서 단계명 목록 추출 (번호가 빠졌으면 순서대로 붙임)"""
+    plan, _ = safety_json.repair_json_object(text, report)
+    steps = plan.get("steps", []) if isinstance(plan, dict) else plan
+    steps = [str(step).strip() for step in steps if str(step).strip()]
+    if not steps:
+        raise ValueError("작업 단계 목록이 비어 있습니다.")
+    return [step if re.match(r'^\d+\)', step) else f"{i}) {step}" for i, step in enumerate(steps, 1)]
+
+def step_row_range(step):
+    """단계 종류별 위험요인 개수 범위 (전체 12~20개 규칙을 단계별로 나눈 값)"""
+    if "작업준비" in step:
+        return 3, 4
+    if "종료" in step or "정리" in step:
+        return 2, 3
+    return 3, 5
+
+def build_step_prompt(step, steps, task_name, location, risk_factors, risk_context_manual, protectors, safety_equip, tools, materials, ref_vocab_text, ref_risks_text, prompt_reports=None):
+    """단계별 병렬 생성용: 한 단계의 위험요인 행만 작성하는 프롬프트"""
+    min_rows, max_rows = step_row_range(step)
+    first_row_rule = ""
+    if "작업준비" in step:
+        first_row_rule = "- 이 단계의 맨 첫 번째 행은 반드시 '작업자 개인 보호구 및 복장 상태 확인'에 대한 내용이어야 합니다."
+    task_name, location, risk_context_manual = _clip_user_fields(task_name, location, risk_context_manual)
+    prompt, _ = prompt_builder.build_prompt("step", [
+        prompt_builder.section("task", f"""
+        건설 안전 기술사로서 아래 작업의 위험성평가표(JSA) 중 **'{step}' 단계의 행만** 작성하세요.
+        
+        [작업 정보]
+        - 작업명: {task_name}
+        - 작업 위치: {location}
+        - 위험 특성: {', '.join(risk_factors)} / {risk_context_manual}
+        - 보호구: {', '.join(protectors)}
+        - 안전장비: {', '.join(safety_equip)}
+        - 사용장비: {', '.join(tools)}
+        - 준비자료: {', '.join(materials)}
+        - 전체 작업 단계: {' -> '.join(steps)} (다른 단계의 위험요인은 작성하지 마세요)
+        """),
+        prompt_builder.section("ref_vocab", ref_vocab_text, 2, REF_VOCAB_MAX_TOKENS, per_category=True),
+        prompt_builder.section("ref_risks", ref_risks_text, 1, REF_RISKS_MAX_TOKENS),
+        prompt_builder.section("rules", f"""
+        [작업 규칙]
+        - 이 단계의 위험요인을 {min_rows}~{max_rows}개 작성하고, 단계명("n")은 "{step}"로 쓰세요.
+        {first_row_rule}
+        - 위험요인별 대책 개수: 상(6점 이상) 4~5개, 중(3~5점) 3개, 하(2점 이하) 2개.
+          (대책은 하나씩 배열 항목으로 나누어 쓰세요.)
+        - 빈도는 1~5, 강도는 1~4 범위에서 보수적으로 산정하고, 곱(위험성)이 절대 8을 초과하지 않도록 하세요.
+        - 위험요인은 반드시 1가지 위험만 기술하세요. 여러 위험을 "및", "또는"으로 묶지 마세요.
+        - 위 '현장 표준 용어'에 있는 표현을 우선적으로 사용하세요.
+        - 반드시 JSON 포맷으로만 출력하세요. (Markdown 코드 블록 없이 순수 JSON만 출력)
+        
+        [JSON 예시] ({RISK_JSON_KEYS})
         [
-            {{"단계": "1) 작업준비", "위험요인": "...", "대책": "...", "빈도": 2, "강도": 3}},
-            {{"단계": "2) 본작업: ...", "위험요인": "...", "대책": "...", "빈도": 2, "강도": 3}}
+            {{"n": "{step}", "r": [{{"h": "...", "l": 2, "s": 3, "t": ["...", "..."]}}]}}
         ]
-        """
+        """),
+    ], RISK_PROMPT_MAX_TOKENS, prompt_reports)
+    return prompt
+
+def generate_risk_assessment_parallel(api_key, task_name, location, risk_factors, risk_context_manual, protectors, safety_equip, tools, materials, ref_vocab_text, ref_risks_text, use_cache=True, max_workers=PARALLEL_MAX_WORKERS, timeout=RISK_TIMEOUT_SECONDS, cancel_event=None, repair_report=None, prompt_reports=None):
+    """2단계: 단계별 병렬 생성 (계획 호출로 단계 목록을 받은 뒤 단계마다 동시에 생성하여 합침)
+
+    반환 형식은 generate_risk_assessment와 같으며, 전체 소요 시간은 가장 긴 단계의 생성 시간에 가까워집니다.
+    """
+    plan_prompt = build_step_plan_prompt(task_name, location, risk_factors, risk_context_manual, tools, prompt_reports)
+    deadline = _deadline_after(timeout)
+    repair_report = safety_json.new_report(repair_report)
+    steps = _generate(api_key, plan_prompt, parse_step_plan, use_cache, "plan", deadline, cancel_event, repair_report)
+
+    step_prompts = [
+        build_step_prompt(step, steps, task_name, location, risk_factors, risk_context_manual,
+                          protectors, safety_equip, tools, materials, ref_vocab_text, ref_risks_text, prompt_reports)
+        for step in steps
+    ]
+    # 단계별 복구 보고는 스레드마다 따로 받은 뒤 합침
+    step_reports = [safety_json.new_report() for _ in steps]
+    # 한 단계가 실패하거나 사용자가 취소하면 나머지 단계의 호출도 바로 멈춤
+    step_cancel = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(steps))))
+    futures = {
+        executor.submit(_generate, api_key, prompt, parse_risk_rows, use_cache, "step", deadline, step_cancel, step_report,
+                        RISK_GENERATION_CONFIG): i
+        for i, (prompt, step_report) in enumerate(zip(step_prompts, step_reports))
+    }
+    step_results = [None] * len(steps)
+    pending = set(futures)
+    try:
+        # 끝나는 순서대로 확인하여 첫 실패를 바로 전달 (사용자 취소도 POLL_SECONDS마다 확인)
+        while pending:
+            done, pending = wait(pending, timeout=latency.POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                step_results[futures[future]] = future.result()
+            if cancel_event is not None and cancel_event.is_set():
+                step_cancel.set()
+    except BaseException:
+        step_cancel.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+    for step_report in step_reports:
+        for field in ("recovered", "repaired"):
+            repair_report[field] += step_report[field]
+        repair_report["dropped"].extend(step_report["dropped"])
+
+    # 단계 순서대로 합치고, 모델이 단계명을 다르게 적었더라도 계획된 단계명으로 통일
+    rows = []
+    for step, step_rows in zip(steps, step_results):
+        for row in step_rows:
+            row["단계"] = step
+            rows.append(row)
+    return rows
+
+def build_combined_prompt(task_name, location, risk_factors, risk_context_manual, ref_vocab_text, ref_data_text, ref_risks_text, prompt_reports=None):
+    """빠른 생성: 장비 추천(1단계)과 위험성평가표(2단계)를 한 번에 요청하는 프롬프트 (규칙은 두 단계와 공유)"""
+    task_name, location, risk_context_manual = _clip_user_fields(task_name, location, risk_context_manual)
+    # 참고 용어 섹션은 1단계 규칙 쪽에 한 번만 넣음
+    risk_sections = [sec for sec in _risk_rule_sections(ref_vocab_text, ref_risks_text) if sec["name"] != "ref_vocab"]
+    prompt, _ = prompt_builder.build_prompt("combined", [
+        prompt_builder.section("task", f"""
+        건설 안전 기술사로서 아래 작업에 필요한 장비와 준비물을 추천하고, 추천한 장비를 사용한다고 보고 위험성평가표(JSA)까지 한 번에 작성하세요.
         
-        response = model.generate_content(prompt)
+        [작업 정보]
+        - 작업명: {task_name}
+        - 작업 위치: {location}
+        - 위험 특성: {', '.join(risk_factors)} / {risk_context_manual}
+        """),
+        *_draft_rule_sections(task_name, ref_vocab_text, ref_data_text),
+        *risk_sections,
+        prompt_builder.section("format", f"""
+        [JSON 포맷] "equipment"에는 장비 추천, "risks"에는 위험성평가표를 넣으세요. (risks 키: {RISK_JSON_KEYS})
+        {{"equipment": {DRAFT_JSON_FORMAT},
+        "risks": {RISK_JSON_FORMAT}}}
+        """),
+    ], COMBINED_PROMPT_MAX_TOKENS, prompt_reports)
+    return prompt
+
+def parse_combined(text, report=None):
+    """빠른 생성 응답을 {"draft": 장비 추천 dict, "rows": 대책별로 나뉜 위험성평가 행} 으로 변환"""
+    data, _ = safety_json.repair_json_object(text, report)
+    draft = data.get("equipment")
+    risks = data.get("risks")
+    if not isinstance(draft, dict) or not isinstance(risks, list):
+        raise ValueError("응답에 장비 추천(equipment)과 위험성평가표(risks)가 모두 있어야 합니다.")
+    rows = []
+    for item in risks:
+        if isinstance(item, dict):
+            rows.extend(decode_risk_item(item))
+    if not rows:
+        raise ValueError("응답에서 위험요인 행을 찾지 못했습니다.")
+    return {"draft": draft, "rows": rows}
+
+def generate_combined(api_key, task_name, location, risk_factors, risk_context_manual, ref_vocab_text, ref_data_text, ref_risks_text, use_cache=True, timeout=RISK_TIMEOUT_SECONDS, cancel_event=None, repair_report=None, prompt_reports=None):
+    """빠른 생성: 장비 추천과 위험성평가표를 한 번의 호출로 생성 (1단계 추천을 그대로 쓰는 경우 왕복 1회 절약)"""
+    prompt = build_combined_prompt(task_name, location, risk_factors, risk_context_manual,
+                                   ref_vocab_text, ref_data_text, ref_risks_text, prompt_reports)
+    return _generate(api_key, prompt, parse_combined, use_cache, "combined", _deadline_after(timeout), cancel_event, repair_report,
+                     COMBINED_GENERATION_CONFIG)
+
+def build_fix_prompt(task_name, location, risk_factors, risk_context_manual, protectors, safety_equip, tools, materials, ref_vocab_text, unfixed):
+    """자동 보정으로 고치지 못한 규칙 위반(위험요인 부족, 대책 부족)만 채우는 보완 요청 프롬프트"""
+    requests = []
+    for issue in unfixed:
+        if issue["rule"] == "factor_count":
+            steps = ', '.join(f"{step}({count}개)" for step, count in issue["steps"].items())
+            requests.append(
+                f"- 위험요인 {issue['missing']}개를 새로 추가하세요. 현재 단계별 개수: {steps}\n"
+                f"  이미 있는 위험요인과 겹치지 않게 작성하세요: {' / '.join(issue['factors'])}")
+        elif issue["rule"] == "measure_count":
+            requests.append(
+                f"- 단계 \"{issue['step']}\"의 위험요인 \"{issue['factor']}\"에 대책 {issue['missing']}개를 추가하세요. "
+                f"(단계명 \"n\"과 위험요인 \"h\"는 그대로 쓰고, 기존 대책과 겹치지 않게: {' '.join(issue['measures'])})")
+    task_name, location, risk_context_manual = _clip_user_fields(task_name, location, risk_context_manual)
+    prompt, _ = prompt_builder.build_prompt("fix", [
+        prompt_builder.section("task", f"""
+        건설 안전 기술사로서 작성 중인 위험성평가표(JSA)에서 부족한 부분만 보완하세요.
         
-        # JSON 파싱 전처리
-        text = response.text
-        if "```json" in text:
-            text = text.replace("```json", "").replace("```", "")
-        text = text.strip()
+        [작업 정보]
+        - 작업명: {task_name}
+        - 작업 위치: {location}
+        - 위험 특성: {', '.join(risk_factors)} / {risk_context_manual}
+        - 보호구: {', '.join(protectors)}
+        - 안전장비: {', '.join(safety_equip)}
+        - 사용장비: {', '.join(tools)}
+        - 준비자료: {', '.join(materials)}
+        """),
+        prompt_builder.section("ref_vocab", ref_vocab_text, 2, REF_VOCAB_MAX_TOKENS, per_category=True),
+        prompt_builder.section("rules", f"""
+        [보완 요청]
+        {chr(10).join(requests)}
         
-        raw_data = json.loads(text, strict=False)
+        [작업 규칙]
+        - 추가할 위험요인/대책만 출력하세요. 기존 대책은 다시 출력하지 마세요.
+        - 새 위험요인의 대책 개수: 상(6점 이상) 4~5개, 중(3~5점) 3개, 하(2점 이하) 2개.
+          (대책은 하나씩 배열 항목으로 나누어 쓰세요.)
+        - 빈도는 1~5, 강도는 1~4 범위에서 보수적으로 산정하고, 곱(위험성)이 절대 8을 초과하지 않도록 하세요.
+        - 반드시 JSON 포맷으로만 출력하세요. (Markdown 코드 블록 없이 순수 JSON만 출력)
         
-        # [NEW] Explode multiline '대책' into separate rows for DataEditor UI
-        exploded_data = []
-        for row in raw_data:
-            measures_text = str(row.get("대책", ""))
-            
-            # Split by newline and remove empty lines
-            meas_lines = [line.strip() for line in measures_text.split('\n') if line.strip()]
-            
-            if not meas_lines:
-                # Fallback if somehow empty
-                meas_lines = ["- 대책을 입력하세요."]
-                
-            for meas in meas_lines:
-                new_row = row.copy()
-                new_row["대책"] = meas
-                exploded_data.append(new_row)
-            
-        return exploded_data
+        [JSON 예시] ({RISK_JSON_KEYS})
+        [
+            {{"n": "...", "r": [{{"h": "...", "l": 2, "s": 3, "t": ["...", "..."]}}]}}
+        ]
+        """),
+    ], RISK_PROMPT_MAX_TOKENS)
+    return prompt
+
+def complete_risk_rows(api_key, rows, task_name, location, risk_factors, risk_context_manual, protectors, safety_equip, tools, materials, ref_vocab_text, reference_rows=None, use_cache=True, timeout=FIX_TIMEOUT_SECONDS, cancel_event=None, validation_report=None):
+    """2단계 결과에 규칙 검사/자동 보정을 적용하고, 고치지 못한 부분만 한 번 더 요청해서 합침
+
+    validation_report에는 보정 내용(fixed)과 보완 요청 후에도 남은 규칙 위반(unfixed)이 기록됩니다.
+    보완 요청이 실패하면 자동 보정한 결과를 그대로 반환합니다. (취소는 그대로 전달)
+    """
+    report = validation_report if validation_report is not None else {}
+    rows, first = validator.validate_and_fix(rows, reference_rows, protectors)
+    report.update(first)
+    if not first["unfixed"]:
+        return rows
+
+    prompt = build_fix_prompt(task_name, location, risk_factors, risk_context_manual,
+                              protectors, safety_equip, tools, materials, ref_vocab_text, first["unfixed"])
+    try:
+        extra_rows = _generate(api_key, prompt, parse_risk_rows, use_cache, "fix", _deadline_after(timeout), cancel_event,
+                               generation_config=RISK_GENERATION_CONFIG)
+    except latency.GenerationCancelled:
+        raise
     except Exception as e:
-        raise e
+        report["reprompt_error"] = str(e)
+        return rows
+    rows, second = validator.validate_and_fix(validator.merge_rows(rows, extra_rows), reference_rows, protectors)
+    report["fixed"] = first["fixed"] + [f for f in second["fixed"] if f not in first["fixed"]] + ["부족한 부분을 AI에 한 번 더 요청해 보완"]
+    report["unfixed"] = second["unfixed"]
+    return rows
+
+def build_regenerate_prompt(step, factor, current_rows, task_name, location, risk_factors, risk_context_manual, protectors, safety_equip, tools, materials, ref_vocab_text):
+    """부분 재생성: 한 단계(factor=None) 또는 한 위험요인만 다시 작성하는 프롬프트 (해당 부분과 최소한의 작업 정보만 전달)"""
+    current = {}
+    for row in current_rows:
+        if row["단계"] == step:
+            current.setdefault(row["위험요인"], []).append(str(row["대책"]))
+    current_text = '\n'.join(f"        - {name}: {' '.join(measures)}" for name, measures in current.items())
+    if factor is None:
+        min_rows, max_rows = step_row_range(step)
+        target = f"**'{step}' 단계의 행만** 다시 작성하세요. 아래 현재 내용보다 구체적이고 현장에 맞게 고치세요."
+        scope_rule = f"- 이 단계의 위험요인을 {min_rows}~{max_rows}개 작성하세요."
+        if "작업준비" in step:
+            scope_rule += "\n        - 이 단계의 맨 첫 번째 행은 반드시 '작업자 개인 보호구 및 복장 상태 확인'에 대한 내용이어야 합니다."
+    else:
+        target = f"**'{step}' 단계의 행만** 대상으로, 위험요인 \"{factor}\" 하나만 다시 작성하세요."
+        scope_rule = "- 위험요인은 1개만 출력하세요. 같은 단계의 다른 위험요인과 겹치지 않게 하세요."
+    task_name, location, risk_context_manual = _clip_user_fields(task_name, location, risk_context_manual)
+    prompt, _ = prompt_builder.build_prompt("regenerate", [
+        prompt_builder.section("task", f"""
+        건설 안전 기술사로서 작성된 위험성평가표(JSA)의 일부를 {target}
+        
+        [작업 정보]
+        - 작업명: {task_name}
+        - 작업 위치: {location}
+        - 위험 특성: {', '.join(risk_factors)} / {risk_context_manual}
+        - 보호구: {', '.join(protectors)}
+        - 안전장비: {', '.join(safety_equip)}
+        - 사용장비: {', '.join(tools)}
+        - 준비자료: {', '.join(materials)}
+        
+        [현재 '{step}' 단계 내용 (위험요인: 대책)]
+{current_text}
+        """),
+        prompt_builder.section("ref_vocab", ref_vocab_text, 2, REF_VOCAB_MAX_TOKENS, per_category=True),
+        prompt_builder.section("rules", f"""
+        [작업 규칙]
+        {scope_rule}
+        - 단계명("n")은 "{step}"로 쓰세요.
+        - 위험요인별 대책 개수: 상(6점 이상) 4~5개, 중(3~5점) 3개, 하(2점 이하) 2개.
+          (대책은 하나씩 배열 항목으로 나누어 쓰세요.)
+        - 빈도는 1~5, 강도는 1~4 범위에서 보수적으로 산정하고, 곱(위험성)이 절대 8을 초과하지 않도록 하세요.
+        - 위험요인은 반드시 1가지 위험만 기술하세요. 여러 위험을 "및", "또는"으로 묶지 마세요.
+        - 위 '현장 표준 용어'에 있는 표현을 우선적으로 사용하세요.
+        - 반드시 JSON 포맷으로만 출력하세요. (Markdown 코드 블록 없이 순수 JSON만 출력)
+        
+        [JSON 예시] ({RISK_JSON_KEYS})
+        [
+            {{"n": "{step}", "r": [{{"h": "...", "l": 2, "s": 3, "t": ["...", "..."]}}]}}
+        ]
+        """),
+    ], RISK_PROMPT_MAX_TOKENS)
+    return prompt
+
+def regenerate_rows(api_key, rows, step, factor, task_name, location, risk_factors, risk_context_manual, protectors, safety_equip, tools, materials, ref_vocab_text, timeout=RISK_TIMEOUT_SECONDS, cancel_event=None):
+    """부분 재생성: 결과표(rows) 중 한 단계 또는 한 위험요인만 새로 생성한 대책별 행 목록 반환 (결과표에 끼워 넣는 것은 호출한 쪽에서)
+
+    같은 부분을 다시 누르면 다른 결과가 나와야 하므로 저장된 응답은 사용하지 않습니다.
+    """
+    prompt = build_regenerate_prompt(step, factor, rows, task_name, location, risk_factors, risk_context_manual,
+                                     protectors, safety_equip, tools, materials, ref_vocab_text)
+    new_rows = _generate(api_key, prompt, parse_risk_rows, False, "regenerate", _deadline_after(timeout), cancel_event,
+                         generation_config=RISK_GENERATION_CONFIG)
+    for row in new_rows:
+        row["단계"] = step
+    if factor is not None:
+        # 위험요인 하나만 요청했으므로 같은 이름의 위험요인(없으면 첫 위험요인)만 사용
+        names = [row["위험요인"] for row in new_rows if str(row.get("위험요인") or "").strip()]
+        if not names:
+            raise ValueError("응답에서 다시 생성한 위험요인을 찾지 못했습니다.")
+        keep = factor if factor in names else names[0]
+        new_rows = [row for row in new_rows if row["위험요인"] == keep]
+    # 전체 생성과 같은 행 단위 보정 ('작업준비' 단계나 그 보호구 확인 행을 다시 만들었으면 보호구 행도 맞춤)
+    ppe_row = "준비" in step and (factor is None or re.search(validator.PPE_PATTERN, factor) is not None)
+    rows, _ = validator.normalize_rows(new_rows, protectors=protectors, ppe_row=ppe_row)
+    return rows
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Gemini 응답 캐시 (메모리 LRU + 디스크 SQLite)
+# 같은 현장에서 같은 작업을 같은 조건으로 다시 생성하면 API를 호출하지 않고 저장된 응답을 돌려줍니다.
+
+CACHE_DIR = '.cache'
+DISK_CACHE_PATH = os.path.join(CACHE_DIR, 'gemini_responses.db')
+MEMORY_CACHE_SIZE = 256
+DISK_CACHE_TTL_SECONDS = 7 * 24 * 3600
+DISK_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+_memory = OrderedDict()  # key -> (저장 시각, 응답 텍스트)
+_lock = threading.Lock()
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "bypassed": 0}
+_disk_ready = False
+
+def make_cache_key(model_name, prompt, generation_config=None):
+    """모델명 + 정규화된 프롬프트(줄 앞뒤 공백/빈 줄 제거) + 생성 설정의 해시"""
+    lines = [re.sub(r'\s+', ' ', line).strip() for line in str(prompt).splitlines()]
+    normalized = '\n'.join(line for line in lines if line)
+    payload = f"{model_name}\n{sorted((generation_config or {}).items())!r}\n{normalized}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _connect():
+    global _disk_ready
+    conn = sqlite3.connect(DISK_CACHE_PATH, timeout=5)
+    if not _disk_ready:
+        conn.execute("""CREATE TABLE IF NOT EXISTS responses(
+            key TEXT PRIMARY KEY, text TEXT, size INTEGER, created REAL, accessed REAL)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        _disk_ready = True
+    return conn
+
+def _remember(key, created, text):
+    _memory[key] = (created, text)
+    _memory.move_to_end(key)
+    while len(_memory) > MEMORY_CACHE_SIZE:
+        _memory.popitem(last=False)
+
+def get_cached_response(key):
+    """캐시된 응답 텍스트 반환 (없거나 TTL이 지났으면 None)"""
+    now = time.time()
+    with _lock:
+        hit = _memory.get(key)
+        if hit is not None and now - hit[0] <= DISK_CACHE_TTL_SECONDS:
+            _memory.move_to_end(key)
+            _stats["memory_hits"] += 1
+            return hit[1]
+        _memory.pop(key, None)
+
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute("SELECT text, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] <= DISK_CACHE_TTL_SECONDS:
+                conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                conn.commit()
+                with _lock:
+                    _remember(key, row[1], row[0])
+                    _stats["disk_hits"] += 1
+                return row[0]
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
+
+    with _lock:
+        _stats["misses"] += 1
+    return None
+
+def store_response(key, text):
+    """응답 저장 (메모리 + 디스크). 디스크 용량이 DISK_CACHE_MAX_BYTES를 넘으면 오래 안 쓴 것부터 삭제"""
+    now = time.time()
+    with _lock:
+        _remember(key, now, text)
+        _stats["stores"] += 1
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        conn = _connect()
+        try:
+            size = len(text.encode('utf-8'))
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, text, size, now, now))
+            conn.execute("DELETE FROM responses WHERE created < ?", (now - DISK_CACHE_TTL_SECONDS,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > DISK_CACHE_MAX_BYTES:
+                # 오래 사용하지 않은 순서로 용량 제한 아래가 될 때까지 삭제
+                excess = total - DISK_CACHE_MAX_BYTES
+                conn.execute("""DELETE FROM responses WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, size, SUM(size) OVER (ORDER BY accessed, key) AS running FROM responses
+                    ) WHERE running - size < ?)""", (excess,))
+            conn.commit()
+        finally:
+            conn.close()
+    except (OSError, sqlite3.Error):
+        # 디스크에 쓸 수 없는 환경에서는 메모리 캐시만 사용
+        pass
+
+def record_bypass():
+    """'새로 생성'으로 캐시를 건너뛴 횟수 기록"""
+    with _lock:
+        _stats["bypassed"] += 1
+
+def get_cache_stats():
+    """캐시 통계: 메모리/디스크 hit, miss, 저장, 우회 횟수"""
+    with _lock:
+        return dict(_stats, memory_entries=len(_memory))
+
+def clear_cache():
+    """메모리/디스크 캐시 모두 삭제"""
+    with _lock:
+        _memory.clear()
+    try:
+        conn = _connect()
+        try:
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
@@ -1,6 +1,16 @@
+import hashlib
 import json
+import os
+import pickle
 import re
-import streamlit as st
+import threading
+import time
+from types import MappingProxyType
+
+import numpy as np
+
+from modules.safety_recommend import SAFETY_BELT, build_equipment_recommender
+from modules.safety_search import build_name_matcher, build_risk_search_index, fuzzy_match
 
 def parse_to_list(text_data):
     if isinstance(text_data, list):
@@ -18,140 +28,487 @@ def clean_item_list(items):
         
         # Specific replacements
         if "안전대" in new_item and "벨트" not in new_item:
-            new_item = "전체식 안전벨트"
+            new_item = SAFETY_BELT
         
         if new_item:
             cleaned.append(new_item)
     # Remove duplicates while preserving order
     return list(dict.fromkeys(cleaned))
 
-@st.cache_data
-def load_safety_index():
-    """safety_data.json의 모든 단위작업을 인덱싱하여 키워드 매칭이 가능하게 함"""
-    try:
-        with open('safety_data.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except:
-        return [], {}, {}
-    
-    index = []  # [{name, keywords, data, division, work_type, path}, ...]
-    all_vocab = {"protectors": set(), "safety_equip": set(), "tools": set(), "docs": set()}
-    
-    # 키워드 추출 함수: 번호/괄호 제거 후 핵심 단어만 추출
-    def extract_keywords(text):
-        # 번호 제거: "1) 가설공사" -> "가설공사", "(7) 콘크리트 타설 및 양생" -> "콘크리트 타설 및 양생"
-        cleaned = re.sub(r'^\d+\)\s*', '', text)
-        cleaned = re.sub(r'^\(\d+\)\s*', '', cleaned)
-        # 공백, 특수문자로 분리
-        words = re.split(r'[\s,/·및\-_]+', cleaned)
-        # 의미있는 단어만 (1글자 이상)
-        keywords = set()
-        for w in words:
-            w = w.strip()
-            if len(w) >= 1:
-                keywords.add(w.lower())
-        return keywords
-    
-    # 동의어 매핑 (사용자가 입력할 수 있는 다양한 표현 대응)
-    synonym_map = {
-        'mat': ['콘크리트', '타설', 'mat'],
-        '타설': ['콘크리트', '타설', '양생'],
-        '콘크리트': ['콘크리트', '타설', 'conc', 'rc'],
-        '비계': ['비계', '가설', '스캐폴딩'],
-        '용접': ['용접', '화기'],
-        '배관': ['배관', '파이프', 'pipe'],
-        '도장': ['도장', '페인트', '방청'],
-        '철근': ['철근', '배근', 'conc', 'rc'],
-        '토공': ['토공', '굴착', '되메우기', '터파기'],
-        '굴착': ['토공', '굴착', '터파기'],
-        '방수': ['방수', '우레탄', '아스팔트', '시트'],
-        '거푸집': ['거푸집', '폼', '형틀', '탈형'],
-        '양중': ['양중', '크레인', '인양'],
-        '크레인': ['양중', '크레인', '인양'],
-        '해체': ['해체', '철거', '잔재물'],
-        '전기': ['전기', '배선', '케이블'],
-        '철골': ['철골', '강구조', 'steel'],
-        '포장': ['포장', '아스팔트', '아스콘'],
+DATA_PATH = 'safety_data.json'
+SNAPSHOT_VERSION = 8
+# 자모 n-gram 유사도가 이 값 이상인 항목만 작업명 검색 후보로 추가
+FUZZY_MIN_SIMILARITY = 0.2
+
+# 동의어 매핑 (사용자가 입력할 수 있는 다양한 표현 대응)
+SYNONYM_MAP = {
+    'mat': ['콘크리트', '타설', 'mat'],
+    '타설': ['콘크리트', '타설', '양생'],
+    '콘크리트': ['콘크리트', '타설', 'conc', 'rc'],
+    '비계': ['비계', '가설', '스캐폴딩'],
+    '용접': ['용접', '화기'],
+    '배관': ['배관', '파이프', 'pipe'],
+    '도장': ['도장', '페인트', '방청'],
+    '철근': ['철근', '배근', 'conc', 'rc'],
+    '토공': ['토공', '굴착', '되메우기', '터파기'],
+    '굴착': ['토공', '굴착', '터파기'],
+    '방수': ['방수', '우레탄', '아스팔트', '시트'],
+    '거푸집': ['거푸집', '폼', '형틀', '탈형'],
+    '양중': ['양중', '크레인', '인양'],
+    '크레인': ['양중', '크레인', '인양'],
+    '해체': ['해체', '철거', '잔재물'],
+    '전기': ['전기', '배선', '케이블'],
+    '철골': ['철골', '강구조', 'steel'],
+    '포장': ['포장', '아스팔트', '아스콘'],
+}
+
+def extract_keywords(text):
+    """번호/괄호 제거 후 핵심 단어만 추출"""
+    # 번호 제거: "①토목공사" -> "토목공사", "전기공사 – (1) Cable Tray 설치" -> "전기공사 Cable Tray 설치"
+    cleaned = re.sub(r'^\d+\)\s*', '', text.strip())
+    cleaned = re.sub(r'\(\d+\)|[\u2460-\u2473]', ' ', cleaned)
+    # 공백, 특수문자로 분리
+    words = re.split(r'[\s,/·및\-_–]+', cleaned)
+    # 의미있는 단어만 (1글자 이상)
+    keywords = set()
+    for w in words:
+        w = w.strip()
+        if len(w) >= 1:
+            keywords.add(w.lower())
+    return keywords
+
+def clean_risk_text(text):
+    """원본 데이터의 줄 넘김 문자(\\x0b) 정리: 대책 구분("- ")은 줄바꿈, 나머지는 공백으로"""
+    text = re.sub(r'\s*\x0b\s*(?=-)', '\n', str(text))
+    text = re.sub(r'[ \t]*\x0b\s*', ' ', text)
+    return text.strip()
+
+def iter_unit_works(node, path=()):
+    """임의 깊이의 트리에서 단위작업(protectors 필드를 가진 dict)을 찾아 (경로, 데이터)로 반환"""
+    if not isinstance(node, dict):
+        return
+    for key, value in node.items():
+        if not isinstance(value, dict):
+            continue
+        if "protectors" in value:
+            yield path + (key,), value
+        else:
+            yield from iter_unit_works(value, path + (key,))
+
+def _content_hash(node):
+    # 키 순서까지 포함해 해시 (공종 안의 단위작업 순서가 바뀌면 항목 id도 바뀌므로 다른 내용으로 취급)
+    return hashlib.sha1(json.dumps(node, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+VOCAB_CATEGORIES = ("protectors", "safety_equip", "tools", "docs")
+# 프롬프트에 넣을 카테고리별 참고 용어 개수
+VOCAB_LIMITS = {"protectors": 12, "safety_equip": 12, "tools": 12, "docs": 8}
+
+def rank_terms(counts):
+    """{용어: 빈도} -> 빈도 내림차순(동률은 가나다순) 용어 목록"""
+    return [term for term, _ in sorted(counts.items(), key=lambda pair: (-pair[1], pair[0]))]
+
+def vocab_items(unit_work_data):
+    """단위작업 한 개가 기여하는 (카테고리, 용어) 목록 (프롬프트 참고용 용어 수집)"""
+    for item in unit_work_data.get("protectors", "").split(','):
+        cleaned = re.sub(r'\([^)]*\)', '', item).strip()
+        if cleaned:
+            yield "protectors", cleaned
+    for category in ("safety_equip", "tools", "docs"):
+        for item in unit_work_data.get(category, "").split(','):
+            if item.strip():
+                yield category, item.strip()
+
+def build_entry(path, unit_work_data, entry_id, synonym_map, source_hash):
+    unit_work_name = path[-1]
+    # 2단계(공종 > 단위작업)면 공종이 곧 작업유형
+    division_name = path[0] if len(path) > 1 else ""
+    work_type_name = path[-2] if len(path) > 1 else ""
+    
+    keywords = extract_keywords(unit_work_name)
+    keywords.update(extract_keywords(work_type_name))
+    
+    return {
+        "id": entry_id,
+        "name": unit_work_name,
+        "keywords": keywords,
+        "expanded_keywords": expand_keywords(keywords, synonym_map),
+        "data": {
+            "protectors": unit_work_data.get("protectors", ""),
+            "safety_equip": unit_work_data.get("safety_equip", ""),
+            "tools": unit_work_data.get("tools", ""),
+            "docs": unit_work_data.get("docs", ""),
+        },
+        "risks": [
+            {k: clean_risk_text(r.get(k, "")) for k in ("step", "factor", "measure")}
+            for r in unit_work_data.get("risks", []) if isinstance(r, dict)
+        ],
+        "division": division_name,
+        "work_type": work_type_name,
+        "path": " > ".join(path),
+        "source_path": tuple(path),
+        "source_hash": source_hash,
     }
+
+def compile_safety_index(data, synonym_map=SYNONYM_MAP):
+    """safety_data.json 트리를 검색용 인덱스(항목, 키워드, 용어, 동의어 확장)로 컴파일"""
+    return update_compiled_index(None, data, synonym_map)
+
+def update_compiled_index(previous, data, synonym_map=SYNONYM_MAP):
+    """이전 컴파일 결과(previous)를 기준으로 바뀐 공종/단위작업만 다시 인덱싱
+
+    - 최상위 공종의 내용 해시가 같으면 해당 공종의 항목을 그대로 재사용
+    - 바뀐 공종 안에서는 단위작업 해시를 비교하여 바뀐 항목만 다시 생성
+    - 용어 빈도와 posting list는 삭제/추가된 항목분만 빼고 더함
+      (추가/삭제/순서 변경으로 id가 밀린 경우에는 전체 posting id를 재배치)
+    - 위험요인 BM25 / 자모 유사도 인덱스와 장비 추천 통계는 전체 문서와 항목 순서(id)에 의존하므로
+      항목이 추가/삭제되거나 id가 하나라도 바뀌면 재생성
+    previous는 수정하지 않으며 항상 새 dict를 반환합니다.
+    """
+    prev_entries = list(previous["entries"]) if previous else []
+    prev_division_hashes = previous["division_hashes"] if previous else {}
+    prev_by_path = {tuple(e["source_path"]): e for e in prev_entries}
+    prev_by_division = {}
+    for e in prev_entries:
+        prev_by_division.setdefault(e["source_path"][0], []).append(e)
+    
+    entries = []
+    added = []
+    id_map = {}  # 재사용된 항목의 이전 id -> 새 id
+    division_hashes = {}
+    
+    def reuse(old):
+        id_map[old["id"]] = len(entries)
+        entries.append(dict(old, id=len(entries)))
     
-    for division_name, division_data in data.items():
-        if not isinstance(division_data, dict):
+    for division_key, division_node in data.items():
+        if not isinstance(division_node, dict):
             continue
-        for work_type_name, work_type_data in division_data.items():
-            if not isinstance(work_type_data, dict):
-                continue
-            for unit_work_name, unit_work_data in work_type_data.items():
-                if not isinstance(unit_work_data, dict) or "protectors" not in unit_work_data:
-                    continue
-                
-                keywords = extract_keywords(unit_work_name)
-                keywords.update(extract_keywords(work_type_name))
-                
-                entry = {
-                    "name": unit_work_name,
-                    "keywords": keywords,
-                    "data": {
-                        "protectors": unit_work_data.get("protectors", ""),
-                        "safety_equip": unit_work_data.get("safety_equip", ""),
-                        "tools": unit_work_data.get("tools", ""),
-                        "docs": unit_work_data.get("docs", ""),
-                    },
-                    "risks": unit_work_data.get("risks", []),
-                    "division": division_name,
-                    "work_type": work_type_name,
-                    "path": f"{division_name} > {work_type_name} > {unit_work_name}"
-                }
-                index.append(entry)
-                
-                # 전체 용어 수집 (프롬프트 참고용)
-                for item in unit_work_data.get("protectors", "").split(','):
-                    cleaned = re.sub(r'\([^)]*\)', '', item).strip()
-                    if cleaned:
-                        all_vocab["protectors"].add(cleaned)
-                for item in unit_work_data.get("safety_equip", "").split(','):
-                    if item.strip():
-                        all_vocab["safety_equip"].add(item.strip())
-                for item in unit_work_data.get("tools", "").split(','):
-                    if item.strip():
-                        all_vocab["tools"].add(item.strip())
-                for item in unit_work_data.get("docs", "").split(','):
-                    if item.strip():
-                        all_vocab["docs"].add(item.strip())
-    
-    vocab_sorted = {k: sorted(v) for k, v in all_vocab.items()}
-    return index, vocab_sorted, synonym_map
-
-def find_best_match(task_name, index, synonym_map):
-    """사용자 입력 작업명과 가장 유사한 safety_data.json 항목 찾기"""
+        division_hash = _content_hash(division_node)
+        division_hashes[division_key] = division_hash
+        if prev_division_hashes.get(division_key) == division_hash:
+            for old in prev_by_division.get(division_key, []):
+                reuse(old)
+            continue
+        
+        for path, unit_work_data in iter_unit_works({division_key: division_node}):
+            source_hash = _content_hash(unit_work_data)
+            old = prev_by_path.get(path)
+            if old is not None and old["source_hash"] == source_hash:
+                reuse(old)
+            else:
+                entry = build_entry(path, unit_work_data, len(entries), synonym_map, source_hash)
+                entries.append(entry)
+                added.append(entry)
+    
+    removed = [e for e in prev_entries if e["id"] not in id_map]
+    
+    # 용어 빈도(전체 / 작업유형별): 삭제된 항목분 차감, 추가된 항목분 가산
+    vocab_counts = {k: dict(v) for k, v in previous["vocab_counts"].items()} if previous else {
+        k: {} for k in VOCAB_CATEGORIES}
+    work_type_counts = dict(previous["work_type_vocab_counts"]) if previous else {}
+    touched_work_types = set()
+    for entry, delta in [(e, -1) for e in removed] + [(e, 1) for e in added]:
+        work_type = entry["work_type"]
+        if work_type not in touched_work_types:
+            touched_work_types.add(work_type)
+            work_type_counts[work_type] = {k: dict(v) for k, v in work_type_counts.get(
+                work_type, {k: {} for k in VOCAB_CATEGORIES}).items()}
+        for category, term in vocab_items(entry["data"]):
+            for counts in (vocab_counts[category], work_type_counts[work_type][category]):
+                count = counts.get(term, 0) + delta
+                if count > 0:
+                    counts[term] = count
+                else:
+                    counts.pop(term, None)
+    work_type_vocab = dict(previous["work_type_vocab"]) if previous else {}
+    for work_type in touched_work_types:
+        if any(work_type_counts[work_type].values()):
+            work_type_vocab[work_type] = {k: rank_terms(v) for k, v in work_type_counts[work_type].items()}
+        else:
+            work_type_counts.pop(work_type, None)
+            work_type_vocab.pop(work_type, None)
+    
+    # posting list: 영향받은 키워드만 수정
+    keyword_index = {kw: list(ids) for kw, ids in previous["keyword_index"].items()} if previous else {}
+    # 순서만 바뀌어도 재사용된 항목의 id가 달라지므로 id 기반 구조는 모두 다시 만들어야 함
+    remapped = any(old_id != new_id for old_id, new_id in id_map.items())
+    if remapped:
+        keyword_index = {kw: sorted(id_map[i] for i in ids if i in id_map) for kw, ids in keyword_index.items()}
+    else:
+        for entry in removed:
+            for kw in entry["expanded_keywords"]:
+                keyword_index[kw] = [i for i in keyword_index.get(kw, []) if i != entry["id"]]
+    for entry in added:
+        for kw in entry["expanded_keywords"]:
+            keyword_index.setdefault(kw, []).append(entry["id"])
+    touched = {kw for e in added + removed for kw in e["expanded_keywords"]}
+    keyword_index = {kw: tuple(sorted(ids)) if kw in touched else tuple(ids)
+                     for kw, ids in keyword_index.items() if ids}
+    
+    changed = bool(added or removed) or remapped or previous is None
+    return {
+        "entries": entries,
+        "vocab": {k: rank_terms(v) for k, v in vocab_counts.items()},
+        "vocab_counts": vocab_counts,
+        "work_type_vocab": work_type_vocab,
+        "work_type_vocab_counts": work_type_counts,
+        "synonym_map": synonym_map,
+        "keyword_index": keyword_index,
+        "division_hashes": division_hashes,
+        "risk_search": build_risk_search_index(entries) if changed else previous["risk_search"],
+        "name_matcher": build_name_matcher(entries) if changed else previous["name_matcher"],
+        "recommender": build_equipment_recommender(entries) if changed else previous["recommender"],
+    }
+
+def _snapshot_path(data_path):
+    return os.path.splitext(data_path)[0] + '.index.pkl'
+
+def load_compiled_index(data_path=DATA_PATH):
+    """컴파일된 인덱스 반환. JSON 옆의 스냅샷(.index.pkl)이 최신이면 JSON 파싱 없이 그대로 로드
+
+    스냅샷 헤더에 원본의 mtime/크기/sha256을 기록하여, mtime이 같으면 바로 사용하고
+    mtime만 바뀐 경우(복사, checkout 등)에는 해시가 같으면 재사용합니다.
+    """
+    try:
+        stat = os.stat(data_path)
+    except OSError:
+        return compile_safety_index({})
+    
+    snapshot_path = _snapshot_path(data_path)
+    header = None
+    try:
+        with open(snapshot_path, 'rb') as f:
+            header = pickle.load(f)
+            if (header.get("version") == SNAPSHOT_VERSION
+                    and header.get("mtime_ns") == stat.st_mtime_ns
+                    and header.get("size") == stat.st_size):
+                compiled = pickle.load(f)
+                compiled["source"] = header
+                return compiled
+    except Exception:
+        header = None
+    
+    try:
+        with open(data_path, 'rb') as f:
+            raw = f.read()
+    except OSError:
+        return compile_safety_index({})
+    digest = hashlib.sha256(raw).hexdigest()
+    
+    compiled = None
+    if header and header.get("version") == SNAPSHOT_VERSION and header.get("sha256") == digest:
+        try:
+            with open(snapshot_path, 'rb') as f:
+                pickle.load(f)
+                compiled = pickle.load(f)
+        except Exception:
+            compiled = None
+    
+    if compiled is None:
+        try:
+            data = json.loads(raw.decode('utf-8'))
+        except ValueError:
+            return compile_safety_index({})
+        compiled = compile_safety_index(data)
+    
+    header = {"version": SNAPSHOT_VERSION, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": digest}
+    compiled["source"] = header
+    _save_snapshot(snapshot_path, header, compiled)
+    return compiled
+
+def _save_snapshot(snapshot_path, header, compiled):
+    # 임시 파일에 쓴 뒤 교체하여 다른 프로세스가 반쯤 쓰인 스냅샷을 읽지 않도록 함
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path)
+    except OSError:
+        # 읽기 전용 배포 환경 등: 스냅샷 없이 계속 진행
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+def freeze(obj):
+    """인덱스를 읽기 전용 컨테이너로 변환 (dict -> MappingProxyType, list -> tuple, set -> frozenset)"""
+    if isinstance(obj, dict):
+        return MappingProxyType({k: freeze(v) for k, v in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(v) for v in obj)
+    if isinstance(obj, set):
+        return frozenset(obj)
+    if isinstance(obj, np.ndarray):
+        obj.setflags(write=False)
+    return obj
+
+def _thaw(obj):
+    """freeze()된 인덱스를 다시 수정/피클 가능한 dict로 변환 (MappingProxyType은 피클 불가)"""
+    if isinstance(obj, (dict, MappingProxyType)):
+        return {k: _thaw(v) for k, v in obj.items()}
+    if isinstance(obj, tuple):
+        return tuple(_thaw(v) for v in obj)
+    return obj
+
+# 프로세스 전체에서 공유하는 읽기 전용 인덱스 (세션/rerun마다 복사하지 않음)
+_shared_index = None
+_shared_index_lock = threading.Lock()
+_index_stats = {"loads": 0, "hits": 0, "load_ms": 0.0, "reloads": 0, "reload_ms": 0.0}
+_watcher_thread = None
+
+def get_safety_index():
+    """공유 인덱스 반환. 최초 1회만 로드하고 이후에는 같은 객체를 그대로 돌려줌
+
+    반환값은 freeze()된 읽기 전용 객체이므로 호출 측에서 수정하지 마세요.
+    """
+    global _shared_index
+    shared = _shared_index
+    if shared is None:
+        with _shared_index_lock:
+            if _shared_index is None:
+                started = time.perf_counter()
+                _shared_index = freeze(load_compiled_index(DATA_PATH))
+                _index_stats["loads"] += 1
+                _index_stats["load_ms"] = (time.perf_counter() - started) * 1000
+                return _shared_index
+            shared = _shared_index
+    with _shared_index_lock:
+        _index_stats["hits"] += 1
+    return shared
+
+def get_index_stats():
+    """공유 인덱스 캐시 통계: 로드/재사용(hit)/핫 리로드 횟수와 마지막 소요 시간(ms)"""
+    with _shared_index_lock:
+        return dict(_index_stats)
+
+def reload_safety_index_if_changed(data_path=DATA_PATH):
+    """safety_data.json이 바뀌었으면 바뀐 부분만 다시 인덱싱하여 공유 인덱스를 교체. 교체했으면 True
+
+    새 인덱스를 모두 만든 뒤 참조 한 번으로 바꾸므로, 읽는 쪽은 잠금 없이
+    이전 버전 또는 새 버전 중 하나를 온전히 보게 됩니다.
+    """
+    global _shared_index
+    current = _shared_index
+    if current is None:
+        return False
+    source = current.get("source") or {}
+    stat = os.stat(data_path)
+    if source.get("mtime_ns") == stat.st_mtime_ns and source.get("size") == stat.st_size:
+        return False
+    
+    with open(data_path, 'rb') as f:
+        raw = f.read()
+    header = {"version": SNAPSHOT_VERSION, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+              "sha256": hashlib.sha256(raw).hexdigest()}
+    started = time.perf_counter()
+    previous = _thaw(current)
+    if header["sha256"] == source.get("sha256"):
+        # 내용은 그대로이고 mtime만 바뀐 경우: 재인덱싱 없이 기록만 갱신
+        compiled = previous
+        changed = False
+    else:
+        compiled = update_compiled_index(previous, json.loads(raw.decode('utf-8')), previous["synonym_map"])
+        changed = True
+    compiled["source"] = header
+    _save_snapshot(_snapshot_path(data_path), header, compiled)
+    
+    with _shared_index_lock:
+        _shared_index = freeze(compiled)
+        if changed:
+            _index_stats["reloads"] += 1
+            _index_stats["reload_ms"] = (time.perf_counter() - started) * 1000
+    return changed
+
+def _watch_safety_data(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            reload_safety_index_if_changed(DATA_PATH)
+        except Exception:
+            # 편집 중인 파일(잘못된 JSON 등)은 무시하고 기존 인덱스로 계속 서비스
+            pass
+
+def start_index_watcher(interval=5.0):
+    """safety_data.json 변경을 감시하는 백그라운드 스레드 시작 (프로세스당 1회)"""
+    global _watcher_thread
+    with _shared_index_lock:
+        if _watcher_thread is None:
+            _watcher_thread = threading.Thread(
+                target=_watch_safety_data, args=(interval,), name="safety-index-watcher", daemon=True)
+            _watcher_thread.start()
+
+def load_safety_index():
+    """safety_data.json의 모든 단위작업을 인덱싱하여 키워드 매칭이 가능하게 함"""
+    shared = get_safety_index()
+    return shared["entries"], shared["vocab"], shared["synonym_map"], shared["keyword_index"]
+
+def expand_keywords(keywords, synonym_map):
+    """키워드 집합에 동의어를 추가한 확장 집합 반환 (부분 문자열 일치 포함)"""
+    expanded = set(keywords)
+    for kw in keywords:
+        for syn_key, syn_values in synonym_map.items():
+            if syn_key in kw or kw in syn_key:
+                expanded.update(syn_values)
+    return expanded
+
+def select_vocab(shared_index, entry=None, limits=VOCAB_LIMITS):
+    """작업에 맞춘 참고 용어 (카테고리별 limits개)
+
+    유사 작업(entry) 자체의 용어 -> 같은 작업유형에서 자주 쓰인 용어 -> 전체 빈도순으로 채웁니다.
+    entry가 없으면 전체 빈도순 상위 용어만 반환합니다.
+    """
+    own = {}
+    ranked_by_work_type = {}
+    if entry:
+        for category, term in vocab_items(entry["data"]):
+            own.setdefault(category, []).append(term)
+        ranked_by_work_type = shared_index["work_type_vocab"].get(entry.get("work_type", ""), {})
+    
+    selected = {}
+    for category, limit in limits.items():
+        terms = []
+        for source in (own.get(category, ()), ranked_by_work_type.get(category, ()), shared_index["vocab"].get(category, ())):
+            for term in source:
+                if len(terms) >= limit:
+                    break
+                if term not in terms:
+                    terms.append(term)
+        selected[category] = terms
+    return selected
+
+def split_user_words(task_name):
+    """사용자 입력 작업명을 소문자 키워드 집합으로 분리"""
+    words = re.split(r'[\s,/·및\-_]+', task_name.strip())
+    return set(w.strip().lower() for w in words if len(w.strip()) >= 1)
+
+def find_top_matches(task_name, index, synonym_map, keyword_index=None, k=5, name_matcher=None):
+    """사용자 입력 작업명과 유사한 항목 상위 k개를 [(entry, score), ...] 형태로 반환
+
+    keyword_index(posting list)가 주어지면 키워드를 공유하는 후보만 점수를 계산합니다.
+    name_matcher가 주어지면 띄어쓰기/오타에 강한 자모 n-gram 유사도를 점수에 더하고,
+    키워드가 하나도 겹치지 않는 항목도 후보로 추가합니다.
+    """
     if not task_name or not index:
-        return None, 0
+        return []
     
     # 사용자 입력 키워드 추출
-    user_words_raw = re.split(r'[\s,/·및\-_]+', task_name.strip())
-    user_keywords = set()
-    for w in user_words_raw:
-        w = w.strip().lower()
-        if len(w) >= 1:
-            user_keywords.add(w)
-            # 동의어 확장
-            for syn_key, syn_values in synonym_map.items():
-                if syn_key in w or w in syn_key:
-                    user_keywords.update(syn_values)
-    
-    best_match = None
-    best_score = 0
-    
-    for entry in index:
-        entry_keywords = entry["keywords"]
-        # 확장된 entry 키워드 (동의어 포함)
-        expanded_entry = set(entry_keywords)
-        for kw in entry_keywords:
-            for syn_key, syn_values in synonym_map.items():
-                if syn_key in kw or kw in syn_key:
-                    expanded_entry.update(syn_values)
-        
+    user_words = split_user_words(task_name)
+    # 동의어 확장
+    user_keywords = expand_keywords(user_words, synonym_map)
+    
+    if keyword_index is None:
+        candidate_ids = range(len(index))
+    else:
+        candidate_ids = set()
+        for kw in user_keywords:
+            candidate_ids.update(keyword_index.get(kw, ()))
+    
+    scores = {}
+    for entry_id in candidate_ids:
+        entry = index[entry_id]
         # 교집합 기반 점수 계산
-        overlap = user_keywords & expanded_entry
+        overlap = user_keywords & entry["expanded_keywords"]
         if not overlap:
             continue
         
@@ -159,11 +516,31 @@ def find_best_match(task_name, index, synonym_map):
         score = len(overlap) / max(len(user_keywords), 1)
         
         # 직접 키워드 매칭 보너스 (원본 키워드끼리 겹치면 가산점)
-        direct_overlap = set(w.lower() for w in user_words_raw if len(w.strip()) >= 1) & entry_keywords
+        direct_overlap = user_words & entry["keywords"]
         score += len(direct_overlap) * 0.3
         
-        if score > best_score:
-            best_score = score
-            best_match = entry
+        scores[entry_id] = score
     
-    return best_match, best_score
+    # 자모 n-gram 유사도 (0~1) 가산
+    if name_matcher is not None:
+        for entry_id, similarity in fuzzy_match(name_matcher, task_name, k=max(k, 10)):
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scores[entry_id] = scores.get(entry_id, 0) + similarity
+    
+    # 동점이면 데이터 파일 순서가 앞선 항목 우선
+    ranked = sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))
+    return [(index[entry_id], score) for entry_id, score in ranked[:k]]
+
+def find_entry(index, path):
+    """경로(" > "로 이은 공종/작업유형/단위작업)로 항목 찾기
+
+    id는 재인덱싱 때 바뀌므로 세션에는 경로만 저장하고 rerun마다 현재 인덱스에서 다시 찾습니다.
+    """
+    return next((entry for entry in index if entry["path"] == path), None)
+
+def find_best_match(task_name, index, synonym_map, keyword_index=None, name_matcher=None):
+    """사용자 입력 작업명과 가장 유사한 safety_data.json 항목 찾기"""
+    matches = find_top_matches(task_name, index, synonym_map, keyword_index, k=1, name_matcher=name_matcher)
+    if not matches:
+        return None, 0
+    return matches[0]
@@ -0,0 +1,371 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+
+from modules import safety_data_handler as data_handler
+from modules import safety_recommend as recommend
+from modules.safety_search import build_name_matcher, char_ngrams, fuzzy_query, jamo_ngrams
+
+# SQLite 저장소 (선택 사항)
+# safety_data.json 전체를 프로세스 메모리에 올리지 않고, 로컬 DB 파일 하나를 여러 서버 프로세스가
+# 읽기 전용으로 공유합니다. 작업명/위험요인 텍스트는 문자 n-gram을 토큰으로 하는 FTS5 테이블로 검색합니다.
+
+SCHEMA_VERSION = "5"
+
+SCHEMA = """
+CREATE TABLE meta(key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE unit_works(
+    id INTEGER PRIMARY KEY, path TEXT, name TEXT, division TEXT, work_type TEXT,
+    protectors TEXT, safety_equip TEXT, tools TEXT, docs TEXT
+);
+CREATE TABLE unit_keywords(
+    keyword TEXT, unit_id INTEGER, direct INTEGER, PRIMARY KEY(keyword, unit_id)
+) WITHOUT ROWID;
+CREATE TABLE risks(id INTEGER PRIMARY KEY, unit_id INTEGER, step TEXT, factor TEXT, measure TEXT);
+CREATE INDEX risks_unit ON risks(unit_id);
+CREATE TABLE vocab(category TEXT, term TEXT, count INTEGER, PRIMARY KEY(category, term)) WITHOUT ROWID;
+CREATE TABLE work_type_vocab(
+    work_type TEXT, category TEXT, term TEXT, count INTEGER, PRIMARY KEY(work_type, category, term)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE unit_fts USING fts5(grams);
+CREATE TABLE name_gram_idf(gram TEXT PRIMARY KEY, idf REAL) WITHOUT ROWID;
+CREATE TABLE name_grams(gram TEXT, unit_id INTEGER, weight REAL, PRIMARY KEY(gram, unit_id)) WITHOUT ROWID;
+CREATE VIRTUAL TABLE risk_fts USING fts5(grams);
+"""
+
+_local = threading.local()
+_import_lock = threading.Lock()
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _fts_text(text):
+    return ' '.join(char_ngrams(text))
+
+def _fts_query(grams):
+    # n-gram 토큰은 [0-9a-z가-힣]만으로 구성되므로 따옴표로 감싸 OR 검색
+    return ' OR '.join(f'"{g}"' for g in dict.fromkeys(grams))
+
+def import_library(json_path, db_path, synonym_map=data_handler.SYNONYM_MAP):
+    """safety_data.json을 SQLite DB로 가져오기 (임시 파일에 만든 뒤 교체하므로 읽는 쪽은 중단되지 않음)"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    source_sha = _file_sha256(json_path)
+    
+    tmp_path = f"{db_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        vocab_counts = {}
+        entries = []
+        risk_id = 0
+        for unit_id, (path, unit_work_data) in enumerate(data_handler.iter_unit_works(data)):
+            entry = data_handler.build_entry(path, unit_work_data, unit_id, synonym_map, "")
+            entries.append(entry)
+            d = entry["data"]
+            conn.execute(
+                "INSERT INTO unit_works VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (unit_id, entry["path"], entry["name"], entry["division"], entry["work_type"],
+                 d["protectors"], d["safety_equip"], d["tools"], d["docs"]))
+            conn.executemany(
+                "INSERT INTO unit_keywords VALUES (?, ?, ?)",
+                [(kw, unit_id, int(kw in entry["keywords"])) for kw in entry["expanded_keywords"]])
+            conn.execute("INSERT INTO unit_fts(rowid, grams) VALUES (?, ?)",
+                         (unit_id, _fts_text(f"{entry['name']} {entry['work_type']}")))
+            for risk in entry["risks"]:
+                conn.execute("INSERT INTO risks VALUES (?, ?, ?, ?, ?)",
+                             (risk_id, unit_id, risk["step"], risk["factor"], risk["measure"]))
+                conn.execute("INSERT INTO risk_fts(rowid, grams) VALUES (?, ?)",
+                             (risk_id, _fts_text(f"{risk['step']} {risk['factor']} {risk['measure']}")))
+                risk_id += 1
+            for category, term in data_handler.vocab_items(d):
+                for key in ((None, category, term), (entry["work_type"], category, term)):
+                    vocab_counts[key] = vocab_counts.get(key, 0) + 1
+        conn.executemany("INSERT INTO vocab VALUES (?, ?, ?)",
+                         [(c, t, n) for (w, c, t), n in vocab_counts.items() if w is None])
+        conn.executemany("INSERT INTO work_type_vocab VALUES (?, ?, ?, ?)",
+                         [(w, c, t, n) for (w, c, t), n in vocab_counts.items() if w is not None])
+        # 작업명 자모 n-gram 유사도: 메모리 인덱스와 같은 TF-IDF 가중치를 n-gram별 posting 표로 저장 (조회 시 질의 n-gram 행만 읽음)
+        matcher = build_name_matcher(entries)
+        indptr, doc_ids, weights = matcher["indptr"], matcher["doc_ids"], matcher["weights"]
+        conn.executemany("INSERT INTO name_gram_idf VALUES (?, ?)",
+                         [(gram, float(matcher["idf"][term_id])) for gram, term_id in matcher["vocab"].items()])
+        conn.executemany("INSERT INTO name_grams VALUES (?, ?, ?)", [
+            (gram, int(doc_ids[p]), float(weights[p]))
+            for gram, term_id in matcher["vocab"].items() for p in range(indptr[term_id], indptr[term_id + 1])])
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("schema_version", SCHEMA_VERSION), ("source_sha256", source_sha),
+            ("synonym_map", json.dumps(synonym_map, ensure_ascii=False)),
+            # 장비 추천 통계는 가져오기 시 한 번만 집계해 둠
+            ("recommender", json.dumps(recommend.build_equipment_recommender(entries), ensure_ascii=False)),
+        ])
+        conn.execute("INSERT INTO risk_fts(risk_fts) VALUES ('optimize')")
+        conn.execute("INSERT INTO unit_fts(unit_fts) VALUES ('optimize')")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+
+def _read_meta(db_path):
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return {}
+
+_checked_sources = {}  # db 경로 -> 마지막으로 확인한 원본 JSON (mtime, 크기)
+
+def ensure_library(db_path, json_path=data_handler.DATA_PATH):
+    """DB가 없거나 원본 JSON과 내용이 다르면 다시 가져오기 (원본 mtime이 그대로면 확인 생략)"""
+    with _import_lock:
+        try:
+            stat = os.stat(json_path)
+        except OSError:
+            return
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if _checked_sources.get(db_path) == signature and os.path.exists(db_path):
+            return
+        meta = _read_meta(db_path) if os.path.exists(db_path) else {}
+        if meta.get("schema_version") != SCHEMA_VERSION or meta.get("source_sha256") != _file_sha256(json_path):
+            import_library(json_path, db_path)
+        _checked_sources[db_path] = signature
+
+def connect(db_path):
+    """스레드별 읽기 전용 연결 반환 (sqlite3 연결은 스레드 간 공유 불가)
+
+    import_library가 파일을 교체하면(inode/mtime 변경) 이전 파일을 계속 읽지 않도록 다시 엽니다.
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    try:
+        stat = os.stat(db_path)
+        signature = (stat.st_ino, stat.st_mtime_ns)
+    except OSError:
+        signature = None
+    cached = conns.get(db_path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    if cached is not None:
+        cached[1].close()
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=True)
+    conn.row_factory = sqlite3.Row
+    conns[db_path] = (signature, conn)
+    return conn
+
+def load_synonym_map(db_path):
+    row = connect(db_path).execute("SELECT value FROM meta WHERE key = 'synonym_map'").fetchone()
+    return json.loads(row["value"]) if row else data_handler.SYNONYM_MAP
+
+_recommenders = {}  # (db 경로, 원본 sha256) -> 장비 추천 통계
+
+def load_recommender(db_path):
+    """가져오기 시 저장해 둔 장비 추천 통계 (프로세스당 DB 내용별로 한 번만 읽음)"""
+    conn = connect(db_path)
+    row = conn.execute("SELECT value FROM meta WHERE key = 'source_sha256'").fetchone()
+    key = (db_path, row["value"] if row else "")
+    recommender = _recommenders.get(key)
+    if recommender is None:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'recommender'").fetchone()
+        if row is None:
+            return None
+        recommender = _recommenders[key] = json.loads(row["value"])
+    return recommender
+
+def count_unit_works(db_path):
+    return connect(db_path).execute("SELECT COUNT(*) FROM unit_works").fetchone()[0]
+
+def collect_vocab(db_path):
+    """카테고리별 전체 용어 (빈도순) - data_handler의 vocab과 같은 형태"""
+    vocab = {k: [] for k in data_handler.VOCAB_CATEGORIES}
+    for row in connect(db_path).execute("SELECT category, term FROM vocab ORDER BY category, count DESC, term"):
+        vocab.setdefault(row["category"], []).append(row["term"])
+    return vocab
+
+def select_vocab(db_path, entry=None, limits=data_handler.VOCAB_LIMITS):
+    """data_handler.select_vocab과 같은 순서(유사 작업 -> 같은 작업유형 빈도순 -> 전체 빈도순)로 참고 용어 선택"""
+    conn = connect(db_path)
+    own = {}
+    if entry:
+        for category, term in data_handler.vocab_items(entry["data"]):
+            own.setdefault(category, []).append(term)
+    
+    selected = {}
+    for category, limit in limits.items():
+        terms = []
+        sources = [own.get(category, [])]
+        if entry:
+            sources.append(row["term"] for row in conn.execute(
+                "SELECT term FROM work_type_vocab WHERE work_type = ? AND category = ? ORDER BY count DESC, term LIMIT ?",
+                (entry.get("work_type", ""), category, limit)))
+        sources.append(row["term"] for row in conn.execute(
+            "SELECT term FROM vocab WHERE category = ? ORDER BY count DESC, term LIMIT ?", (category, limit * 2)))
+        for source in sources:
+            for term in source:
+                if len(terms) >= limit:
+                    break
+                if term not in terms:
+                    terms.append(term)
+        selected[category] = terms
+    return selected
+
+def load_unit_work(db_path, unit_id, with_risks=False):
+    """단위작업 한 건을 인메모리 인덱스 항목과 같은 형태의 dict로 반환"""
+    conn = connect(db_path)
+    row = conn.execute("SELECT * FROM unit_works WHERE id = ?", (unit_id,)).fetchone()
+    if row is None:
+        return None
+    entry = {
+        "id": row["id"],
+        "name": row["name"],
+        "data": {k: row[k] for k in ("protectors", "safety_equip", "tools", "docs")},
+        "division": row["division"],
+        "work_type": row["work_type"],
+        "path": row["path"],
+    }
+    if with_risks:
+        entry["risks"] = [dict(r) for r in conn.execute(
+            "SELECT step, factor, measure FROM risks WHERE unit_id = ? ORDER BY id", (unit_id,))]
+    return entry
+
+def find_unit_work(db_path, path, with_risks=False):
+    """경로로 단위작업 한 건 찾기 (DB 파일을 다시 만들면 id가 바뀌므로 세션에는 경로만 저장)"""
+    row = connect(db_path).execute("SELECT id FROM unit_works WHERE path = ?", (path,)).fetchone()
+    return load_unit_work(db_path, row["id"], with_risks) if row else None
+
+def fuzzy_match_units(db_path, text, k=5):
+    """safety_search.fuzzy_match와 같은 자모 n-gram 코사인 유사도를 DB 조회로 계산. [(단위작업 id, 유사도), ...]
+
+    질의 n-gram의 idf와 posting 행만 읽으므로 전체 유사도 인덱스를 메모리에 올리지 않습니다.
+    """
+    conn = connect(db_path)
+    grams = list(dict.fromkeys(jamo_ngrams(text)))
+    if not grams:
+        return []
+    placeholders = ','.join('?' * len(grams))
+    idf = dict(conn.execute(f"SELECT gram, idf FROM name_gram_idf WHERE gram IN ({placeholders})", grams).fetchall())
+    query, norm = fuzzy_query(text, idf.get)
+    if not query:
+        return []
+    scores = {}
+    known = list(query)
+    for row in conn.execute(f"SELECT gram, unit_id, weight FROM name_grams WHERE gram IN ({','.join('?' * len(known))})", known):
+        # 메모리 인덱스와 같은 float32 곱으로 합산 (점수가 소수점 아래까지 같도록)
+        contrib = float(np.float32(row["weight"]) * np.float32(query[row["gram"]]))
+        scores[row["unit_id"]] = scores.get(row["unit_id"], 0.0) + contrib
+    ranked = sorted(((unit_id, score / max(norm, 1e-9)) for unit_id, score in scores.items() if score > 0),
+                    key=lambda pair: (-pair[1], pair[0]))
+    return ranked[:k]
+
+def find_top_matches(db_path, task_name, synonym_map, k=5):
+    """data_handler.find_top_matches와 같은 점수(키워드 일치 + 자모 n-gram 유사도)를 인덱스 조회로 계산
+
+    어느 쪽으로도 후보가 없으면 작업명 FTS에서 n-gram 일치 비율을 점수로 사용합니다.
+    """
+    if not task_name or not task_name.strip():
+        return []
+    conn = connect(db_path)
+    user_words = data_handler.split_user_words(task_name)
+    user_keywords = data_handler.expand_keywords(user_words, synonym_map)
+    
+    scores = {}
+    if user_keywords:
+        placeholders = ','.join('?' * len(user_keywords))
+        overlap = {}
+        direct = {}
+        for row in conn.execute(
+                f"SELECT keyword, unit_id, direct FROM unit_keywords WHERE keyword IN ({placeholders})",
+                list(user_keywords)):
+            overlap[row["unit_id"]] = overlap.get(row["unit_id"], 0) + 1
+            if row["direct"] and row["keyword"] in user_words:
+                direct[row["unit_id"]] = direct.get(row["unit_id"], 0) + 1
+        for unit_id, n in overlap.items():
+            scores[unit_id] = n / max(len(user_keywords), 1) + direct.get(unit_id, 0) * 0.3
+    
+    # 띄어쓰기/오타에 강한 자모 n-gram 유사도 (0~1) 가산
+    for unit_id, similarity in fuzzy_match_units(db_path, task_name, k=max(k, 10)):
+        if similarity >= data_handler.FUZZY_MIN_SIMILARITY:
+            scores[unit_id] = scores.get(unit_id, 0) + similarity
+    
+    if not scores:
+        query_grams = set(char_ngrams(task_name))
+        if query_grams:
+            for row in conn.execute(
+                    "SELECT rowid, grams FROM unit_fts WHERE unit_fts MATCH ? ORDER BY bm25(unit_fts) LIMIT ?",
+                    (_fts_query(query_grams), max(k, 10))):
+                scores[row["rowid"]] = len(query_grams & set(row["grams"].split())) / len(query_grams)
+    
+    ranked = sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))[:k]
+    return [(load_unit_work(db_path, unit_id), score) for unit_id, score in ranked]
+
+def find_best_match(db_path, task_name, synonym_map):
+    matches = find_top_matches(db_path, task_name, synonym_map, k=1)
+    if not matches:
+        return None, 0
+    return matches[0]
+
+def search_risks(db_path, query, k=6, context=(), boost_entry_id=None, boost=1.2):
+    """FTS5 bm25 순위로 위험요인 행 검색 - safety_search.search_risks와 같은 형태로 반환
+
+    작업명 n-gram으로 후보를 뽑고, 위치/위험 특성(context) n-gram과 겹치는 비율만큼 가산합니다.
+    """
+    grams = char_ngrams(query)
+    if not grams:
+        return []
+    context_grams = set(g for text in context for g in char_ngrams(text))
+    limit = max(k * 4, 20)
+    while True:
+        rows = connect(db_path).execute(
+            """SELECT r.id, r.unit_id, u.name AS entry_name, r.step, r.factor, r.measure,
+                      -bm25(risk_fts) AS score, risk_fts.grams AS grams
+               FROM risk_fts JOIN risks r ON r.id = risk_fts.rowid JOIN unit_works u ON u.id = r.unit_id
+               WHERE risk_fts MATCH ? ORDER BY bm25(risk_fts) LIMIT ?""",
+            (_fts_query(grams), limit)).fetchall()
+        
+        scored = []
+        for row in rows:
+            score = row["score"]
+            if context_grams:
+                score *= 1.0 + 0.5 * len(context_grams & set(row["grams"].split())) / len(context_grams)
+            if boost_entry_id is not None and row["unit_id"] == boost_entry_id:
+                score *= boost
+            scored.append((score, row))
+        scored.sort(key=lambda pair: -pair[0])
+        
+        results = []
+        seen_factors = set()
+        for score, row in scored:
+            if len(results) >= k:
+                break
+            if row["factor"] in seen_factors:
+                continue
+            seen_factors.add(row["factor"])
+            results.append({
+                "entry_id": row["unit_id"], "entry_name": row["entry_name"],
+                "step": row["step"], "factor": row["factor"], "measure": row["measure"], "score": score,
+            })
+        # 같은 위험요인의 대책 행들로 후보가 채워져 k개가 안 되면 후보를 늘려 다시 조회
+        if len(results) >= k or len(rows) < limit:
+            return results
+        limit *= 2
+
+if __name__ == "__main__":
+    # 사용법: python -m modules.safety_db [safety_data.json] [safety_data.db]
+    json_path = sys.argv[1] if len(sys.argv) > 1 else data_handler.DATA_PATH
+    db_path = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(json_path)[0] + '.db'
+    import_library(json_path, db_path)
+    print(f"{json_path} -> {db_path}")
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import threading
+
+import google.ai.generativelanguage as glm
+import google.generativeai as genai
+from google.api_core import client_options as client_options_lib
+from google.api_core import gapic_v1
+
+# Gemini 클라이언트/모델 핸들 풀
+# genai.configure()는 프로세스 전역 설정을 바꾸므로 여러 세션이 동시에 호출하면 서로의 키를 덮어쓸 수 있습니다.
+# API 키별 GenerativeServiceClient(gRPC 채널)를 한 번만 만들고, (키, 모델, 생성 설정)별 GenerativeModel을 재사용합니다.
+
+USER_AGENT = 'safety-app'
+
+_clients = {}  # API 키 해시 -> GenerativeServiceClient
+_models = {}   # (API 키 해시, 모델명, 생성 설정) -> GenerativeModel
+_lock = threading.Lock()
+_stats = {"clients_built": 0, "models_built": 0, "model_reuses": 0}
+
+def _key_id(api_key):
+    # 메모리 dict 키에 원문 API 키를 두지 않도록 해시 사용
+    return hashlib.sha256(str(api_key).encode('utf-8')).hexdigest()
+
+def _config_id(generation_config):
+    return json.dumps(generation_config or {}, sort_keys=True, ensure_ascii=False, default=str)
+
+def _build_client(api_key):
+    client_info = gapic_v1.client_info.ClientInfo(user_agent=f"{USER_AGENT} genai-py/{genai.__version__}")
+    return glm.GenerativeServiceClient(
+        client_options=client_options_lib.ClientOptions(api_key=api_key),
+        client_info=client_info,
+    )
+
+def get_client(api_key):
+    """API 키 전용 GenerativeServiceClient 반환 (키별로 한 번만 생성, 스레드 안전)"""
+    key_id = _key_id(api_key)
+    with _lock:
+        client = _clients.get(key_id)
+        if client is None:
+            client = _clients[key_id] = _build_client(api_key)
+            _stats["clients_built"] += 1
+        return client
+
+def get_model(api_key, model_name, generation_config=None):
+    """(API 키, 모델명, 생성 설정)별로 재사용되는 GenerativeModel 반환
+
+    전역 genai.configure()를 거치지 않고 키 전용 클라이언트를 모델에 직접 연결합니다.
+    GenerativeModel.generate_content는 모델 상태를 바꾸지 않으므로 여러 스레드에서 같은 핸들을 공유해도 됩니다.
+    """
+    handle_key = (_key_id(api_key), model_name, _config_id(generation_config))
+    with _lock:
+        model = _models.get(handle_key)
+        if model is not None:
+            _stats["model_reuses"] += 1
+            return model
+
+    client = get_client(api_key)
+    model = genai.GenerativeModel(model_name, generation_config=generation_config)
+    model._client = client
+
+    with _lock:
+        # 동시에 만들어진 경우 먼저 등록된 핸들을 사용
+        existing = _models.setdefault(handle_key, model)
+        if existing is model:
+            _stats["models_built"] += 1
+        else:
+            _stats["model_reuses"] += 1
+        return existing
+
+def get_client_stats():
+    """생성된 클라이언트/모델 수와 재사용 횟수"""
+    with _lock:
+        return dict(_stats, clients=len(_clients), models=len(_models))
+
+def clear_clients():
+    """보관 중인 클라이언트/모델 핸들 모두 해제 (API 키 교체 시)"""
+    with _lock:
+        _models.clear()
+        _clients.clear()
@@ -0,0 +1,251 @@
+import json
+import re
+
+# 모델 응답용 JSON 파서
+# - 스트리밍 응답: 조각(chunk)이 도착하는 동안 닫는 중괄호가 도착한 행 객체부터 바로 꺼내 씀
+# - 손상된 응답: 잘린 배열, 뒤에 붙은 쉼표, 앞뒤 설명문, 문자열 안의 줄바꿈이 있어도 완성된 행은 모두 살리고
+#   버린 부분은 report에 기록 (파싱 실패 때문에 같은 호출을 다시 하지 않도록)
+
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+def new_report(report=None):
+    """복구 결과 보고 dict (recovered: 살린 항목 수, repaired: 정규화 후 파싱한 항목 수, dropped: 버린 부분 목록)"""
+    if report is None:
+        report = {}
+    report.setdefault("recovered", 0)
+    report.setdefault("repaired", 0)
+    report.setdefault("dropped", [])
+    return report
+
+def _drop(report, reason, raw):
+    snippet = re.sub(r'\s+', ' ', raw).strip()
+    report["dropped"].append({"reason": reason, "text": snippet[:80] + ('…' if len(snippet) > 80 else '')})
+
+def _normalize(raw):
+    """문자열 밖의 뒤에 붙은 쉼표 제거, Python 리터럴(True/False/None)을 JSON으로 변환"""
+    out = []
+    in_string = False
+    escape = False
+    i = 0
+    while i < len(raw):
+        ch = raw[i]
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch == ',':
+            rest = raw[i + 1:].lstrip()
+            if not rest or rest[0] not in '}]':
+                out.append(ch)
+        elif 'A' <= ch <= 'Z' or 'a' <= ch <= 'z':
+            # 문자열 밖의 영문 단어만 리터럴 후보 (한글 등 다른 문자는 그대로 두고 파싱 실패로 처리)
+            word = re.match(r'[A-Za-z]+', raw[i:]).group()
+            out.append(_PY_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        else:
+            out.append(ch)
+        i += 1
+    return ''.join(out)
+
+def _close_truncated(raw, open_stack, in_string):
+    """잘린 객체 텍스트를 닫아서 파싱 가능한 형태로 (마지막의 불완전한 키/값은 버림)"""
+    text = raw + ('"' if in_string else '')
+    text = text.rstrip()
+    if text.endswith(':'):
+        text += ' null'
+    text = re.sub(r',\s*"[^"]*"$', '', text)  # 값 없이 끝난 키
+    text = text.rstrip().rstrip(',')
+    closers = {'{': '}', '[': ']'}
+    return text + ''.join(closers[ch] for ch in reversed(open_stack))
+
+def _load_object(raw, report):
+    """행 객체 하나를 파싱 (실패하면 정규화 후 재시도, 그래도 실패하면 None)
+
+    어떤 예외든 이 객체 하나만 버리고 나머지 행은 계속 복구하도록 모두 None으로 처리합니다.
+    """
+    try:
+        return json.loads(raw, strict=False)
+    except Exception:
+        pass
+    try:
+        obj = json.loads(_normalize(raw), strict=False)
+    except Exception:
+        return None
+    report["repaired"] += 1
+    return obj
+
+def _scan(chunks, list_key=None):
+    """텍스트 조각에서 최상위 객체 구간을 찾아 ("object", 원문) 또는 끝에서 잘린 ("partial", 원문, 열린 괄호, 문자열 여부) 반환
+
+    최상위 배열 안의 객체(배열이 없으면 맨 바깥 객체)를 행으로 보고, 행 사이의 설명문/코드 블록 표시는 건너뜁니다.
+    list_key를 주면 행 객체의 list_key 배열 안 객체가 닫힐 때마다 ("inner", 앞쪽 키 dict, 원문)도 반환합니다.
+    (앞쪽 키 dict는 list_key보다 먼저 나온 키/값이며, 비어 있으면 그 행은 안쪽 객체를 따로 반환하지 않음)
+    """
+    buffer = ''
+    pos = 0
+    stack = []        # 열린 괄호
+    in_string = False
+    escape = False
+    obj_start = None  # 현재 행 객체의 시작 위치
+    row_depth = 0     # 행 객체가 시작된 괄호 깊이 (배열 안이면 1, 배열이 없으면 0)
+    found = False     # 행을 하나라도 찾았는지 (그 전의 설명문 속 괄호로 끝내지 않도록)
+    string_start = None  # 행 객체 바로 안에서 마지막으로 시작한 문자열 위치 (키 확인용)
+    key_end = None       # 그 문자열이 끝난 위치
+    list_depth = None    # list_key 배열 안 객체의 괄호 깊이
+    list_head = None     # list_key 앞쪽 키 dict
+    inner_start = None   # 현재 안쪽 객체의 시작 위치
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buffer += chunk
+        while pos < len(buffer):
+            ch = buffer[pos]
+            if in_string:
+                if escape:
+                    escape = False
+                elif ch == '\\':
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+                    if string_start is not None and key_end is None:
+                        key_end = pos
+            elif ch == '"':
+                if obj_start is not None:
+                    in_string = True
+                    if len(stack) == row_depth + 1:
+                        string_start, key_end = pos, None
+            elif ch in '{[':
+                if ch == '{' and obj_start is None and stack in ([], ['[']):
+                    obj_start = pos
+                    row_depth = len(stack)
+                if (list_key is not None and ch == '[' and obj_start is not None and len(stack) == row_depth + 1
+                        and key_end is not None and buffer[string_start + 1:key_end] == list_key):
+                    head_text = buffer[obj_start:string_start].rstrip().rstrip(',') + '}'
+                    try:
+                        head = json.loads(head_text, strict=False)
+                    except ValueError:
+                        head = None
+                    if isinstance(head, dict) and head:
+                        list_depth = len(stack) + 1
+                        list_head = head
+                if ch == '{' and list_depth is not None and len(stack) == list_depth:
+                    inner_start = pos
+                if obj_start is not None or ch == '[':
+                    stack.append(ch)
+            elif ch in '}]':
+                if stack:
+                    stack.pop()
+                if inner_start is not None and ch == '}' and len(stack) == list_depth:
+                    yield ("inner", list_head, buffer[inner_start:pos + 1])
+                    inner_start = None
+                elif list_depth is not None and ch == ']' and len(stack) == list_depth - 1:
+                    list_depth = None
+                if obj_start is not None and ch == '}' and len(stack) == row_depth:
+                    yield ("object", buffer[obj_start:pos + 1])
+                    found = True
+                    obj_start = string_start = key_end = list_depth = list_head = inner_start = None
+                    # 이미 반환한 부분은 버려서 버퍼가 응답 전체 길이로 커지지 않게 함
+                    buffer = buffer[pos + 1:]
+                    pos = -1
+                elif obj_start is None and not stack and found:
+                    # 최상위 배열이 닫힘
+                    return
+            pos += 1
+
+    if obj_start is not None:
+        yield ("partial", buffer[obj_start:], stack[row_depth:], in_string)
+
+def _rows_from(obj):
+    """행 객체 또는 {"rows": [...]}처럼 행 목록을 감싼 객체에서 행 dict 목록 추출"""
+    if isinstance(obj, dict):
+        nested = [v for v in obj.values() if isinstance(v, list) and v and all(isinstance(x, dict) for x in v)]
+        if len(nested) == 1 and not any(isinstance(v, (str, int, float)) for v in obj.values()):
+            return nested[0]
+        return [obj]
+    if isinstance(obj, list):
+        return [x for x in obj if isinstance(x, dict)]
+    return []
+
+def iter_array_objects(chunks, report=None):
+    """JSON 배열 텍스트 조각들을 받아 완성된 최상위 객체를 도착 순서대로 dict로 반환
+
+    배열 시작('[') 이전의 텍스트(```json 코드 블록 표시 등)는 무시하고,
+    문자열 안의 괄호와 이스케이프 문자는 구조로 취급하지 않습니다.
+    객체 안에 중첩된 배열/객체는 바깥 객체가 닫힐 때 함께 반환됩니다.
+    파싱할 수 없는 객체와 끝에서 잘린 객체는 건너뛰고 report["dropped"]에 기록합니다.
+    """
+    report = new_report(report)
+    for item in _scan(chunks):
+        if item[0] == "partial":
+            _drop(report, "응답이 중간에 끊긴 행", item[1])
+            continue
+        obj = _load_object(item[1], report)
+        if obj is None:
+            _drop(report, "형식이 잘못된 행", item[1])
+            continue
+        for row in _rows_from(obj):
+            report["recovered"] += 1
+            yield row
+
+def repair_json_array(text, report=None):
+    """손상되었거나 잘린 JSON 배열 텍스트에서 완성된 행 객체를 모두 복구 (행 목록, report) 반환"""
+    report = new_report(report)
+    return list(iter_array_objects([text], report)), report
+
+def iter_nested_objects(chunks, list_key, report=None):
+    """JSON 배열 텍스트 조각에서 행 객체 안 list_key 배열의 항목을 완성되는 즉시 (앞쪽 키 dict, 항목 dict)로 반환
+
+    {"n": "단계", "r": [{...}, {...}]}처럼 묶인 응답에서 행 전체가 닫힐 때까지 기다리지 않고 항목별로 꺼냅니다.
+    list_key 앞에 다른 키가 없는 행이나 list_key가 없는 행(이전 형식)은 행이 닫힐 때 (None, 행 dict)로 반환합니다.
+    """
+    report = new_report(report)
+    streamed_rows = False  # 현재 행에서 안쪽 항목을 하나라도 꺼냈는지
+    for item in _scan(chunks, list_key):
+        if item[0] == "inner":
+            streamed_rows = True
+            obj = _load_object(item[2], report)
+            if not isinstance(obj, dict):
+                _drop(report, "형식이 잘못된 항목", item[2])
+                continue
+            report["recovered"] += 1
+            yield item[1], obj
+            continue
+        if item[0] == "partial":
+            _drop(report, "응답이 중간에 끊긴 행", item[1])
+            continue
+        if streamed_rows:
+            # 안쪽 항목은 이미 모두 반환함
+            streamed_rows = False
+            continue
+        obj = _load_object(item[1], report)
+        if obj is None:
+            _drop(report, "형식이 잘못된 행", item[1])
+            continue
+        for row in _rows_from(obj):
+            report["recovered"] += 1
+            yield None, row
+
+def repair_json_object(text, report=None):
+    """JSON 객체 하나를 관대하게 파싱 (잘렸으면 닫아서 완성된 키만 살림). 찾지 못하면 ValueError"""
+    report = new_report(report)
+    for item in _scan([text]):
+        if item[0] == "object":
+            obj = _load_object(item[1], report)
+        else:
+            obj = _load_object(_close_truncated(item[1], item[2], item[3]), report)
+            if obj is not None:
+                _drop(report, "응답이 중간에 끊겨 마지막 항목 일부가 빠졌을 수 있음", item[1][-80:])
+        if isinstance(obj, dict):
+            report["recovered"] += 1
+            return obj, report
+        _drop(report, "형식이 잘못된 객체", item[1])
+    raise ValueError("응답에서 JSON 객체를 찾지 못했습니다.")
@@ -0,0 +1,159 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# 응답 지연시간 추적 + 마감시간(deadline) + 헤지(hedged) 요청 + 취소
+# 호출이 최근 지연시간 분포의 HEDGE_PERCENTILE을 넘기면 같은 요청을 한 번 더 보내고 먼저 성공한 응답을 사용합니다.
+# (느린 꼬리 응답만 중복 호출하므로 평균 호출 수는 거의 늘지 않음)
+
+LATENCY_WINDOW = 200       # 작업 종류별로 보관하는 최근 지연시간 개수
+HEDGE_PERCENTILE = 95      # 이 백분위를 넘기면 헤지 요청 발송
+HEDGE_MIN_SAMPLES = 20     # 분포가 이만큼 쌓이기 전에는 헤지하지 않음
+POLL_SECONDS = 0.1         # 취소/마감 확인 주기
+
+class GenerationCancelled(Exception):
+    """사용자가 생성을 취소함"""
+
+class DeadlineExceeded(TimeoutError):
+    """마감시간 안에 응답을 받지 못함"""
+
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="safety-hedge")
+_lock = threading.Lock()
+_latencies = {}  # 작업 종류 -> deque[초]
+_stats = {"hedges": 0, "hedge_wins": 0, "timeouts": 0, "cancelled": 0}
+
+def record_latency(op, seconds):
+    """작업 종류(op)별 응답 지연시간 기록"""
+    with _lock:
+        samples = _latencies.get(op)
+        if samples is None:
+            samples = _latencies[op] = deque(maxlen=LATENCY_WINDOW)
+        samples.append(float(seconds))
+
+def latency_percentile(op, percentile, min_samples=HEDGE_MIN_SAMPLES):
+    """최근 지연시간의 백분위 값 (표본이 min_samples보다 적으면 None)"""
+    with _lock:
+        samples = sorted(_latencies.get(op, ()))
+    if len(samples) < max(min_samples, 1):
+        return None
+    rank = min(len(samples) - 1, int(round(percentile / 100.0 * (len(samples) - 1))))
+    return samples[rank]
+
+def get_latency_stats():
+    """작업 종류별 표본 수/p50/p95/p99와 헤지/마감 초과/취소 횟수"""
+    with _lock:
+        ops = list(_latencies)
+        stats = dict(_stats)
+    stats["ops"] = {
+        op: {
+            "count": len(_latencies[op]),
+            "p50": latency_percentile(op, 50, 1),
+            "p95": latency_percentile(op, 95, 1),
+            "p99": latency_percentile(op, 99, 1),
+        }
+        for op in ops
+    }
+    return stats
+
+def check_deadline(op, deadline=None, cancel_event=None):
+    """취소되었거나 마감시간이 지났으면 예외 발생 (스트리밍처럼 직접 반복하는 호출용)"""
+    if cancel_event is not None and cancel_event.is_set():
+        with _lock:
+            _stats["cancelled"] += 1
+        raise GenerationCancelled("생성을 취소했습니다.")
+    if deadline is not None and time.monotonic() >= deadline:
+        with _lock:
+            _stats["timeouts"] += 1
+        raise DeadlineExceeded(f"응답 시간이 초과되었습니다. ({op})")
+
+def timed_call(op, fn):
+    """fn() 실행 후 지연시간을 op 종류로 기록 (한도 대기 시간이 섞이지 않도록 업스트림 호출만 감쌀 것)"""
+    started = time.monotonic()
+    result = fn()
+    # 헤지에서 진 요청도 실제 지연시간이므로 모두 기록 (분포가 헤지 때문에 짧게 왜곡되지 않도록)
+    record_latency(op, time.monotonic() - started)
+    return result
+
+def iter_with_deadline(chunks, op, deadline=None, cancel_event=None):
+    """조각 iterator를 별도 스레드에서 읽어 전달 (조각이 오지 않고 멈춰 있어도 POLL_SECONDS마다 마감/취소 확인)
+
+    마감/취소로 그만 읽으면 읽는 스레드는 다음 조각이 도착하는 대로 iterator를 닫고 끝납니다.
+    """
+    items = queue.Queue()
+    stop = threading.Event()
+
+    def read():
+        try:
+            for chunk in chunks:
+                if stop.is_set():
+                    break
+                items.put(("chunk", chunk))
+            items.put(("done", None))
+        except BaseException as e:
+            items.put(("error", e))
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    threading.Thread(target=read, name="safety-stream-reader", daemon=True).start()
+    try:
+        while True:
+            check_deadline(op, deadline, cancel_event)
+            timeout = POLL_SECONDS if deadline is None else min(POLL_SECONDS, max(deadline - time.monotonic(), 0.0))
+            try:
+                kind, value = items.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stop.set()
+
+def run_hedged(fn, op, deadline=None, cancel_event=None, hedge_percentile=HEDGE_PERCENTILE, started=None):
+    """fn()을 실행하되 마감시간(time.monotonic() 기준)과 취소를 지키고, 느리면 헤지 요청을 한 번 추가
+
+    먼저 성공한 응답을 반환하고, 늦은 쪽은 백그라운드에서 끝나도록 버려 둡니다.
+    fn은 요청 1회 단위로 호출 한도/동시 호출 슬롯을 스스로 잡고 반납해야 합니다. (scheduler.limited)
+    started(threading.Event)를 주면 첫 요청이 실제로 호출을 시작한 시점부터 헤지 기준 시간을 잽니다.
+    (한도 대기 중인 요청을 헤지해서 대기열을 두 배로 늘리지 않도록)
+    """
+    hedge_after = latency_percentile(op, hedge_percentile) if hedge_percentile else None
+    hedge_at = None
+    if hedge_after is not None and started is None:
+        hedge_at = time.monotonic() + hedge_after
+
+    first = _executor.submit(fn)
+    pending = {first}
+    errors = []
+    while True:
+        check_deadline(op, deadline, cancel_event)
+        now = time.monotonic()
+        if hedge_after is not None and hedge_at is None and started is not None and started.is_set():
+            hedge_at = now + hedge_after
+        if hedge_at is not None and now >= hedge_at and first in pending:
+            hedge_after = hedge_at = None
+            pending.add(_executor.submit(fn))
+            with _lock:
+                _stats["hedges"] += 1
+
+        wake_at = min(t for t in (deadline, hedge_at, now + POLL_SECONDS) if t is not None)
+        done, pending = wait(pending, timeout=max(wake_at - now, 0.0), return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            if future is not first:
+                with _lock:
+                    _stats["hedge_wins"] += 1
+            return result
+        if not pending:
+            # 헤지 전에 실패했거나 두 요청 모두 실패
+            raise errors[0]
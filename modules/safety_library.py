@@ -0,0 +1,154 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from modules.safety_search import jamo_ngrams
+
+# 승인된 위험성평가 재사용 라이브러리 (로컬 SQLite)
+# 현장에서 확정한 위험성평가표(result_df)와 머리글 입력값을 저장해 두고, 다음에 같은 작업을
+# 조금 다른 표현으로 입력해도("외부 비계 해체 작업" / "외부비계 해체") 유사도가 기준 이상이면
+# AI 호출 없이 저장된 평가를 그대로 불러옵니다.
+
+APPROVED_DB_PATH = 'approved_assessments.db'
+HEADER_FIELDS = ("task_name", "location", "risk_factors", "risk_context_manual", "site_name",
+                 "protectors", "safety_equip", "tools", "docs")
+ROW_FIELDS = ("단계", "위험요인", "대책", "빈도", "강도")
+
+# 유사도 = 작업명 x TASK_WEIGHT + 작업 위치 x LOCATION_WEIGHT + 위험 작업 특성 x RISK_WEIGHT (0~1)
+# 위치는 한쪽이 비어 있으면 비교하지 않고 나머지 가중치로 나눔
+TASK_WEIGHT = 0.7
+LOCATION_WEIGHT = 0.15
+RISK_WEIGHT = 0.15
+# "외부/내부 비계 해체"처럼 한 단어만 다른 작업은 재사용하지 않을 만큼 높게
+REUSE_THRESHOLD = 0.9
+# 작업명 끝의 "작업", "공사"처럼 어느 작업에나 붙는 말은 비교에서 제외
+GENERIC_SUFFIX = re.compile(r'\s*(작업|공사)\s*$')
+
+_lock = threading.Lock()
+_summaries = {}  # db 경로 -> ((파일 mtime, 크기), 저장 revision, [(id, 작업명 벡터, 위치 벡터, 위험 특성 집합), ...])
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=5)
+    conn.execute("""CREATE TABLE IF NOT EXISTS approved(
+        id INTEGER PRIMARY KEY, task_name TEXT, location TEXT, risk_factors TEXT, header TEXT, rows TEXT,
+        created REAL, updated REAL, uses INTEGER DEFAULT 0)""")
+    # 평가를 저장할 때만 올리는 번호 (불러올 때 사용 횟수만 바뀐 경우에는 검색용 요약을 다시 만들지 않도록)
+    conn.execute("CREATE TABLE IF NOT EXISTS approved_meta(key TEXT PRIMARY KEY, value INTEGER)")
+    return conn
+
+def _revision(conn):
+    row = conn.execute("SELECT value FROM approved_meta WHERE key = 'revision'").fetchone()
+    return row[0] if row else 0
+
+def _vector(text):
+    return Counter(jamo_ngrams(GENERIC_SUFFIX.sub('', str(text or ''))))
+
+def _cosine(a, b):
+    if not a and not b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b.get(gram, 0) for gram, count in a.items())
+    return dot / math.sqrt(sum(v * v for v in a.values()) * sum(v * v for v in b.values()))
+
+def _risk_set(risk_factors):
+    return frozenset(f for f in risk_factors or () if "해당 없음" not in f)
+
+def query_vectors(task_name, location="", risk_factors=()):
+    """검색 입력값의 (작업명 벡터, 위치 벡터, 위험 특성 집합). 저장된 평가마다 다시 계산하지 않도록 한 번만 만듦"""
+    return _vector(task_name), _vector(location), _risk_set(risk_factors)
+
+def similarity(query, summary):
+    """query_vectors로 만든 입력값과 저장된 평가 요약(id, 작업명 벡터, 위치 벡터, 위험 특성 집합)의 유사도 (0~1)"""
+    query_task, query_location, query_risks = query
+    _, task_vec, location_vec, risks = summary
+    risk_score = len(query_risks & risks) / len(query_risks | risks) if (query_risks or risks) else 1.0
+    score = TASK_WEIGHT * _cosine(query_task, task_vec) + RISK_WEIGHT * risk_score
+    if not query_location or not location_vec:
+        return score / (TASK_WEIGHT + RISK_WEIGHT)
+    return score + LOCATION_WEIGHT * _cosine(query_location, location_vec)
+
+def _load_summaries(db_path):
+    """검색용 요약 목록 (DB 파일이 바뀌었고 저장 revision도 바뀌었을 때만 다시 읽음)"""
+    try:
+        stat = os.stat(db_path)
+    except OSError:
+        return []
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _summaries.get(db_path)
+        if cached and cached[0] == signature:
+            return cached[2]
+    conn = _connect(db_path)
+    try:
+        revision = _revision(conn)
+        if cached and cached[1] == revision:
+            # 사용 횟수만 바뀜: 요약은 그대로 쓰고 파일 상태만 갱신
+            summaries = cached[2]
+        else:
+            summaries = [(row[0], _vector(row[1]), _vector(row[2]), _risk_set(json.loads(row[3])))
+                         for row in conn.execute("SELECT id, task_name, location, risk_factors FROM approved")]
+    finally:
+        conn.close()
+    with _lock:
+        _summaries[db_path] = (signature, revision, summaries)
+    return summaries
+
+def find_approved(db_path, task_name, location="", risk_factors=(), k=1):
+    """유사한 승인 평가 상위 k개 [(평가 id, 유사도), ...] (저장된 평가가 없으면 빈 목록)"""
+    if not task_name:
+        return []
+    query = query_vectors(task_name, location, risk_factors)
+    try:
+        scored = [(summary[0], similarity(query, summary)) for summary in _load_summaries(db_path)]
+    except (sqlite3.Error, ValueError):
+        return []
+    return sorted(scored, key=lambda pair: (-pair[1], -pair[0]))[:k]
+
+def load_approved(db_path, approved_id):
+    """저장된 평가 한 건 {"id", "header": {...}, "rows": [...]}. 불러오면 사용 횟수를 올림"""
+    conn = _connect(db_path)
+    try:
+        row = conn.execute("SELECT header, rows FROM approved WHERE id = ?", (approved_id,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE approved SET uses = uses + 1 WHERE id = ?", (approved_id,))
+        conn.commit()
+    finally:
+        conn.close()
+    return {"id": approved_id, "header": json.loads(row[0]), "rows": json.loads(row[1])}
+
+def save_approved(db_path, header, rows):
+    """확정한 평가표와 머리글 입력값 저장. 작업명/위치/위험 특성이 같은 평가가 있으면 새 내용으로 교체. 평가 id 반환"""
+    header = {field: header.get(field, "") for field in HEADER_FIELDS}
+    risk_factors = sorted(_risk_set(header["risk_factors"]))
+    records = [{field: row.get(field) for field in ROW_FIELDS} for row in rows]
+    now = time.time()
+    conn = _connect(db_path)
+    try:
+        existing = conn.execute(
+            "SELECT id FROM approved WHERE task_name = ? AND location = ? AND risk_factors = ?",
+            (header["task_name"], header["location"], json.dumps(risk_factors, ensure_ascii=False))).fetchone()
+        values = (json.dumps(header, ensure_ascii=False), json.dumps(records, ensure_ascii=False, default=int), now)
+        if existing:
+            approved_id = existing[0]
+            conn.execute("UPDATE approved SET header = ?, rows = ?, updated = ? WHERE id = ?", values + (approved_id,))
+        else:
+            approved_id = conn.execute(
+                "INSERT INTO approved(task_name, location, risk_factors, header, rows, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (header["task_name"], header["location"], json.dumps(risk_factors, ensure_ascii=False)) + values[:2] + (now, now)
+            ).lastrowid
+        conn.execute("INSERT INTO approved_meta VALUES ('revision', 1) ON CONFLICT(key) DO UPDATE SET value = value + 1")
+        conn.commit()
+    finally:
+        conn.close()
+    return approved_id
+
+def count_approved(db_path):
+    """저장된 승인 평가 수 (DB가 없으면 0)"""
+    return len(_load_summaries(db_path))
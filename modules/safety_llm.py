@@ -0,0 +1,244 @@
+import json
+import os
+import re
+import threading
+import time
+
+from modules import safety_cache as cache
+from modules import safety_data_handler as data_handler
+from modules import safety_gemini as gemini
+from modules import safety_preview as preview
+
+# LLM 백엔드 교체 계층
+# safety_ai의 생성 함수는 get_backend()가 돌려준 백엔드의 generate()/stream()만 호출합니다.
+# - gemini: 실제 Gemini API
+# - local: safety_data.json 표준 데이터로 답을 조립하는 결정적 오프라인 백엔드 (네트워크/할당량 없이 테스트)
+# - record: Gemini 호출 결과(프롬프트/응답/지연시간)를 파일에 기록
+# - replay: 기록된 응답을 기록된 지연시간대로 재생 (폐쇄망 부하 테스트/프로파일링)
+
+BACKENDS = ("gemini", "local", "record", "replay")
+RECORDINGS_PATH = 'llm_recordings.jsonl'
+REPLAY_SPEED = 1.0  # 재생 지연시간 배율 (0이면 지연 없이 즉시 응답)
+
+_config = {"kind": "gemini", "path": RECORDINGS_PATH}
+_lock = threading.Lock()
+_recordings = {"path": None, "mtime": None, "items": {}}
+_local_backend = None
+
+def configure_backend(kind="gemini", recordings_path=None):
+    """프로세스 전체에서 사용할 백엔드 종류 설정"""
+    if kind not in BACKENDS:
+        raise ValueError(f"알 수 없는 LLM 백엔드: {kind} (사용 가능: {', '.join(BACKENDS)})")
+    with _lock:
+        _config["kind"] = kind
+        _config["path"] = recordings_path or RECORDINGS_PATH
+
+def requires_api_key():
+    """현재 백엔드가 Gemini API 키를 필요로 하는지"""
+    return _config["kind"] in ("gemini", "record")
+
+def get_backend(api_key, model_name, generation_config=None):
+    """설정된 종류의 백엔드 반환 (generate(prompt) -> 텍스트, stream(prompt) -> 텍스트 조각 iterator)"""
+    kind = _config["kind"]
+    if kind == "local":
+        return _get_local_backend()
+    if kind == "replay":
+        return ReplayBackend(model_name, generation_config, _config["path"])
+    backend = GeminiBackend(api_key, model_name, generation_config)
+    if kind == "record":
+        return RecordingBackend(backend, generation_config, _config["path"])
+    return backend
+
+class GeminiBackend:
+    """Gemini API 호출 (키별로 재사용되는 모델 핸들 사용)"""
+
+    def __init__(self, api_key, model_name, generation_config=None):
+        self.model_name = model_name
+        self._model = gemini.get_model(api_key, model_name, generation_config)
+
+    def generate(self, prompt):
+        return self._model.generate_content(prompt).text
+
+    def stream(self, prompt):
+        for chunk in self._model.generate_content(prompt, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                # 본문 없이 종료 정보만 담긴 조각
+                continue
+            yield text
+
+# ---------------------------------------------------------------------------
+# 기록 / 재생
+
+def _recording_key(model_name, prompt, generation_config):
+    # 응답 캐시와 같은 정규화 규칙(공백/빈 줄 무시)으로 프롬프트를 식별
+    return cache.make_cache_key(model_name, prompt, generation_config)
+
+def _load_recordings(path):
+    """기록 파일을 key -> 기록 dict로 읽기 (파일이 바뀐 경우에만 다시 읽음)"""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    with _lock:
+        if _recordings["path"] == path and _recordings["mtime"] == mtime:
+            return _recordings["items"]
+    items = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                items[record["key"]] = record
+    with _lock:
+        _recordings.update(path=path, mtime=mtime, items=items)
+    return items
+
+def _append_recording(path, record):
+    line = json.dumps(record, ensure_ascii=False) + '\n'
+    with _lock:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+class RecordingBackend:
+    """실제 백엔드 호출 결과를 프롬프트/응답/지연시간(스트리밍은 조각별 도착 시각 포함)과 함께 기록"""
+
+    def __init__(self, backend, generation_config, path):
+        self.model_name = backend.model_name
+        self._backend = backend
+        self._generation_config = generation_config
+        self._path = path
+
+    def _save(self, prompt, response, latency, chunks=None):
+        record = {
+            "key": _recording_key(self.model_name, prompt, self._generation_config),
+            "model": self.model_name,
+            "prompt": prompt,
+            "response": response,
+            "latency": round(latency, 4),
+            "recorded_at": time.time(),
+        }
+        if chunks is not None:
+            record["chunks"] = chunks
+        _append_recording(self._path, record)
+
+    def generate(self, prompt):
+        started = time.perf_counter()
+        text = self._backend.generate(prompt)
+        self._save(prompt, text, time.perf_counter() - started)
+        return text
+
+    def stream(self, prompt):
+        started = time.perf_counter()
+        chunks = []
+        for text in self._backend.stream(prompt):
+            chunks.append([round(time.perf_counter() - started, 4), text])
+            yield text
+        self._save(prompt, ''.join(text for _, text in chunks), time.perf_counter() - started, chunks)
+
+class ReplayBackend:
+    """기록된 응답을 기록 당시의 지연시간(REPLAY_SPEED 배율)대로 재생"""
+
+    def __init__(self, model_name, generation_config, path):
+        self.model_name = f"replay:{model_name}"
+        self._key_model = model_name
+        self._generation_config = generation_config
+        self._path = path
+
+    def _find(self, prompt):
+        key = _recording_key(self._key_model, prompt, self._generation_config)
+        record = _load_recordings(self._path).get(key)
+        if record is None:
+            raise KeyError(f"기록된 응답이 없습니다 ({self._path}): {prompt.strip()[:60]}...")
+        return record
+
+    def generate(self, prompt):
+        record = self._find(prompt)
+        time.sleep(record.get("latency", 0.0) * REPLAY_SPEED)
+        return record["response"]
+
+    def stream(self, prompt):
+        record = self._find(prompt)
+        chunks = record.get("chunks") or [[record.get("latency", 0.0), record["response"]]]
+        started = time.perf_counter()
+        for offset, text in chunks:
+            wait = offset * REPLAY_SPEED - (time.perf_counter() - started)
+            if wait > 0:
+                time.sleep(wait)
+            yield text
+
+# ---------------------------------------------------------------------------
+# 오프라인 표준 데이터 백엔드
+
+def _get_local_backend():
+    global _local_backend
+    with _lock:
+        if _local_backend is None:
+            _local_backend = LocalBackend()
+        return _local_backend
+
+class LocalBackend:
+    """프롬프트의 작업명으로 표준 데이터의 유사 단위작업을 찾아 같은 JSON 형식의 답을 조립 (결정적)
+
+    장비 추천(1단계), 위험성평가표(2단계), 빠른 생성(1+2단계), 단계 계획/단계별 생성(병렬 모드) 프롬프트를 구분해 응답합니다.
+    """
+    model_name = "local"
+
+    def _match(self, prompt):
+        found = re.search(r'작업명:\s*(.*)', prompt)
+        task_name = found.group(1).strip() if found else ''
+        index = data_handler.get_safety_index()
+        entry, _ = data_handler.find_best_match(
+            task_name, index["entries"], index["synonym_map"], index["keyword_index"], index["name_matcher"])
+        if entry is None and index["entries"]:
+            entry = index["entries"][0]
+        return entry
+
+    def _risk_rows(self, entry, step=None):
+        return preview.entry_risk_rows(entry, step)
+
+    def _compact(self, rows):
+        """행 목록을 2단계 압축 응답 형식(단계별 묶음, 대책 배열, 짧은 키)으로 변환"""
+        steps = []
+        for row in rows:
+            if not steps or steps[-1]["n"] != row["단계"]:
+                steps.append({"n": row["단계"], "r": []})
+            steps[-1]["r"].append({
+                "h": row["위험요인"],
+                "l": row["빈도"],
+                "s": row["강도"],
+                "t": [m[2:] for m in row["대책"].split('\n')],
+            })
+        return steps
+
+    def _steps(self, entry):
+        steps = []
+        for risk in entry.get("risks", []) if entry else []:
+            if risk["step"] not in steps:
+                steps.append(risk["step"])
+        return steps
+
+    def _equipment(self, entry):
+        data = entry["data"] if entry else {}
+        return {key: data.get(key, '') for key in ("protectors", "safety_equip", "tools", "docs")}
+
+    def generate(self, prompt):
+        entry = self._match(prompt)
+        if '"equipment"' in prompt:
+            return json.dumps({"equipment": self._equipment(entry), "risks": self._compact(self._risk_rows(entry)[:20])}, ensure_ascii=False)
+        if '"protectors"' in prompt:
+            return json.dumps(self._equipment(entry), ensure_ascii=False)
+        if '"steps"' in prompt:
+            return json.dumps({"steps": self._steps(entry)[:6]}, ensure_ascii=False)
+        found = re.search(r"\*\*'(.+?)' 단계의 행만\*\*", prompt)
+        if found:
+            rows = self._risk_rows(entry, found.group(1)) or self._risk_rows(entry)[:3]
+        else:
+            rows = self._risk_rows(entry)[:20]
+        return json.dumps(self._compact(rows), ensure_ascii=False)
+
+    def stream(self, prompt):
+        text = self.generate(prompt)
+        # 실제 스트리밍처럼 여러 조각으로 나누어 반환
+        for i in range(0, len(text), 200):
+            yield text[i:i + 200]
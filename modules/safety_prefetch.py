@@ -0,0 +1,71 @@
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from modules import safety_latency as latency
+
+# 2단계 선행 생성(prefetch)
+# 1단계 추천 결과가 나오면 기본값 그대로 2단계를 백그라운드에서 미리 생성해 두고,
+# 사용자가 값을 바꾸지 않고 '최종 생성하기'를 누르면 그 결과를 바로 사용합니다.
+
+PREFETCH_MAX_WORKERS = 4
+
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_MAX_WORKERS, thread_name_prefix="safety-prefetch")
+_lock = threading.Lock()
+_stats = {"started": 0, "used": 0, "discarded": 0}
+
+def make_prefetch_key(*inputs):
+    """2단계 생성 입력값 전체의 해시 (목록 순서까지 같아야 같은 키)"""
+    payload = json.dumps(inputs, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def start_prefetch(key, fn, *args, **kwargs):
+    """fn(*args, cancel_event=..., **kwargs)를 백그라운드에서 실행하고 {key, future, cancel_event} 핸들 반환"""
+    cancel_event = threading.Event()
+    future = _executor.submit(fn, *args, cancel_event=cancel_event, **kwargs)
+    with _lock:
+        _stats["started"] += 1
+    return {"key": key, "future": future, "cancel_event": cancel_event}
+
+def discard_prefetch(handle):
+    """선행 생성 결과 폐기 (아직 시작 전이면 취소, 실행 중이면 cancel_event로 업스트림 호출을 멈춤)"""
+    if not handle:
+        return
+    handle["future"].cancel()
+    handle["cancel_event"].set()
+    with _lock:
+        _stats["discarded"] += 1
+
+def take_prefetch(handle, key, timeout=None, cancel_event=None):
+    """입력값이 같으면 선행 생성 결과를 반환, 다르거나 실패했으면 폐기 후 None
+
+    아직 대기열에 있으면(다른 세션의 선행 생성 뒤) 폐기하고 None을 반환하므로 바로 새로 생성하세요.
+    실행 중이면 timeout초와 cancel_event를 지키며 완료를 기다리고, 초과/취소 시 폐기 후 예외를 다시 던집니다.
+    """
+    if not handle:
+        return None
+    future = handle["future"]
+    if handle["key"] != key or (not future.running() and not future.done()):
+        discard_prefetch(handle)
+        return None
+    deadline = time.monotonic() + timeout if timeout else None
+    try:
+        while not wait([future], timeout=latency.POLL_SECONDS).done:
+            latency.check_deadline("prefetch", deadline, cancel_event)
+        result = future.result()
+    except (latency.GenerationCancelled, latency.DeadlineExceeded):
+        discard_prefetch(handle)
+        raise
+    except Exception:
+        discard_prefetch(handle)
+        return None
+    with _lock:
+        _stats["used"] += 1
+    return result
+
+def get_prefetch_stats():
+    """선행 생성 시작/사용/폐기 횟수"""
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,64 @@
+import re
+
+from modules import safety_validate as validator
+
+# 표준 데이터 기반 미리보기 위험성평가표
+# 유사 단위작업의 위험요인(risks)을 그대로 모아 기본 점수를 붙인 임시 표를 AI 호출 없이 즉시 만듭니다.
+# AI 결과가 오기 전까지 화면에 보여 주고, AI 호출이 실패하면 대신 사용할 수 있습니다.
+
+def split_measures(measure):
+    """표준 데이터의 대책 문자열("- A\n- B" 또는 한 줄짜리 "- A - B")을 대책 목록으로 분리"""
+    parts = re.split(r'(?:^|\s)-\s+', str(measure))
+    return [part.strip() for part in parts if part.strip()]
+
+def default_scores(n_measures):
+    """대책 개수에 맞는 위험성 등급의 빈도/강도 (4개 이상: 상, 3개: 중, 그 외: 하)"""
+    if n_measures >= 4:
+        return 2, 3
+    if n_measures == 3:
+        return 2, 2
+    return 1, 2
+
+def risk_to_row(risk):
+    """표준 데이터 위험요인 한 건을 2단계 응답과 같은 형식의 행으로 (대책은 줄바꿈으로 연결, 기본 점수)"""
+    measures = split_measures(risk["measure"])[:5] or ["대책을 입력하세요."]
+    frequency, severity = default_scores(len(measures))
+    return {
+        "단계": risk["step"],
+        "위험요인": re.sub(r'\s*\[관련 사고이력\].*$', '', risk["factor"]).strip(),
+        "대책": '\n'.join(f"- {m}" for m in measures),
+        "빈도": frequency,
+        "강도": severity,
+    }
+
+def entry_risk_rows(entry, step=None):
+    """단위작업의 위험요인을 행 목록으로 (step을 주면 그 단계만, 공백 차이는 무시)"""
+    rows = []
+    for risk in entry.get("risks", []) if entry else []:
+        if step is not None and re.sub(r'\s+', '', risk["step"]) != re.sub(r'\s+', '', step):
+            continue
+        rows.append(risk_to_row(risk))
+    return rows
+
+def build_preview_rows(entry, ref_risk_rows=(), protectors=None):
+    """유사 단위작업의 위험요인(부족하면 검색된 참고 위험요인으로 보충)으로 미리보기 표를 조립
+
+    대책별로 나뉜 행 목록을 반환하며, 작성 규칙(보호구 행, 위험요인 개수, 등급별 대책 개수)의 자동 보정을 거칩니다.
+    참고할 위험요인이 하나도 없으면 빈 목록을 반환합니다.
+    """
+    rows = entry_risk_rows(entry)
+    known = {row["위험요인"] for row in rows}
+    for risk in ref_risk_rows or ():
+        if len(known) >= validator.MIN_FACTORS:
+            break
+        row = risk_to_row(risk)
+        if row["위험요인"] not in known:
+            known.add(row["위험요인"])
+            rows.append(row)
+    if not rows:
+        return []
+    exploded = []
+    for row in rows:
+        exploded.extend(dict(row, 대책=measure) for measure in row["대책"].split('\n'))
+    preview, _ = validator.validate_and_fix(exploded, ref_risk_rows, protectors)
+    return preview
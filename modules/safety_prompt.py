@@ -0,0 +1,131 @@
+import math
+import re
+
+# 토큰 예산 기반 프롬프트 조립
+# 프롬프트를 섹션(작업 정보, 규칙, 참고 용어, 참고 데이터 등)으로 나누어 우선순위와 토큰 한도를 주고,
+# 전체가 한도를 넘으면 우선순위가 낮은 참고 자료부터 줄여서 프롬프트 크기(=지연시간/비용)를 일정하게 유지합니다.
+
+REQUIRED = 100            # 이 우선순위의 섹션(작업 정보, 규칙)은 줄이지 않음
+HANGUL_CHARS_PER_TOKEN = 1.5
+LATIN_CHARS_PER_TOKEN = 4.0
+DIGITS_PER_TOKEN = 3.0
+
+_TOKEN_PATTERN = re.compile(r'[가-힣]+|[A-Za-z]+|\d+|\S')
+_CATEGORY_PATTERN = re.compile(r'^(\s*-\s*[^:]+:\s*)(.*)$')  # '- 분류: 용어, 용어' 줄
+
+def count_tokens(text):
+    """근사 토큰 수 (한글 1.5자, 영문 4자, 숫자 3자당 1토큰, 기호는 1토큰, 공백은 0)"""
+    total = 0
+    for match in _TOKEN_PATTERN.finditer(str(text)):
+        piece = match.group()
+        first = piece[0]
+        if '가' <= first <= '힣':
+            total += math.ceil(len(piece) / HANGUL_CHARS_PER_TOKEN)
+        elif first.isascii() and first.isalpha():
+            total += math.ceil(len(piece) / LATIN_CHARS_PER_TOKEN)
+        elif first.isdigit():
+            total += math.ceil(len(piece) / DIGITS_PER_TOKEN)
+        else:
+            total += 1
+    return total
+
+def clip_text(text, max_tokens):
+    """사용자 입력처럼 한 줄짜리 텍스트를 max_tokens 이내로 자르기"""
+    text = str(text)
+    if count_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low].rstrip() + '…'
+
+def section(name, text, priority=REQUIRED, max_tokens=None, per_category=False):
+    """프롬프트 섹션 (priority가 낮을수록 먼저 줄이고, max_tokens는 섹션 자체 한도)
+
+    per_category: '- 분류: 용어, 용어' 줄로 된 섹션이면 줄 대신 분류마다 뒤쪽 용어부터 줄임
+    """
+    return {"name": name, "text": text or '', "priority": priority, "max_tokens": max_tokens,
+            "per_category": per_category}
+
+def _trim_terms(text, max_tokens):
+    """'- 분류: 용어, 용어' 줄마다 뒤쪽 용어부터 빼서 max_tokens 이내로 줄이기
+
+    용어가 가장 많은 분류에서 하나씩 빼므로 모든 분류에 용어가 최소 1개는 남습니다.
+    """
+    lines = text.split('\n')
+    categories = {}  # 줄 번호 -> (머리, 용어 목록)
+    for i, line in enumerate(lines):
+        match = _CATEGORY_PATTERN.match(line)
+        if match:
+            categories[i] = (match.group(1), [t.strip() for t in match.group(2).split(',') if t.strip()])
+    while categories and count_tokens('\n'.join(lines)) > max_tokens:
+        i = max(categories, key=lambda i: (len(categories[i][1]), i))
+        head, terms = categories[i]
+        if len(terms) <= 1:
+            break
+        terms.pop()
+        lines[i] = head + ', '.join(terms)
+    return '\n'.join(lines)
+
+def _trim_lines(text, max_tokens, per_category=False):
+    """참고 자료 섹션을 뒤쪽 항목 줄('- '로 시작)부터 빼서 max_tokens 이내로 줄이기
+
+    참고 항목은 관련도/빈도 순으로 들어 있으므로 뒤에서부터 뺍니다. 항목이 모두 빠지면 제목도 뺍니다.
+    per_category면 먼저 분류별로 용어를 줄이고, 그래도 넘을 때만 줄을 뺍니다.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    if per_category:
+        text = _trim_terms(text, max_tokens)
+        if count_tokens(text) <= max_tokens:
+            return text
+    lines = text.split('\n')
+    item_rows = [i for i, line in enumerate(lines) if line.strip().startswith('-')]
+    while item_rows:
+        del lines[item_rows.pop()]
+        trimmed = '\n'.join(lines)
+        if item_rows and count_tokens(trimmed) <= max_tokens:
+            return trimmed
+    return ''
+
+def build_prompt(name, sections, max_tokens, reports=None):
+    """섹션들을 순서대로 이어 붙인 프롬프트와 크기 보고 반환
+
+    1) 섹션별 max_tokens를 먼저 적용하고, 2) 전체가 max_tokens를 넘으면 priority가 낮은 섹션부터 줄입니다.
+    REQUIRED 섹션은 줄이지 않으므로 필수 섹션만으로 한도를 넘으면 그대로 보냅니다.
+    reports(dict)를 주면 reports[name]에 크기 보고를 기록합니다. (세션별 사이드바 표시용)
+    """
+    texts = []
+    report_sections = {}
+    for sec in sections:
+        original = count_tokens(sec["text"])
+        text = sec["text"]
+        if sec["priority"] < REQUIRED and sec["max_tokens"] is not None:
+            text = _trim_lines(text, sec["max_tokens"], sec["per_category"])
+        texts.append(text)
+        report_sections[sec["name"]] = {"tokens": count_tokens(text), "original_tokens": original}
+
+    total = sum(s["tokens"] for s in report_sections.values())
+    for i in sorted(range(len(sections)), key=lambda i: sections[i]["priority"]):
+        if total <= max_tokens or sections[i]["priority"] >= REQUIRED:
+            break
+        info = report_sections[sections[i]["name"]]
+        texts[i] = _trim_lines(texts[i], max(info["tokens"] - (total - max_tokens), 0), sections[i]["per_category"])
+        new_tokens = count_tokens(texts[i])
+        total -= info["tokens"] - new_tokens
+        info["tokens"] = new_tokens
+
+    report = {
+        "name": name,
+        "tokens": total,
+        "max_tokens": max_tokens,
+        "sections": report_sections,
+        "trimmed": [n for n, info in report_sections.items() if info["tokens"] < info["original_tokens"]],
+    }
+    if reports is not None:
+        reports[name] = report
+    return '\n'.join(texts), report
@@ -0,0 +1,190 @@
+import re
+
+# 1단계 장비/준비물 로컬 추천 (AI 호출 없음)
+# 표준 데이터의 단위작업마다 함께 쓰인 보호구/안전장비/공구/준비자료를 인덱스 로드 시 집계해 두고,
+# 유사 작업(작업명 매칭 결과)과 사용자가 선택한 위험 작업 특성(고소작업, 화기작업 등)과의
+# 동시 출현 빈도로 항목 점수를 매겨 generate_draft_equipment와 같은 형태의 초안을 만듭니다.
+
+CATEGORIES = ("protectors", "safety_equip", "tools", "docs")
+# 카테고리별 추천 개수 (1단계 프롬프트의 "최대 4개" 규칙과 동일)
+RECOMMEND_LIMITS = {"protectors": 4, "safety_equip": 4, "tools": 4, "docs": 4}
+
+# 위험 작업 특성(선택지의 괄호 앞 이름) -> 단위작업 본문에서 그 특성을 판단하는 단어
+RISK_FACTOR_KEYWORDS = {
+    "고소작업": ("추락", "고소", "비계", "사다리", "개구부", "작업발판", "안전대", "고소작업대"),
+    "화기작업": ("화재", "화기", "용접", "용단", "절단", "불티", "폭발"),
+    "밀폐공간": ("밀폐", "질식", "산소", "환기", "유해가스"),
+    "전기작업": ("감전", "전기", "활선", "누전", "충전부", "정전"),
+    "중량물 취급": ("중량물", "낙하", "인양", "양중", "크레인", "근골격", "협착"),
+    "화학물질 취급": ("화학", "msds", "유해물질", "유기용제", "도장", "페인트"),
+    "건설기계 사용": ("건설기계", "굴착기", "백호", "지게차", "덤프", "항타기", "크레인", "카고"),
+    "해체/철거 작업": ("해체", "철거", "붕괴", "파쇄"),
+}
+# 특성 단어가 TRAIT_MIN_HITS번 이상, 위험요인 행 수의 TRAIT_MIN_DENSITY배 이상 나와야 그 특성의 단위작업으로 봄
+TRAIT_MIN_HITS = 2
+TRAIT_MIN_DENSITY = 0.2
+
+MATCH_MIN_SCORE = 0.3       # 작업명 매칭 점수가 이보다 낮은 단위작업은 참고하지 않음 (앱의 유사 작업 기준과 동일)
+MATCH_WEIGHT = 1.0          # 유사 작업에 실제로 있던 항목
+WORK_TYPE_WEIGHT = 0.5      # 유사 작업과 같은 작업유형에서 함께 쓰인 비율
+TRAIT_WEIGHT = 1.0          # 선택한 위험 특성의 단위작업에서 전체 대비 더 자주 쓰인 비율
+POPULARITY_WEIGHT = 0.05    # 동점 정리용 전체 사용 비율
+MIN_ITEM_SCORE = 0.3
+
+# 안전대의 표준 명칭 (1단계 프롬프트 규칙, 보호구 확인 행 자동 보정 문구가 함께 사용)
+SAFETY_BELT = "전체식 안전벨트"
+# 1단계 프롬프트의 [명칭 통일] 규칙과 같은 표준 명칭 (공백을 뺀 소문자 이름 -> 표준 명칭)
+ITEM_ALIASES = {
+    "안전대": SAFETY_BELT,
+    "안전belt": SAFETY_BELT,
+    "안전벨트": SAFETY_BELT,
+    "안전밸트": SAFETY_BELT,
+    "작업허가서": "안전작업 허가서",
+    "건설기계작업계획서": "건설기계 작업계획서",
+    "안전블럭": "안전블록",
+    "rope": "로프",
+    "유도rope": "유도로프",
+    "바이브레타": "바이브레이터",
+}
+# 1단계 프롬프트의 [제외 항목]/[제외 서류] 규칙: 소형 수공구, 소모성 자재, 부수 서류
+EXCLUDED_WORDS = ("스패너", "렌치", "드라이버", "망치", "샤클", "슬링벨트", "용접봉", "절단석",
+                  "신호수배치확인서", "건설기계검사증")
+HAND_TOOL = re.compile(r'(?<!전동)(수공구|공기구|치공구)류?$')
+# "CCTV 2대"처럼 항목명 뒤에 붙은 수량, "100톤"처럼 규격만 있는 항목
+ITEM_COUNT = re.compile(r'\s*\d+\s*(대|개|ea|set)$', re.IGNORECASE)
+SPEC_ONLY = re.compile(r'[\d.]+(톤|ton)?', re.IGNORECASE)
+# 소화기는 화기작업에만 추천 (1단계 프롬프트 규칙과 동일)
+HOT_WORK_ONLY = {"소화기": "화기작업"}
+
+def normalize_item(item):
+    """표준 항목명 ("굴착기(백호우)" -> "굴착기", "CCTV 2대" -> "CCTV", "안전Belt" -> "전체식 안전벨트")
+
+    1단계 프롬프트 규칙상 추천하지 않는 항목(소형 수공구, 소모성 자재 등)은 빈 문자열을 반환합니다.
+    """
+    name = ITEM_COUNT.sub('', re.sub(r'\([^)]*\)', '', item).strip())
+    key = re.sub(r'\s+', '', name).lower()
+    if HAND_TOOL.search(key) or SPEC_ONLY.fullmatch(key) or any(word in key for word in EXCLUDED_WORDS):
+        return ""
+    return ITEM_ALIASES.get(key, name)
+
+def entry_items(data):
+    """단위작업 data의 카테고리별 항목 목록 (쉼표 구분 문자열 -> 중복 없는 항목명 목록)"""
+    return {
+        category: list(dict.fromkeys(
+            normalize_item(item) for item in str(data.get(category, "")).split(',') if normalize_item(item)))
+        for category in CATEGORIES
+    }
+
+def trait_name(risk_factor):
+    """선택지 라벨에서 특성 이름만 ("고소작업 (추락 위험)" -> "고소작업")"""
+    return risk_factor.split(" (")[0].strip()
+
+def entry_traits(entry):
+    """단위작업 이름/작업유형/위험요인/공구 본문에 특성 단어가 충분히 자주 나오는 위험 특성 목록"""
+    text = ' '.join([entry.get("name", ""), entry.get("work_type", ""), str(entry.get("data", {}).get("tools", ""))]
+                    + [f"{r.get('factor', '')} {r.get('measure', '')}" for r in entry.get("risks", [])]).lower()
+    min_hits = max(TRAIT_MIN_HITS, TRAIT_MIN_DENSITY * len(entry.get("risks", [])))
+    return [trait for trait, words in RISK_FACTOR_KEYWORDS.items()
+            if sum(text.count(word) for word in words) >= min_hits]
+
+def _add_counts(counts, items):
+    for category, names in items.items():
+        bucket = counts.setdefault(category, {})
+        for name in names:
+            bucket[name] = bucket.get(name, 0) + 1
+
+def build_equipment_recommender(entries):
+    """전체 단위작업의 항목 동시 출현 통계 (전체 / 작업유형별 / 위험 특성별 사용 횟수와 단위작업 수)
+
+    entries는 id가 0부터 차례로 매겨진 단위작업 목록이며, 결과는 JSON/pickle로 저장할 수 있는 dict입니다.
+    """
+    items_by_entry = []
+    item_counts = {}
+    work_type_counts = {}
+    work_type_sizes = {}
+    trait_counts = {}
+    trait_sizes = {}
+    for entry in entries:
+        items = entry_items(entry.get("data", {}))
+        items_by_entry.append(items)
+        _add_counts(item_counts, items)
+        work_type = entry.get("work_type", "")
+        _add_counts(work_type_counts.setdefault(work_type, {}), items)
+        work_type_sizes[work_type] = work_type_sizes.get(work_type, 0) + 1
+        for trait in entry_traits(entry):
+            _add_counts(trait_counts.setdefault(trait, {}), items)
+            trait_sizes[trait] = trait_sizes.get(trait, 0) + 1
+    return {
+        "entry_items": items_by_entry,
+        "entry_work_types": [entry.get("work_type", "") for entry in entries],
+        "item_counts": item_counts,
+        "work_type_counts": work_type_counts,
+        "work_type_sizes": work_type_sizes,
+        "trait_counts": trait_counts,
+        "trait_sizes": trait_sizes,
+        "n_entries": len(items_by_entry),
+    }
+
+def score_items(recommender, matches, risk_factors=(), min_similarity=MATCH_MIN_SCORE):
+    """카테고리별 {항목: 점수}. 참고할 유사 작업이 없으면 None
+
+    matches는 작업명 매칭 결과 [(단위작업, 점수), ...]이며 최고 점수를 1로 맞춘 비율을 가중치로 씁니다.
+    위험 특성만으로는 추천 항목이 너무 적으므로, 특성은 유사 작업 기반 점수에 더하는 용도로만 씁니다.
+    """
+    n_entries = recommender["n_entries"]
+    matches = [(entry["id"], score) for entry, score in matches
+               if entry and score >= min_similarity and 0 <= entry["id"] < n_entries]
+    traits = [trait_name(f) for f in risk_factors if trait_name(f) in recommender["trait_sizes"]]
+    if not matches:
+        return None
+
+    top = max(score for _, score in matches)
+    work_type_shares = {}
+    for entry_id, score in matches:
+        work_type = recommender["entry_work_types"][entry_id]
+        work_type_shares[work_type] = work_type_shares.get(work_type, 0.0) + score
+    total = sum(work_type_shares.values())
+
+    scores = {}
+    for category in CATEGORIES:
+        overall = recommender["item_counts"].get(category, {})
+        category_scores = {}
+        for entry_id, score in matches:
+            for item in recommender["entry_items"][entry_id][category]:
+                category_scores[item] = category_scores.get(item, 0.0) + MATCH_WEIGHT * score / top
+        for work_type, share in work_type_shares.items():
+            size = recommender["work_type_sizes"][work_type]
+            for item, count in recommender["work_type_counts"][work_type].get(category, {}).items():
+                category_scores[item] = category_scores.get(item, 0.0) + WORK_TYPE_WEIGHT * (share / total) * count / size
+        for trait in traits:
+            size = recommender["trait_sizes"][trait]
+            for item, count in recommender["trait_counts"][trait].get(category, {}).items():
+                # 그 특성의 작업에서 전체 평균보다 더 자주 쓰인 만큼만 가산 (어디에나 쓰이는 항목은 제외)
+                lift = count / size - overall.get(item, 0) / n_entries
+                if lift > 0:
+                    category_scores[item] = category_scores.get(item, 0.0) + TRAIT_WEIGHT * lift
+        for item in category_scores:
+            category_scores[item] += POPULARITY_WEIGHT * overall.get(item, 0) / n_entries
+        scores[category] = category_scores
+    return scores
+
+def recommend_equipment(recommender, matches, risk_factors=(), limits=RECOMMEND_LIMITS, min_similarity=MATCH_MIN_SCORE):
+    """유사 작업과 위험 특성 기반 장비/준비물 초안 (generate_draft_equipment와 같은 쉼표 구분 문자열 dict)
+
+    참고할 유사 작업이 없거나 추천할 항목이 하나도 없으면 None을 반환하므로 AI 추천으로 대신하세요.
+    """
+    if not recommender or not recommender["n_entries"]:
+        return None
+    scores = score_items(recommender, matches, risk_factors, min_similarity)
+    if scores is None:
+        return None
+    traits = {trait_name(f) for f in risk_factors}
+    draft = {}
+    for category in CATEGORIES:
+        ranked = sorted(((item, score) for item, score in scores[category].items()
+                         if item not in HOT_WORK_ONLY or HOT_WORK_ONLY[item] in traits),
+                        key=lambda pair: (-pair[1], pair[0]))
+        draft[category] = ', '.join(item for item, score in ranked[:limits.get(category, 4)] if score >= MIN_ITEM_SCORE)
+    if not any(draft.values()):
+        return None
+    return draft
@@ -0,0 +1,192 @@
+import random
+import threading
+import time
+from concurrent.futures import Future, wait
+
+# LLM 호출 스케줄러 (프로세스 전체 공유)
+# 아침 TBM 시간처럼 여러 세션이 한꺼번에 요청해도 할당량 초과로 실패하지 않고 순서대로 대기하도록
+# - 분당 요청 수/토큰 수 토큰 버킷
+# - 동시 호출 수 제한 (세마포어)
+# - 429/5xx 응답 시 지터를 준 지수 백오프 재시도
+# - 같은 프롬프트가 이미 호출 중이면 새로 호출하지 않고 그 결과를 함께 사용 (single-flight)
+
+REQUESTS_PER_MINUTE = 60
+TOKENS_PER_MINUTE = 1_000_000
+MAX_CONCURRENCY = 8
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+OUTPUT_TOKEN_ESTIMATE = 2000  # 응답 토큰 예상치 (분당 토큰 한도 계산용)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+POLL_SECONDS = 0.1  # 같은 호출을 기다리는 동안 취소/마감 확인 주기
+
+_lock = threading.Lock()
+_bucket_cond = threading.Condition(_lock)
+_limits = {"rpm": REQUESTS_PER_MINUTE, "tpm": TOKENS_PER_MINUTE, "concurrency": MAX_CONCURRENCY}
+_bucket = {"requests": float(REQUESTS_PER_MINUTE), "tokens": float(TOKENS_PER_MINUTE), "updated": time.monotonic()}
+_semaphore = threading.BoundedSemaphore(MAX_CONCURRENCY)
+_inflight = {}  # single-flight 키 -> Future
+_stats = {"calls": 0, "coalesced": 0, "retries": 0, "failures": 0, "waits": 0, "wait_ms": 0.0}
+
+def configure_limits(rpm=REQUESTS_PER_MINUTE, tpm=TOKENS_PER_MINUTE, concurrency=MAX_CONCURRENCY):
+    """분당 요청/토큰 한도와 동시 호출 수 설정 (값이 같으면 아무것도 바꾸지 않음)"""
+    global _semaphore
+    with _lock:
+        new_limits = {"rpm": int(rpm), "tpm": int(tpm), "concurrency": int(concurrency)}
+        if new_limits == _limits:
+            return
+        if new_limits["concurrency"] != _limits["concurrency"]:
+            # 진행 중인 호출은 이전 세마포어를 그대로 반납하고, 새 호출부터 새 한도 적용
+            _semaphore = threading.BoundedSemaphore(new_limits["concurrency"])
+        _limits.update(new_limits)
+        _bucket["requests"] = min(_bucket["requests"], float(_limits["rpm"]))
+        _bucket["tokens"] = min(_bucket["tokens"], float(_limits["tpm"]))
+        _bucket_cond.notify_all()
+
+def _refill(now):
+    elapsed = now - _bucket["updated"]
+    _bucket["updated"] = now
+    _bucket["requests"] = min(float(_limits["rpm"]), _bucket["requests"] + elapsed * _limits["rpm"] / 60.0)
+    _bucket["tokens"] = min(float(_limits["tpm"]), _bucket["tokens"] + elapsed * _limits["tpm"] / 60.0)
+
+def acquire_budget(tokens):
+    """요청 1개 + tokens만큼의 한도가 찰 때까지 대기 후 차감 (헤지 요청처럼 call() 안에서 추가로 보내는 호출에도 사용)"""
+    started = time.monotonic()
+    waited = False
+    with _bucket_cond:
+        while True:
+            _refill(time.monotonic())
+            # 한 요청이 분당 토큰 한도보다 크면 버킷이 가득 찼을 때 통과시킴
+            needed_tokens = min(float(tokens), float(_limits["tpm"]))
+            if _bucket["requests"] >= 1.0 and _bucket["tokens"] >= needed_tokens:
+                _bucket["requests"] -= 1.0
+                _bucket["tokens"] -= needed_tokens
+                break
+            waited = True
+            wait = max(
+                (1.0 - _bucket["requests"]) * 60.0 / max(_limits["rpm"], 1),
+                (needed_tokens - _bucket["tokens"]) * 60.0 / max(_limits["tpm"], 1),
+                0.01,
+            )
+            _bucket_cond.wait(wait)
+        if waited:
+            _stats["waits"] += 1
+            _stats["wait_ms"] += (time.monotonic() - started) * 1000
+
+def is_retryable(error):
+    """할당량 초과(429) 또는 서버 오류(5xx)인지 (google.api_core 예외는 HTTP 상태를 code로 가짐)"""
+    code = getattr(error, "code", None)
+    return isinstance(code, int) and code in RETRYABLE_STATUS
+
+def _backoff(attempt, check=None, deadline=None, cancel_event=None):
+    """재시도 전 대기 (마감시간을 넘겨 기다리지 않고, 취소되면 바로 깨어나 check()로 예외 발생)"""
+    # full jitter: 0 ~ min(최대, 기본 x 2^attempt) 사이에서 무작위로 대기
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+    if deadline is not None:
+        delay = min(delay, max(deadline - time.monotonic(), 0.0))
+    if cancel_event is not None:
+        cancel_event.wait(delay)
+    else:
+        time.sleep(delay)
+    if check is not None:
+        check()
+
+def limited(fn, tokens, check=None, on_start=None):
+    """업스트림 호출 1회: 한도(요청 1개 + tokens)를 차감하고 동시 호출 슬롯을 잡은 채 fn() 실행
+
+    슬롯은 fn()이 실제로 끝날 때 반납하므로, 헤지 요청이나 마감/취소로 버려진 호출도 끝날 때까지 한도에 포함됩니다.
+    check()는 대기 전후에 호출되며 예외를 던지면(취소/마감 초과) 업스트림을 호출하지 않습니다.
+    on_start()는 슬롯을 얻어 fn()을 시작하기 직전에 호출됩니다.
+    """
+    if check is not None:
+        check()
+    acquire_budget(tokens)
+    semaphore = _semaphore
+    with semaphore:
+        if check is not None:
+            check()
+        if on_start is not None:
+            on_start()
+        return fn()
+
+def _call_with_retry(fn, check=None, deadline=None, cancel_event=None):
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if not is_retryable(e) or attempt == MAX_RETRIES:
+                with _lock:
+                    _stats["failures"] += 1
+                raise
+        with _lock:
+            _stats["retries"] += 1
+        _backoff(attempt, check, deadline, cancel_event)
+
+def call(key, fn, check=None, deadline=None, cancel_event=None):
+    """fn()을 429/5xx 재시도 규칙에 따라 실행 (fn 안의 업스트림 호출마다 limited()로 한도/동시성 적용)
+
+    같은 key(같은 모델/프롬프트)의 호출이 이미 진행 중이면 새로 호출하지 않고 그 결과(또는 예외)를 공유합니다.
+    기다리는 동안에도 POLL_SECONDS마다 check()를 호출하여 자신의 취소/마감시간을 지킵니다.
+    재시도 대기는 deadline(time.monotonic() 기준)을 넘기지 않고 cancel_event가 설정되면 바로 끝납니다.
+    """
+    with _lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+            _stats["calls"] += 1
+        else:
+            _stats["coalesced"] += 1
+    if not leader:
+        # future.result(timeout)의 TimeoutError는 리더의 DeadlineExceeded와 구분되지 않으므로 wait()로 완료 여부만 확인
+        while True:
+            if check is not None:
+                check()
+            if wait([future], timeout=POLL_SECONDS).done:
+                return future.result()
+
+    try:
+        result = _call_with_retry(fn, check, deadline, cancel_event)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+def stream(fn, prompt_tokens=0, check=None, deadline=None, cancel_event=None):
+    """스트리밍 호출용: fn()이 돌려준 조각 iterator를 한도/동시성 규칙 안에서 전달
+
+    첫 조각을 받기 전에 429/5xx가 나면 재시도하고, 이미 조각을 내보낸 뒤의 오류는 그대로 전달합니다.
+    스트림이 끝날 때까지 동시 호출 슬롯을 차지합니다. check/deadline/cancel_event는 call()과 같습니다.
+    """
+    with _lock:
+        _stats["calls"] += 1
+    for attempt in range(MAX_RETRIES + 1):
+        if check is not None:
+            check()
+        acquire_budget(prompt_tokens + OUTPUT_TOKEN_ESTIMATE)
+        semaphore = _semaphore
+        started = False
+        with semaphore:
+            try:
+                for text in fn():
+                    started = True
+                    yield text
+                return
+            except Exception as e:
+                if started or not is_retryable(e) or attempt == MAX_RETRIES:
+                    with _lock:
+                        _stats["failures"] += 1
+                    raise
+        with _lock:
+            _stats["retries"] += 1
+        _backoff(attempt, check, deadline, cancel_event)
+
+def get_scheduler_stats():
+    """호출/합쳐진 호출/재시도/실패/대기 통계와 현재 진행 중인 호출 수"""
+    with _lock:
+        return dict(_stats, inflight=len(_inflight), **{f"limit_{k}": v for k, v in _limits.items()})
@@ -0,0 +1,245 @@
+import re
+import numpy as np
+
+# BM25 파라미터 (일반적인 기본값)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+def char_ngrams(text, sizes=(2, 3)):
+    """한글 문자 n-gram 추출 (띄어쓰기 단위로 자르고 단어 내부에서만 n-gram 생성)
+
+    한 글자 단어는 그대로 사용하여 "폼", "캡" 같은 짧은 용어도 검색되게 함
+    """
+    grams = []
+    for word in re.findall(r'[0-9a-z가-힣]+', str(text).lower()):
+        if len(word) == 1:
+            grams.append(word)
+            continue
+        for n in sizes:
+            grams.extend(word[i:i + n] for i in range(len(word) - n + 1))
+    return grams
+
+def _build_csc(doc_terms):
+    """문서별 {term: tf} 목록을 term x doc 희소 행렬(CSC 형태 NumPy 배열)로 변환
+
+    반환: vocab(term -> term id), indptr, doc_ids, tf (term id 순서로 연결된 posting)
+    """
+    vocab = {}
+    postings = []  # term id -> ([doc id, ...], [tf, ...])
+    for doc_id, terms in enumerate(doc_terms):
+        for term, tf in terms.items():
+            term_id = vocab.get(term)
+            if term_id is None:
+                term_id = vocab[term] = len(postings)
+                postings.append(([], []))
+            postings[term_id][0].append(doc_id)
+            postings[term_id][1].append(tf)
+
+    indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(ids) for ids, _ in postings])
+    doc_ids = np.fromiter((i for ids, _ in postings for i in ids), dtype=np.int32, count=int(indptr[-1]))
+    tf = np.fromiter((t for _, tfs in postings for t in tfs), dtype=np.float32, count=int(indptr[-1]))
+    return vocab, indptr, doc_ids, tf
+
+def _sparse_dot(matrix, query_weights, n_docs):
+    """희소 행렬(vocab/indptr/doc_ids/weights)과 {term: 가중치} 질의 벡터의 곱 = 문서별 점수 배열"""
+    vocab = matrix["vocab"]
+    indptr = matrix["indptr"]
+
+    term_ids = []
+    term_weights = []
+    for term, qw in query_weights.items():
+        term_id = vocab.get(term)
+        if term_id is not None:
+            term_ids.append(term_id)
+            term_weights.append(qw)
+    if not term_ids:
+        return np.zeros(n_docs, dtype=np.float32)
+
+    # 질의 term들의 posting 구간을 한 번에 모아서(gather) 문서별로 합산
+    term_ids = np.asarray(term_ids, dtype=np.int64)
+    starts = indptr[term_ids]
+    lengths = indptr[term_ids + 1] - starts
+    offsets = np.cumsum(lengths) - lengths
+    positions = np.repeat(starts - offsets, lengths) + np.arange(int(lengths.sum()))
+    contrib = matrix["weights"][positions] * np.repeat(np.asarray(term_weights, dtype=np.float32), lengths)
+    return np.bincount(matrix["doc_ids"][positions], weights=contrib, minlength=n_docs)
+
+def _count_terms(terms, weight=1.0, counts=None):
+    counts = {} if counts is None else counts
+    for term in terms:
+        counts[term] = counts.get(term, 0.0) + weight
+    return counts
+
+def build_risk_search_index(entries):
+    """전체 단위작업의 위험요인 행(step/factor/measure)에 대한 BM25 검색 인덱스 생성
+
+    term x row 희소 행렬을 CSC 형태(indptr, doc_ids, weights)의 NumPy 배열로 보관하며,
+    BM25 가중치는 미리 계산해 두어 검색 시에는 합산만 수행합니다.
+    """
+    rows = []
+    doc_terms = []
+    for entry in entries:
+        for risk in entry.get("risks", []):
+            rows.append({
+                "entry_id": entry["id"],
+                "entry_name": entry["name"],
+                "step": risk.get("step", ""),
+                "factor": risk.get("factor", ""),
+                "measure": risk.get("measure", ""),
+            })
+            doc_terms.append(_count_terms(char_ngrams(f"{risk.get('step', '')} {risk.get('factor', '')} {risk.get('measure', '')}")))
+
+    n_rows = len(rows)
+    vocab, indptr, doc_ids, tf = _build_csc(doc_terms)
+    doc_len = np.fromiter((sum(terms.values()) for terms in doc_terms), dtype=np.float32, count=n_rows)
+    avgdl = float(doc_len.mean()) if n_rows else 0.0
+
+    df = np.diff(indptr).astype(np.float32)
+    idf = np.log(1.0 + (n_rows - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1.0 - BM25_B + BM25_B * doc_len[doc_ids] / max(avgdl, 1e-9))
+    weights = np.repeat(idf, np.diff(indptr)) * tf * (BM25_K1 + 1.0) / (tf + norm)
+
+    return {
+        "rows": rows,
+        "row_entry_ids": np.fromiter((r["entry_id"] for r in rows), dtype=np.int32, count=n_rows),
+        "vocab": vocab,
+        "indptr": indptr,
+        "doc_ids": doc_ids,
+        "weights": weights.astype(np.float32),
+    }
+
+def score_risk_rows(risk_index, query_weights):
+    """{n-gram: 가중치} 질의에 대한 전체 행의 BM25 점수 배열 반환"""
+    return _sparse_dot(risk_index, query_weights, len(risk_index["rows"]))
+
+def search_risks(risk_index, query, k=6, context=(), context_weight=0.5, boost_entry_id=None, boost=1.2):
+    """작업명(query)과 부가 정보(context: 위치, 위험 특성 등)에 가장 관련 있는 위험요인 행 k개 반환
+
+    부가 정보는 전체 가중치 합이 작업명의 context_weight배가 되도록 나누어 반영하고,
+    boost_entry_id가 주어지면 해당 단위작업의 행 점수에 boost를 곱합니다.
+    동일한 위험요인 문장은 한 번만 반환합니다.
+    """
+    if not risk_index or not risk_index["rows"]:
+        return []
+
+    query_grams = char_ngrams(query)
+    context_grams = [gram for text in context for gram in char_ngrams(text)]
+    query_weights = {}
+    for gram in query_grams:
+        query_weights[gram] = query_weights.get(gram, 0.0) + 1.0
+    # 부가 정보 전체의 가중치 합이 작업명의 context_weight배를 넘지 않도록 정규화
+    if context_grams:
+        per_gram = context_weight * max(len(query_grams), 1) / len(context_grams)
+        for gram in context_grams:
+            query_weights[gram] = query_weights.get(gram, 0.0) + per_gram
+
+    scores = score_risk_rows(risk_index, query_weights)
+    if boost_entry_id is not None:
+        scores = np.where(risk_index["row_entry_ids"] == boost_entry_id, scores * boost, scores)
+
+    # 중복 제거를 감안해 넉넉히 후보를 뽑은 뒤 점수순 정렬
+    n_candidates = min(len(scores), max(k * 4, 20))
+    while True:
+        results = []
+        seen_factors = set()
+        exhausted = n_candidates == len(scores)
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        for row_id in candidates[np.argsort(-scores[candidates], kind="stable")]:
+            if scores[row_id] <= 0:
+                exhausted = True
+                break
+            if len(results) >= k:
+                break
+            row = risk_index["rows"][row_id]
+            if row["factor"] in seen_factors:
+                continue
+            seen_factors.add(row["factor"])
+            results.append(dict(row, score=float(scores[row_id])))
+        # 같은 위험요인의 대책 행들로 후보가 채워져 k개가 안 되면 후보를 늘려 다시 뽑음
+        if len(results) >= k or exhausted:
+            return results
+        n_candidates = min(len(scores), n_candidates * 2)
+
+def decompose_jamo(text):
+    """한글 음절을 초성/중성/종성 자모로 분해하고 공백·기호를 제거 ("비계 해체" -> "비계해체")
+
+    띄어쓰기 차이와 한 글자 오타(계/게)에도 대부분의 자모 n-gram이 유지됩니다.
+    """
+    chars = []
+    for ch in str(text).lower():
+        code = ord(ch) - 0xAC00
+        if 0 <= code < 11172:
+            chars.append(chr(0x1100 + code // 588))
+            chars.append(chr(0x1161 + (code % 588) // 28))
+            if code % 28:
+                chars.append(chr(0x11A7 + code % 28))
+        elif ch.isalnum():
+            chars.append(ch)
+    return ''.join(chars)
+
+def jamo_ngrams(text, sizes=(3, 4)):
+    jamo = decompose_jamo(re.sub(r'\(\d+\)|^\d+\)|[①-⑳]', ' ', str(text)))
+    if len(jamo) < min(sizes):
+        return [jamo] if jamo else []
+    return [jamo[i:i + n] for n in sizes for i in range(len(jamo) - n + 1)]
+
+def build_name_matcher(entries, work_type_weight=0.5):
+    """단위작업명 + 작업유형명의 자모 n-gram TF-IDF 벡터(L2 정규화)를 미리 계산
+
+    질의 시에는 희소 행렬 x 벡터 한 번으로 전체 항목의 코사인 유사도를 구합니다.
+    """
+    doc_terms = []
+    for entry in entries:
+        terms = _count_terms(jamo_ngrams(entry["name"]))
+        _count_terms(jamo_ngrams(entry.get("work_type", "")), work_type_weight, terms)
+        doc_terms.append(terms)
+
+    n_docs = len(doc_terms)
+    vocab, indptr, doc_ids, tf = _build_csc(doc_terms)
+    df = np.diff(indptr).astype(np.float32)
+    idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+    weights = tf * np.repeat(idf, np.diff(indptr))
+    doc_norm = np.sqrt(np.bincount(doc_ids, weights=weights.astype(np.float64) ** 2, minlength=n_docs))
+    weights = weights / np.maximum(doc_norm[doc_ids], 1e-9)
+
+    return {
+        "vocab": vocab,
+        "idf": idf,
+        "indptr": indptr,
+        "doc_ids": doc_ids,
+        "weights": weights.astype(np.float32),
+        "n_docs": n_docs,
+    }
+
+def fuzzy_query(text, idf_of):
+    """작업명 유사도 검색 질의: ({색인에 있는 자모 n-gram: tf x idf}, 질의 norm)
+
+    idf_of(n-gram)는 색인에 없는 n-gram이면 None을 돌려줘야 합니다. (SQLite 저장소와 공유)
+    """
+    query = {}
+    norm_sq = 0.0
+    for term, tf in _count_terms(jamo_ngrams(text)).items():
+        idf = idf_of(term)
+        # 질의 norm은 vocab에 없는 n-gram까지 포함해야 오타가 많은 입력이 과대평가되지 않음
+        weight = tf * float(idf) if idf is not None else tf
+        norm_sq += weight * weight
+        if idf is not None:
+            query[term] = weight
+    return query, np.sqrt(norm_sq)
+
+def fuzzy_match(matcher, text, k=5):
+    """띄어쓰기/오타에 강한 작업명 유사도 검색. [(entry id, 코사인 유사도), ...] 반환"""
+    if not matcher or not matcher["n_docs"] or not text:
+        return []
+    vocab = matcher["vocab"]
+    idf = matcher["idf"]
+    query, norm = fuzzy_query(text, lambda term: idf[vocab[term]] if term in vocab else None)
+    if not query:
+        return []
+    scores = _sparse_dot(matcher, query, matcher["n_docs"]) / max(norm, 1e-9)
+
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
@@ -1,5 +1,8 @@
 import streamlit as st
 import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 
 def apply_custom_css():
     st.markdown("""
@@ -393,3 +396,74 @@ def split_measures_by_bullet(text, max_lines, chars_per_line):
             break
             
     return "\n".join(head_items), "\n".join(tail_items)
+
+_background = ThreadPoolExecutor(max_workers=16, thread_name_prefix="safety-ui")
+
+def _request_cancel():
+    st.session_state.generation_cancelled = True
+
+def run_cancellable(task, cancel_key, on_poll=None, poll_seconds=0.25):
+    """task(cancel_event)를 백그라운드에서 실행하고, 끝날 때까지 경과 시간과 '생성 취소' 버튼을 표시하며 대기
+
+    취소 버튼을 누르면 Streamlit이 다음 st 호출 시점에 현재 실행을 중단하고 다시 실행하므로,
+    대기 중에도 주기적으로 화면을 갱신하고 finally에서 cancel_event를 설정해 백그라운드 호출을 멈춥니다.
+    취소하면 다음 실행에서 st.session_state.generation_cancelled가 True입니다.
+    """
+    cancel_event = threading.Event()
+    future = _background.submit(task, cancel_event)
+    cancel_box = st.empty()
+    cancel_box.button("⏹ 생성 취소", key=cancel_key, on_click=_request_cancel)
+    status_box = st.empty()
+    started = time.monotonic()
+    try:
+        while not future.done():
+            wait([future], timeout=poll_seconds)
+            if on_poll is not None:
+                on_poll()
+            if not future.done():
+                status_box.caption(f"⏳ {time.monotonic() - started:.0f}초 경과 · 오래 걸리면 '생성 취소'를 누르세요.")
+        return future.result()
+    finally:
+        cancel_event.set()
+        cancel_box.empty()
+        status_box.empty()
+
+def stream_cancellable(make_stream, cancel_key, render, poll_seconds=0.25):
+    """make_stream(cancel_event)이 돌려주는 iterator를 백그라운드에서 받으며, 새 항목이 오면 render(지금까지의 목록) 호출"""
+    items = []
+    rendered = [0]
+
+    def consume(cancel_event):
+        for item in make_stream(cancel_event):
+            items.append(item)
+        return items
+
+    def refresh():
+        if len(items) != rendered[0]:
+            rendered[0] = len(items)
+            render(list(items))
+
+    return run_cancellable(consume, cancel_key, on_poll=refresh, poll_seconds=poll_seconds)
+
+def show_repair_report(report):
+    """손상된 응답에서 일부를 버리고 복구했으면 경고와 버린 부분 목록 표시"""
+    if not report or not report.get("dropped"):
+        return
+    st.warning(f"⚠️ AI 응답 일부가 손상되어 {len(report['dropped'])}개 부분을 제외하고 {report['recovered']}개 항목을 살렸습니다. 빠진 내용이 있는지 확인하세요.")
+    with st.expander("제외된 부분 보기"):
+        for item in report["dropped"]:
+            st.caption(f"- {item['reason']}: {item['text']}")
+
+def show_validation_report(report):
+    """규칙 검사 결과 표시 (자동 보정 내용, 보완 요청 후에도 남은 규칙 위반)"""
+    if not report:
+        return
+    if report.get("fixed"):
+        with st.expander(f"🔧 작성 규칙에 맞게 자동 보정한 항목 {len(report['fixed'])}건"):
+            for item in report["fixed"]:
+                st.caption(f"- {item}")
+    if report.get("unfixed"):
+        st.warning("⚠️ 작성 규칙을 모두 맞추지 못했습니다. 아래 항목을 직접 확인하세요.\n\n"
+                   + '\n'.join(f"- {issue['message']}" for issue in report["unfixed"]))
+    if report.get("reprompt_error"):
+        st.caption(f"보완 요청 실패: {report['reprompt_error']}")
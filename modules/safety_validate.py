@@ -0,0 +1,284 @@
+import re
+
+import pandas as pd
+
+from modules.safety_recommend import SAFETY_BELT
+
+# 2단계 결과 규칙 검사 및 자동 보정
+# 프롬프트의 규칙(위험요인 12~20개, 빈도 1~5, 강도 1~4, 위험성 8 이하, 등급별 대책 개수,
+# '작업준비' 첫 행은 보호구/복장 확인)을 생성 후에 표 전체에 한 번에 적용합니다.
+# 규칙대로 고칠 수 있는 것은 바로 고치고(점수 보정, 대책 자르기/채우기, 보호구 행 이동),
+# 고칠 수 없는 것(위험요인 부족, 채울 대책이 없는 경우)만 unfixed로 돌려서 그 부분만 다시 요청하게 합니다.
+
+MIN_FACTORS = 12
+MAX_FACTORS = 20
+FREQUENCY_RANGE = (1, 5)
+SEVERITY_RANGE = (1, 4)
+MAX_RISK = 8
+MEASURE_COUNTS = {"상": (4, 5), "중": (3, 3), "하": (2, 2)}  # 등급별 대책 개수 (최소, 최대)
+PREP_STEP = "1) 작업준비"
+PPE_PATTERN = r'보호구|복장'
+PPE_FACTOR = "개인 보호구 미착용 상태로 작업 투입"
+PPE_MEASURES = ["- 작업 전 {protectors} 착용 상태 확인", f"- 턱끈, {SAFETY_BELT} 고리 등 보호구 체결 상태 및 작업 복장 점검"]
+DEFAULT_PROTECTORS = "안전모, 안전화"
+
+_KEY = ["단계", "위험요인"]
+_WORD_PATTERN = re.compile(r'[가-힣]{2,}|[A-Za-z]{2,}')
+
+def _grades(risk):
+    """위험성(빈도×강도) 점수별 등급 (6점 이상 상, 3~5점 중, 2점 이하 하)"""
+    return pd.Series("하", index=risk.index).mask(risk >= 3, "중").mask(risk >= 6, "상")
+
+def _prep_step(df):
+    """'작업준비' 단계명 (이름에 '준비'가 들어간 첫 단계, 없으면 None)"""
+    steps = df.loc[df["단계"].str.contains("준비", regex=False), "단계"]
+    return steps.iloc[0] if len(steps) else None
+
+def _frame(rows):
+    df = pd.DataFrame(list(rows))
+    for col in ("단계", "위험요인", "대책"):
+        if col not in df.columns:
+            df[col] = ""
+        df[col] = df[col].fillna("").astype(str).str.strip()
+    for col in ("빈도", "강도"):
+        if col not in df.columns:
+            df[col] = None
+    return df.reset_index(drop=True)
+
+def _factor_table(df):
+    """위험요인(단계+위험요인)별 첫 행 위치/단계/대책 개수 표 (표 순서대로)"""
+    groups = df.groupby(_KEY, sort=False)
+    table = groups.size().rename("measures").reset_index()
+    table["first_row"] = groups.head(1).index.to_numpy()
+    return table.sort_values("first_row").reset_index(drop=True)
+
+def _split_measures(text):
+    return [line.strip() for line in str(text).split('\n') if line.strip()]
+
+def _words(text):
+    return set(_WORD_PATTERN.findall(str(text)))
+
+def _pad_candidates(factor, existing, reference_rows):
+    """위험요인과 단어가 가장 많이 겹치는 참고 위험요인의 대책 중 아직 없는 것 (겹치는 단어가 없으면 빈 목록)"""
+    words = _words(factor)
+    scored = []
+    for ref in reference_rows or ():
+        overlap = len(words & _words(ref.get("factor", "")))
+        if overlap:
+            scored.append((overlap, ref))
+    known = {re.sub(r'\s+', '', m) for m in existing}
+    candidates = []
+    for _, ref in sorted(scored, key=lambda item: -item[0]):
+        for measure in _split_measures(ref.get("measure", "")):
+            measure = measure if measure.startswith('-') else f"- {measure}"
+            if re.sub(r'\s+', '', measure) not in known:
+                known.add(re.sub(r'\s+', '', measure))
+                candidates.append(measure)
+    return candidates
+
+def fix_scores(df, fixed):
+    """빈도/강도를 정수 범위 안으로 보정하고, 위험성이 MAX_RISK를 넘으면 빈도를 낮춤 (같은 위험요인의 행은 같은 점수)"""
+    frequency = pd.to_numeric(df["빈도"], errors="coerce").round()
+    severity = pd.to_numeric(df["강도"], errors="coerce").round()
+    # 대책 행마다 점수가 다르게 나왔으면 위험요인의 첫 행 점수를 사용
+    frequency = frequency.groupby([df["단계"], df["위험요인"]], sort=False).transform("first")
+    severity = severity.groupby([df["단계"], df["위험요인"]], sort=False).transform("first")
+    new_frequency = frequency.fillna(FREQUENCY_RANGE[0]).clip(*FREQUENCY_RANGE)
+    new_severity = severity.fillna(SEVERITY_RANGE[0]).clip(*SEVERITY_RANGE)
+    new_frequency = new_frequency.where(new_frequency * new_severity <= MAX_RISK, MAX_RISK // new_severity)
+
+    original = pd.to_numeric(df["빈도"], errors="coerce"), pd.to_numeric(df["강도"], errors="coerce")
+    changed = original[0].ne(new_frequency) | original[1].ne(new_severity)
+    if changed.any():
+        count = df.loc[changed, _KEY].drop_duplicates().shape[0]
+        fixed.append(f"점수 범위(빈도 {FREQUENCY_RANGE[0]}~{FREQUENCY_RANGE[1]}, 강도 {SEVERITY_RANGE[0]}~{SEVERITY_RANGE[1]}, 위험성 {MAX_RISK} 이하) 보정: 위험요인 {count}개")
+    df["빈도"] = new_frequency.astype(int)
+    df["강도"] = new_severity.astype(int)
+    return df
+
+def fix_ppe_row(df, fixed, protectors=None):
+    """'작업준비' 단계의 첫 위험요인을 보호구/복장 확인으로 (다른 위치에 있으면 옮기고, 없으면 표준 행 추가)"""
+    prep = _prep_step(df)
+    is_ppe = df["위험요인"].str.contains(PPE_PATTERN) & (df["단계"] == prep)
+    if prep is not None and is_ppe.any():
+        ppe_factor = df.loc[is_ppe, "위험요인"].iloc[0]
+        ppe_rows = (df["단계"] == prep) & (df["위험요인"] == ppe_factor)
+        first_prep_row = df.index[df["단계"] == prep][0]
+        if df.index[ppe_rows][0] == first_prep_row:
+            return df
+        fixed.append(f"보호구 확인 행을 '{prep}' 단계 맨 앞으로 이동")
+        order = pd.Series(df.index, index=df.index, dtype=float)
+        order[ppe_rows] = first_prep_row - 0.5
+    else:
+        if prep is None:
+            prep = PREP_STEP
+            first_prep_row = 0
+        else:
+            first_prep_row = df.index[df["단계"] == prep][0]
+        measures = [m.format(protectors=', '.join(protectors) if protectors else DEFAULT_PROTECTORS) for m in PPE_MEASURES]
+        ppe = pd.DataFrame({"단계": prep, "위험요인": PPE_FACTOR, "대책": measures,
+                            "빈도": FREQUENCY_RANGE[0], "강도": 2})
+        fixed.append(f"보호구 확인 행을 '{prep}' 단계 맨 앞에 추가")
+        order = pd.concat([pd.Series(df.index, dtype=float), pd.Series(first_prep_row - 0.5, index=ppe.index)], ignore_index=True)
+        df = pd.concat([df, ppe], ignore_index=True)
+        order.index = df.index
+    return df.loc[order.sort_values(kind="stable").index].reset_index(drop=True)
+
+def fix_factor_count(df, fixed, unfixed):
+    """위험요인이 MAX_FACTORS를 넘으면 위험요인이 가장 많은 단계의 뒤쪽부터 제거, MIN_FACTORS보다 적으면 unfixed에 기록"""
+    table = _factor_table(df)
+    excess = len(table) - MAX_FACTORS
+    if excess > 0:
+        prep = _prep_step(df)
+        # 위험요인 표는 작으므로 어느 위험요인을 뺄지는 목록으로 정하고, 행 제거만 표 전체에 한 번 적용
+        remaining = {}
+        for i, step in enumerate(table["단계"]):
+            remaining.setdefault(step, []).append(i)
+        dropped = []
+        for _ in range(excess):
+            # 보호구 확인 행이 있는 준비 단계는 첫 행을 남김
+            removable = [step for step, rows in remaining.items() if len(rows) > 1 or (rows and step != prep)]
+            largest = max(len(remaining[step]) for step in removable)
+            step = [step for step in removable if len(remaining[step]) == largest][-1]
+            dropped.append(remaining[step].pop())
+        drop_keys = pd.MultiIndex.from_frame(table.loc[dropped, _KEY])
+        df = df[~pd.MultiIndex.from_frame(df[_KEY]).isin(drop_keys)].reset_index(drop=True)
+        fixed.append(f"위험요인 {excess}개 초과분 제거 (최대 {MAX_FACTORS}개)")
+    elif len(table) < MIN_FACTORS:
+        missing = MIN_FACTORS - len(table)
+        unfixed.append({
+            "rule": "factor_count",
+            "message": f"위험요인이 {len(table)}개로 최소 {MIN_FACTORS}개보다 {missing}개 부족",
+            "missing": missing,
+            "steps": table.groupby("단계", sort=False).size().to_dict(),
+            "factors": table["위험요인"].tolist(),
+        })
+    return df
+
+def fix_measure_counts(df, fixed, unfixed, reference_rows=None):
+    """등급별 대책 개수 맞추기: 많으면 뒤쪽 대책을 빼고, 모자라면 참고 위험요인의 대책으로 채움 (채울 것이 없으면 unfixed)"""
+    grades = _grades(df["빈도"] * df["강도"])
+    low = grades.map({g: r[0] for g, r in MEASURE_COUNTS.items()})
+    high = grades.map({g: r[1] for g, r in MEASURE_COUNTS.items()})
+    position = df.groupby(_KEY, sort=False).cumcount()
+    count = df.groupby(_KEY, sort=False)["대책"].transform("size")
+
+    trimmed = position >= high
+    if trimmed.any():
+        fixed.append(f"등급별 최대 개수를 넘는 대책 {int(trimmed.sum())}개 제거")
+        df, low, count = df[~trimmed], low[~trimmed], count[~trimmed].clip(upper=high[~trimmed])
+
+    short = df.loc[count < low, _KEY].drop_duplicates()
+    if short.empty:
+        return df.reset_index(drop=True)
+    pads = []
+    padded = 0
+    positions = df.groupby(_KEY, sort=False).indices
+    for index, factor_row in short.iterrows():
+        rows = df.iloc[positions[(factor_row["단계"], factor_row["위험요인"])]]
+        needed = int(low[index] - len(rows))
+        candidates = _pad_candidates(factor_row["위험요인"], rows["대책"], reference_rows)[:needed]
+        if candidates:
+            last = rows.index[-1]
+            pads.append(pd.DataFrame([dict(rows.iloc[-1], 대책=m) for m in candidates],
+                                     index=[last + (i + 1) / (needed + 1) for i in range(len(candidates))]))
+            padded += len(candidates)
+        if len(candidates) < needed:
+            unfixed.append({
+                "rule": "measure_count",
+                "message": f"'{factor_row['위험요인']}' 대책이 {needed - len(candidates)}개 부족",
+                "step": factor_row["단계"],
+                "factor": factor_row["위험요인"],
+                "missing": needed - len(candidates),
+                "measures": rows["대책"].tolist() + candidates,
+            })
+    if padded:
+        fixed.append(f"부족한 대책 {padded}개를 참고 데이터의 대책으로 채움")
+        df = pd.concat([df, *pads]).sort_index(kind="stable")
+    return df.reset_index(drop=True)
+
+def validate_and_fix(rows, reference_rows=None, protectors=None):
+    """대책별로 나뉜 위험성평가 행 목록에 규칙 검사/자동 보정 적용
+
+    (보정된 행 목록, {"fixed": [보정 내용], "unfixed": [고치지 못한 규칙]}) 반환.
+    reference_rows는 부족한 대책을 채울 참고 위험요인({"factor", "measure"}) 목록입니다.
+    """
+    fixed, unfixed = [], []
+    df = _frame(rows)
+    empty = df["위험요인"] == ""
+    if empty.any():
+        fixed.append(f"위험요인이 비어 있는 행 {int(empty.sum())}개 제거")
+        df = df[~empty].reset_index(drop=True)
+    df = fix_scores(df, fixed)
+    df = fix_ppe_row(df, fixed, protectors)
+    df = fix_factor_count(df, fixed, unfixed)
+    df = fix_measure_counts(df, fixed, unfixed, reference_rows)
+    return df.to_dict("records"), {"fixed": fixed, "unfixed": unfixed}
+
+def merge_rows(rows, extra_rows):
+    """다시 요청해 받은 행을 기존 행에 합침 (같은 위험요인이면 그 아래에 새 대책만 추가, 새 위험요인은 같은 단계 끝에 추가)"""
+    df = _frame(rows)
+    extra = _frame(extra_rows)
+    if extra.empty:
+        return df.to_dict("records")
+
+    def normalize(series):
+        return series.str.replace(r'\s+', '', regex=True)
+
+    df_key = normalize(df["단계"]) + '|' + normalize(df["위험요인"])
+    df_measure = df_key + '|' + normalize(df["대책"])
+    extra_key = normalize(extra["단계"]) + '|' + normalize(extra["위험요인"])
+    extra = extra[~(extra_key + '|' + normalize(extra["대책"])).isin(df_measure)]
+    extra_key = extra_key[extra.index]
+
+    order = pd.Series(df.index, index=df.index, dtype=float)
+    last_of_factor = order.groupby(df_key).max()
+    last_of_step = order.groupby(normalize(df["단계"])).max()
+    closing = order[df["단계"].str.contains("종료|정리")]
+    # 계획에 없던 단계는 '작업종료/정리' 바로 앞에 (단계 끝에 붙는 행(+0.75)보다 뒤)
+    new_factor_at = closing.min() - 0.1 if len(closing) else len(df)
+
+    positions = []
+    for key, step in zip(extra_key, normalize(extra["단계"])):
+        if key in last_of_factor:
+            positions.append(last_of_factor[key] + 0.5)
+        elif step in last_of_step:
+            positions.append(last_of_step[step] + 0.75)
+        else:
+            positions.append(new_factor_at)
+    # 기존 위험요인의 점수를 유지
+    scores = df.assign(_key=df_key).groupby("_key")[["빈도", "강도"]].first()
+    known = extra_key.isin(scores.index)
+    extra.loc[known, ["빈도", "강도"]] = scores.loc[extra_key[known]].to_numpy()
+    extra.index = pd.Index(positions) + pd.RangeIndex(len(extra)) * 1e-6
+    return pd.concat([df, extra]).sort_index(kind="stable").to_dict("records")
+
+def normalize_rows(rows, reference_rows=None, protectors=None, ppe_row=False):
+    """표 일부(부분 재생성 결과 등)에 행 단위 규칙만 적용 (점수 범위, 등급별 대책 개수)
+
+    위험요인 개수처럼 표 전체에 대한 규칙은 검사하지 않습니다.
+    ppe_row가 True이면('작업준비' 단계를 다시 만든 경우) validate_and_fix처럼 보호구 확인 행도 맨 앞에 맞춥니다.
+    """
+    fixed, unfixed = [], []
+    df = _frame(rows)
+    df = df[df["위험요인"] != ""].reset_index(drop=True)
+    df = fix_scores(df, fixed)
+    if ppe_row:
+        df = fix_ppe_row(df, fixed, protectors)
+    df = fix_measure_counts(df, fixed, unfixed, reference_rows)
+    return df.to_dict("records"), {"fixed": fixed, "unfixed": unfixed}
+
+def splice_rows(rows, new_rows, step, factor=None):
+    """결과표에서 한 단계(factor=None) 또는 한 위험요인의 행을 new_rows로 교체 (원래 위치에 끼워 넣고 나머지 행은 그대로)"""
+    df = pd.DataFrame(list(rows))
+    target = df["단계"] == step
+    if factor is not None:
+        target &= df["위험요인"] == factor
+    new = pd.DataFrame(list(new_rows))
+    if not target.any():
+        return pd.concat([df, new], ignore_index=True).to_dict("records")
+    position = target.to_numpy().nonzero()[0][0]
+    kept = df[~target]
+    before = kept[kept.index < df.index[position]]
+    after = kept[kept.index > df.index[position]]
+    return pd.concat([before, new, after], ignore_index=True).to_dict("records")
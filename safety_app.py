@@ -9,6 +9,17 @@ import streamlit.components.v1 as components
 from modules import safety_data_handler as data_handler
 from modules import safety_ui as ui
 from modules import safety_ai as ai
+from modules import safety_search as search
+from modules import safety_db
+from modules import safety_cache as ai_cache
+from modules import safety_prefetch as prefetch
+from modules import safety_llm as llm
+from modules import safety_scheduler as scheduler
+from modules import safety_latency as latency
+from modules import safety_validate as validator
+from modules import safety_preview as preview
+from modules import safety_recommend as recommend
+from modules import safety_library as library
 
 # 1. UI 설정 및 CSS 적용
 st.set_page_config(page_title="스마트 위험성평가 AI", page_icon="🛡️", layout="wide")
@@ -18,16 +29,69 @@ ui.disable_translation()
 # 2. 데이터 로드 및 초기화
 # Streamlit Secrets에서 API 키 로드
 api_key = st.secrets.get("GEMINI_API_KEY", "")
+# LLM 백엔드 (기본 gemini / 오프라인 local / 응답 기록 record / 기록 재생 replay)
+llm.configure_backend(st.secrets.get("LLM_BACKEND", "gemini"), st.secrets.get("LLM_RECORDINGS_PATH", ""))
+# 프로세스 전체 호출 한도 (분당 요청 수/토큰 수, 동시 호출 수) - 초과분은 실패 대신 대기
+scheduler.configure_limits(
+    st.secrets.get("GEMINI_RPM", scheduler.REQUESTS_PER_MINUTE),
+    st.secrets.get("GEMINI_TPM", scheduler.TOKENS_PER_MINUTE),
+    st.secrets.get("GEMINI_MAX_CONCURRENCY", scheduler.MAX_CONCURRENCY),
+)
 
-safety_index, ref_vocab, synonym_map = data_handler.load_safety_index()
+# 선택: SQLite 저장소 (secrets에 SAFETY_DB_PATH 지정 시 인메모리 인덱스를 올리지 않고 DB 파일을 조회)
+library_db = st.secrets.get("SAFETY_DB_PATH", "")
+if library_db:
+    safety_db.ensure_library(library_db)
+    synonym_map = safety_db.load_synonym_map(library_db)
+    st.sidebar.caption(f"📚 표준 데이터 {safety_db.count_unit_works(library_db)}개 단위작업 · SQLite 저장소")
+else:
+    # 인덱스는 프로세스 전체에서 하나를 공유 (읽기 전용, rerun마다 복사하지 않음)
+    shared_index = data_handler.get_safety_index()
+    # safety_data.json 수정 시 서버 재시작 없이 바뀐 부분만 재인덱싱
+    data_handler.start_index_watcher()
+    safety_index = shared_index["entries"]
+    synonym_map = shared_index["synonym_map"]
+    keyword_index = shared_index["keyword_index"]
+    risk_search_index = shared_index["risk_search"]
+    name_matcher = shared_index["name_matcher"]
 
-# 참고 용어 텍스트 구성
-ref_vocab_text = f"""[현장 표준 용어 참고 - 반드시 아래 용어를 우선 사용하세요]
-- 보호구 용어: {', '.join(ref_vocab.get('protectors', [])[:30])}
-- 안전장비 용어: {', '.join(ref_vocab.get('safety_equip', [])[:30])}
-- 공구/장비 용어: {', '.join(ref_vocab.get('tools', [])[:30])}
-- 준비자료 용어: {', '.join(ref_vocab.get('docs', [])[:20])}
-"""
+    index_stats = data_handler.get_index_stats()
+    st.sidebar.caption(f"📚 표준 데이터 {len(safety_index)}개 단위작업 · 인덱스 재사용 {index_stats['hits']}회 · 로드 {index_stats['load_ms']:.0f}ms")
+
+# 승인된 위험성평가 라이브러리: 확정해서 저장한 평가와 거의 같은 작업이면 AI 호출 없이 그대로 불러옴
+approved_db = st.secrets.get("APPROVED_DB_PATH", library.APPROVED_DB_PATH)
+approved_count = library.count_approved(approved_db)
+if approved_count:
+    st.sidebar.caption(f"✅ 승인된 위험성평가 {approved_count}건 저장됨 · 비슷한 작업은 바로 불러옵니다")
+
+# AI 응답 캐시: 같은 작업을 같은 조건으로 다시 생성하면 저장된 응답을 바로 사용
+force_regenerate = st.sidebar.checkbox("🔄 저장된 AI 응답 대신 새로 생성", value=False,
+                                       help="같은 조건의 이전 결과가 마음에 들지 않을 때 선택하세요.")
+# 2단계 생성 방식: 한 번에 스트리밍(기본) 또는 단계별 병렬 생성
+parallel_steps = st.sidebar.checkbox("🧩 작업 단계별 병렬 생성", value=False,
+                                     help="작업 단계를 먼저 정한 뒤 단계마다 동시에 생성합니다. 단계가 많은 작업에서 더 빠릅니다.")
+# 즉시 추천: 유사 작업/위험 특성과 함께 쓰인 장비를 표준 데이터에서 집계해 AI 호출 없이 1단계 추천 (AI는 선택적으로 보완)
+instant_draft = st.sidebar.checkbox("📚 장비 추천은 표준 데이터로 즉시 (AI 호출 생략)", value=True,
+                                    help="유사 작업이 없으면 자동으로 AI가 추천합니다. 추천 후 'AI로 추천 보완하기'로 다듬을 수 있습니다.")
+# 빠른 생성: 1단계 추천을 그대로 쓸 때 장비 추천과 위험성평가표를 한 번의 호출로 생성
+quick_mode = st.sidebar.checkbox("⚡ 빠른 생성 (장비 추천 + 위험성평가표 한 번에)", value=False,
+                                 help="추천 장비를 거의 수정하지 않는 경우 AI 호출을 한 번 줄여 더 빨리 완성합니다. 생성 후에도 장비 목록을 수정하고 2단계를 다시 생성할 수 있습니다.")
+cache_stats = ai_cache.get_cache_stats()
+st.sidebar.caption(f"⚡ AI 응답 캐시 적중 {cache_stats['memory_hits'] + cache_stats['disk_hits']}회 · 미적중 {cache_stats['misses']}회")
+latency_ops = latency.get_latency_stats()["ops"]
+if "draft" in latency_ops or "risk_stream" in latency_ops or "combined" in latency_ops:
+    st.sidebar.caption("⏱ 응답시간 p95 · " + " · ".join(
+        f"{label} {latency_ops[op]['p95']:.1f}초" for op, label in (("draft", "1단계"), ("risk_stream", "2단계"), ("risk", "2단계(일괄)"), ("combined", "빠른 생성"))
+        if op in latency_ops))
+# 프롬프트 크기 보고는 세션별로 모음 (생성 함수에 dict를 넘겨 받아 옴)
+prompt_reports = st.session_state.setdefault("prompt_reports", {})
+if prompt_reports:
+    st.sidebar.caption("📏 프롬프트 크기 · " + " · ".join(
+        f"{label} {prompt_reports[name]['tokens']:,}토큰" + (" (참고자료 축소)" if prompt_reports[name]["trimmed"] else "")
+        for name, label in (("draft", "1단계"), ("risk", "2단계"), ("combined", "빠른 생성")) if name in prompt_reports))
+scheduler_stats = scheduler.get_scheduler_stats()
+if scheduler_stats["waits"] or scheduler_stats["retries"] or scheduler_stats["coalesced"]:
+    st.sidebar.caption(f"🚦 호출 대기 {scheduler_stats['waits']}회 · 재시도 {scheduler_stats['retries']}회 · 중복 호출 병합 {scheduler_stats['coalesced']}회")
 
 today_str = datetime.datetime.now().strftime("%Y.%m.%d")
 
@@ -58,6 +122,8 @@ with col2:
 # 세션 상태 초기화
 if "draft_generated" not in st.session_state:
     st.session_state.draft_generated = False
+if st.session_state.pop("generation_cancelled", False):
+    st.warning("⏹ 생성을 취소했습니다.")
 
 # 분석 버튼
 analyze_btn = st.button("📋 작업 정보 분석 및 장비 추천받기 (1단계)", use_container_width=True)
@@ -65,11 +131,22 @@ analyze_btn = st.button("📋 작업 정보 분석 및 장비 추천받기 (1단
 if analyze_btn:
     if not task_name:
         st.error("작업명을 입력해주세요.")
-    elif not api_key:
+    elif not api_key and llm.requires_api_key():
         st.error("API 키를 먼저 입력해주세요.")
     else:
         # 유사 작업 검색
-        matched_entry, match_score = data_handler.find_best_match(task_name, safety_index, synonym_map)
+        if library_db:
+            matched_entry, match_score = safety_db.find_best_match(library_db, task_name, synonym_map)
+        else:
+            matched_entry, match_score = data_handler.find_best_match(task_name, safety_index, synonym_map, keyword_index, name_matcher)
+        
+        # 참고 용어: 유사 작업 및 같은 작업유형에서 자주 쓰인 용어 위주로 선별
+        vocab_entry = matched_entry if (matched_entry and match_score >= 0.3) else None
+        if library_db:
+            task_vocab = safety_db.select_vocab(library_db, vocab_entry)
+        else:
+            task_vocab = data_handler.select_vocab(shared_index, vocab_entry)
+        ref_vocab_text = ai.build_ref_vocab_text(task_vocab)
         
         # 참고 데이터 텍스트 구성
         ref_data_text = ""
@@ -87,27 +164,168 @@ if analyze_btn:
         
         with st.spinner("작업 특성을 분석하여 안전 장비를 추천 중입니다... 🤖"):
             try:
-                draft_data = ai.generate_draft_equipment(
-                    api_key, task_name, location, risk_factors, risk_context_manual, ref_vocab_text, ref_data_text
-                )
+                draft_report = {}
+                # 승인된 평가 중 작업명/위치/위험 특성이 거의 같은 것이 있으면 1·2단계 AI 호출 없이 재사용
+                approved = None
+                approved_matches = [] if force_regenerate else library.find_approved(approved_db, task_name, location, risk_factors)
+                if approved_matches and approved_matches[0][1] >= library.REUSE_THRESHOLD:
+                    approved = library.load_approved(approved_db, approved_matches[0][0])
+                if approved:
+                    draft_data = {key: approved["header"].get(key, "") for key in ("protectors", "safety_equip", "tools", "docs")}
+                    draft_source = "approved"
+                elif quick_mode:
+                    # 빠른 생성: 참고 위험요인까지 미리 검색해 두고 장비 추천과 위험성평가표를 한 번에 요청
+                    quick_context = [location] + [f for f in risk_factors if "해당 없음" not in f]
+                    quick_boost_id = vocab_entry["id"] if vocab_entry else None
+                    if library_db:
+                        quick_ref_rows = safety_db.search_risks(
+                            library_db, task_name, k=6, context=quick_context, boost_entry_id=quick_boost_id)
+                    else:
+                        quick_ref_rows = search.search_risks(
+                            risk_search_index, task_name, k=6, context=quick_context, boost_entry_id=quick_boost_id)
+                    combined = ui.run_cancellable(
+                        lambda cancel_event: ai.generate_combined(
+                            api_key, task_name, location, risk_factors, risk_context_manual,
+                            ref_vocab_text, ref_data_text, ai.build_ref_risks_text(quick_ref_rows),
+                            use_cache=not force_regenerate, cancel_event=cancel_event, repair_report=draft_report,
+                            prompt_reports=prompt_reports
+                        ),
+                        "cancel_draft"
+                    )
+                    draft_data = combined["draft"]
+                    draft_source = "ai"
+                else:
+                    draft_data = None
+                    if instant_draft:
+                        if library_db:
+                            recommender = safety_db.load_recommender(library_db)
+                            top_matches = safety_db.find_top_matches(library_db, task_name, synonym_map, k=5)
+                        else:
+                            recommender = shared_index["recommender"]
+                            top_matches = data_handler.find_top_matches(task_name, safety_index, synonym_map, keyword_index, k=5, name_matcher=name_matcher)
+                        draft_data = recommend.recommend_equipment(recommender, top_matches, risk_factors)
+                    draft_source = "local" if draft_data else "ai"
+                if draft_data is None:
+                    draft_data = ui.run_cancellable(
+                        lambda cancel_event: ai.generate_draft_equipment(
+                            api_key, task_name, location, risk_factors, risk_context_manual, ref_vocab_text, ref_data_text,
+                            use_cache=not force_regenerate, cancel_event=cancel_event, repair_report=draft_report,
+                            prompt_reports=prompt_reports
+                        ),
+                        "cancel_draft"
+                    )
                 
                 st.session_state.draft_data = draft_data
-                st.session_state.matched_entry = matched_entry if (matched_entry and match_score >= 0.3) else None
+                st.session_state.draft_source = draft_source
+                st.session_state.ref_data_text = ref_data_text
+                st.session_state.approved_task = approved["header"].get("task_name", "") if approved else ""
+                # 새 초안이 나왔으므로 이전 초안 기준의 선행 생성은 폐기하고 새로 시작
+                prefetch.discard_prefetch(st.session_state.get('prefetch'))
+                st.session_state.prefetch = None
+                st.session_state.ref_vocab_text = ref_vocab_text
+                # 항목 id는 재인덱싱 때 바뀌므로 경로만 저장하고 rerun마다 현재 인덱스에서 다시 찾음
+                st.session_state.matched_path = matched_entry["path"] if (matched_entry and match_score >= 0.3) else None
                 st.session_state.draft_generated = True
                 
-                if matched_entry and match_score >= 0.3:
+                if draft_source == "approved":
+                    st.success(f"✅ 승인된 평가 **{approved['header'].get('task_name', '')}**(유사도 {approved_matches[0][1]:.0%})를 불러왔습니다. AI를 호출하지 않았습니다.")
+                elif draft_source == "local":
+                    st.success(f"📚 유사 작업 **{matched_entry['name']}** 등 표준 데이터에서 함께 쓰인 장비를 바로 추천했습니다.")
+                elif matched_entry and match_score >= 0.3:
                     st.success(f"📂 유사 작업 **{matched_entry['name']}**을 참고하여 AI가 **{task_name}**에 맞게 추천했습니다.")
                 else:
                     st.info("🤖 AI가 작업 내용을 분석하여 추천했습니다.")
+                ui.show_repair_report(draft_report)
+
+                if approved:
+                    approved_items = {key: data_handler.clean_item_list(data_handler.parse_to_list(draft_data.get(key, "")))
+                                      for key in ("protectors", "safety_equip", "tools", "docs")}
+                    df = pd.DataFrame(approved["rows"])
+                    df["위험성"] = df["빈도"] * df["강도"]
+                    df["등급"] = df["위험성"].apply(lambda x: "🔴 상" if x>=6 else ("🟡 중" if x>=3 else "🟢 하"))
+                    st.session_state.result_df = df
+                    st.session_state.generation_args = (
+                        task_name, location, risk_factors, risk_context_manual, approved_items["protectors"],
+                        approved_items["safety_equip"], approved_items["tools"], approved_items["docs"], ref_vocab_text)
+                    st.session_state.prefetch = False
+                    st.info("다른 내용으로 새로 만들려면 사이드바의 '저장된 AI 응답 대신 새로 생성'을 선택한 뒤 다시 분석하세요.")
+                elif quick_mode:
+                    # 추천 장비 기준으로 작성 규칙 검사 후 결과표까지 채움 (2단계 선행 생성은 필요 없음)
+                    quick_items = {key: data_handler.clean_item_list(data_handler.parse_to_list(draft_data.get(key, "")))
+                                   for key in ("protectors", "safety_equip", "tools", "docs")}
+                    validation_report = {}
+                    data = ui.run_cancellable(
+                        lambda cancel_event: ai.complete_risk_rows(
+                            api_key, combined["rows"], task_name, location, risk_factors, risk_context_manual,
+                            quick_items["protectors"], quick_items["safety_equip"], quick_items["tools"], quick_items["docs"],
+                            ref_vocab_text, quick_ref_rows,
+                            use_cache=not force_regenerate, cancel_event=cancel_event, validation_report=validation_report
+                        ),
+                        "cancel_fix"
+                    )
+                    df = pd.DataFrame(data)
+                    df["위험성"] = df["빈도"] * df["강도"]
+                    df["등급"] = df["위험성"].apply(lambda x: "🔴 상" if x>=6 else ("🟡 중" if x>=3 else "🟢 하"))
+                    st.session_state.result_df = df
+                    st.session_state.generation_args = (
+                        task_name, location, risk_factors, risk_context_manual, quick_items["protectors"],
+                        quick_items["safety_equip"], quick_items["tools"], quick_items["docs"], ref_vocab_text)
+                    st.session_state.prefetch = False
+                    st.success("⚡ 빠른 생성 완료! 장비 목록을 수정했다면 아래에서 2단계를 다시 생성하세요.")
+                    ui.show_validation_report(validation_report)
             except Exception as e:
                 st.error(f"분석 실패: {e}")
 
 # 2단계: 추천 결과 확인 및 수정
 if st.session_state.draft_generated:
     st.markdown("### 2. 추천 장비 및 준비물 확인 (수정 가능)")
-    matched = st.session_state.get('matched_entry')
-    if matched:
-        st.success(f"📂 유사 작업 **{matched.get('name', '')}** 참고 — AI가 **{task_name}**에 맞게 추천한 결과입니다. 수정 가능합니다.")
+    matched_path = st.session_state.get('matched_path')
+    if not matched_path:
+        matched_entry = None
+    elif library_db:
+        matched_entry = safety_db.find_unit_work(library_db, matched_path)
+    else:
+        matched_entry = data_handler.find_entry(safety_index, matched_path)
+    if st.session_state.get('draft_source') == "approved":
+        st.success(f"✅ 승인된 평가 **{st.session_state.get('approved_task', '')}**의 장비와 위험성평가표를 그대로 불러왔습니다. 수정 가능합니다.")
+    elif st.session_state.get('draft_source') == "local":
+        col_src, col_refine = st.columns([4, 1])
+        with col_src:
+            st.success(f"📚 유사 작업 **{matched_entry['name'] if matched_entry else ''}** 등 표준 데이터 기반 추천입니다. 수정 가능합니다.")
+        with col_refine:
+            refine_btn = st.button("🤖 AI로 추천 보완하기", use_container_width=True, key="btn_refine_draft")
+        if refine_btn:
+            # 표준 데이터 추천을 참고 자료로 넘겨 작업명에 맞게 AI가 다듬음
+            local_draft = st.session_state.draft_data
+            refine_ref_text = st.session_state.get('ref_data_text', '') + f"""
+                [참고: 표준 데이터에서 함께 쓰인 장비 (1차 추천)]
+                - 보호구: {local_draft.get('protectors', '')}
+                - 안전장비: {local_draft.get('safety_equip', '')}
+                - 공구/장비: {local_draft.get('tools', '')}
+                - 준비자료: {local_draft.get('docs', '')}
+            """
+            refine_vocab_text = st.session_state.get('ref_vocab_text', '')
+            refine_report = {}
+            with st.spinner("AI가 추천을 보완하고 있습니다... 🤖"):
+                try:
+                    refined = ui.run_cancellable(
+                        lambda cancel_event: ai.generate_draft_equipment(
+                            api_key, task_name, location, risk_factors, risk_context_manual, refine_vocab_text, refine_ref_text,
+                            use_cache=not force_regenerate, cancel_event=cancel_event, repair_report=refine_report,
+                            prompt_reports=prompt_reports
+                        ),
+                        "cancel_draft"
+                    )
+                except Exception as e:
+                    st.error(f"AI 보완 실패: {e}")
+                else:
+                    st.session_state.draft_data = refined
+                    st.session_state.draft_source = "ai"
+                    prefetch.discard_prefetch(st.session_state.get('prefetch'))
+                    st.session_state.prefetch = None
+                    st.rerun()
+    elif matched_entry:
+        st.success(f"📂 유사 작업 **{matched_entry['name']}** 참고 — AI가 **{task_name}**에 맞게 추천한 결과입니다. 수정 가능합니다.")
     else:
         st.info("🤖 AI가 추천한 내용입니다. 현장 상황에 맞게 수정하세요.")
     
@@ -184,38 +402,118 @@ if st.session_state.draft_generated:
         approver_name = st.text_input("성명", value="현장소장", key="approver_name", label_visibility="collapsed")
         approver_date_str = st.text_input("승인일", value=datetime.date.today().strftime("%Y.%m.%d"), key="approver_date")
 
+    # 참고할 위험성평가 데이터 구성 (작업명 + 위치/위험 특성으로 전체 표준 데이터의 위험요인 행 중 관련도 높은 행 검색, BM25)
+    ref_vocab_text = st.session_state.get('ref_vocab_text', '')
+    risk_context = [location] + [f for f in risk_factors if "해당 없음" not in f]
+    boost_entry_id = matched_entry["id"] if matched_entry else None
+    if library_db:
+        ref_risk_rows = safety_db.search_risks(
+            library_db, task_name, k=6, context=risk_context, boost_entry_id=boost_entry_id)
+    else:
+        ref_risk_rows = search.search_risks(
+            risk_search_index, task_name, k=6, context=risk_context, boost_entry_id=boost_entry_id)
+    ref_risks_text = ai.build_ref_risks_text(ref_risk_rows)
+
+    # 2단계 선행 생성: 1단계 직후(추천 기본값 그대로) 한 번만 백그라운드에서 시작
+    stage2_args = (api_key, task_name, location, risk_factors, risk_context_manual,
+                   protectors, safety_equip, tools, materials, ref_vocab_text, ref_risks_text)
+    prefetch_key = prefetch.make_prefetch_key(stage2_args[1:], parallel_steps, force_regenerate)
+    if st.session_state.get('prefetch') is None:
+        stage2_fn = ai.generate_risk_assessment_parallel if parallel_steps else ai.generate_risk_assessment
+        prefetch_report = {}
+        prefetch_prompt_reports = {}  # 선행 생성 결과를 실제로 쓸 때만 세션 보고에 합침
+        st.session_state.prefetch = prefetch.start_prefetch(prefetch_key, stage2_fn, *stage2_args, use_cache=not force_regenerate,
+                                                            repair_report=prefetch_report, prompt_reports=prefetch_prompt_reports)
+        st.session_state.prefetch["repair_report"] = prefetch_report
+        st.session_state.prefetch["prompt_reports"] = prefetch_prompt_reports
+    elif st.session_state.prefetch and st.session_state.prefetch["key"] != prefetch_key:
+        # 목록/입력을 수정했으면 선행 생성 결과는 쓰지 않음
+        prefetch.discard_prefetch(st.session_state.prefetch)
+        st.session_state.prefetch = False
+
     st.markdown("---")
     generate_final_btn = st.button("🚀 위험성평가표 최종 생성하기 (2단계)", use_container_width=True)
 
     if generate_final_btn:
+        # 미리보기: 유사 작업의 표준 위험요인으로 즉시 임시 표를 보여 주고, AI 결과가 오면 교체 (AI 실패 시 대체용)
+        preview_entry = matched_entry
+        if library_db and matched_entry:
+            preview_entry = safety_db.load_unit_work(library_db, matched_entry["id"], with_risks=True)
+        preview_rows = preview.build_preview_rows(preview_entry, ref_risk_rows, protectors)
+        stream_box = st.empty()
+        if preview_rows:
+            with stream_box.container():
+                st.caption("👀 표준 데이터로 만든 미리보기입니다. AI 생성이 끝나면 자동으로 바뀝니다.")
+                st.dataframe(pd.DataFrame(preview_rows), use_container_width=True, hide_index=True)
         with st.spinner("최종 위험성평가표를 생성하고 있습니다... 🛡️"):
             try:
-                # 참고할 위험성평가 데이터 구성
-                ref_risks_text = ""
-                matched_entry = st.session_state.get('matched_entry')
-                if matched_entry:
-                    ref_risks_text = ''.join([
-                        chr(10) + '                [참고: 표준 데이터의 유사 작업 위험성평가 예시 - 아래 내용을 참고하여 비슷한 톤과 표현으로 작성하세요]' + chr(10) +
-                        chr(10).join([
-                            f"                - 단계: {r.get('step','')}, 위험요인: {r.get('factor','')}, 대책: {r.get('measure','')}"
-                            for r in matched_entry.get('risks', [])[:6]
-                        ])
-                    ])
-
-                data = ai.generate_risk_assessment(
-                    api_key, task_name, location, risk_factors, risk_context_manual,
-                    protectors, safety_equip, tools, materials, ref_vocab_text, ref_risks_text
+                # 값을 바꾸지 않았으면 백그라운드에서 미리 생성해 둔 결과 사용
+                prefetch_handle = st.session_state.get('prefetch')
+                st.session_state.prefetch = False
+                data = ui.run_cancellable(
+                    lambda cancel_event: prefetch.take_prefetch(prefetch_handle, prefetch_key, ai.RISK_TIMEOUT_SECONDS, cancel_event),
+                    "cancel_prefetch"
+                ) if prefetch_handle else None
+                repair_report = prefetch_handle["repair_report"] if data is not None else {}
+                if data is not None:
+                    prompt_reports.update(prefetch_handle["prompt_reports"])
+                if data is None and parallel_steps:
+                    data = ui.run_cancellable(
+                        lambda cancel_event: ai.generate_risk_assessment_parallel(
+                            api_key, task_name, location, risk_factors, risk_context_manual,
+                            protectors, safety_equip, tools, materials, ref_vocab_text, ref_risks_text,
+                            use_cache=not force_regenerate, cancel_event=cancel_event, repair_report=repair_report,
+                            prompt_reports=prompt_reports
+                        ),
+                        "cancel_risk"
+                    )
+                elif data is None:
+                    # 스트리밍: 단계가 하나 완성될 때마다 미리보기 자리에 AI 결과 표를 채워 나감
+                    data = ui.stream_cancellable(
+                        lambda cancel_event: ai.stream_risk_assessment(
+                            api_key, task_name, location, risk_factors, risk_context_manual,
+                            protectors, safety_equip, tools, materials, ref_vocab_text, ref_risks_text,
+                            use_cache=not force_regenerate, cancel_event=cancel_event, repair_report=repair_report,
+                            prompt_reports=prompt_reports
+                        ),
+                        "cancel_risk",
+                        lambda rows: stream_box.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+                    )
+                stream_box.empty()
+
+                # 작성 규칙 검사: 점수/대책 개수/보호구 행 등은 바로 보정하고, 고칠 수 없는 부분만 다시 요청
+                validation_report = {}
+                data = ui.run_cancellable(
+                    lambda cancel_event: ai.complete_risk_rows(
+                        api_key, data, task_name, location, risk_factors, risk_context_manual,
+                        protectors, safety_equip, tools, materials, ref_vocab_text, ref_risk_rows,
+                        use_cache=not force_regenerate, cancel_event=cancel_event, validation_report=validation_report
+                    ),
+                    "cancel_fix"
                 )
-                
+
                 df = pd.DataFrame(data)
                 df["위험성"] = df["빈도"] * df["강도"]
                 df["등급"] = df["위험성"].apply(lambda x: "🔴 상" if x>=6 else ("🟡 중" if x>=3 else "🟢 하"))
                 
                 st.session_state.result_df = df
+                # 부분 재생성 때 같은 작업 정보를 쓰도록 보관 (api_key, 참고 위험요인 제외)
+                st.session_state.generation_args = stage2_args[1:10]
                 st.success("최종 생성 완료! 아래 결과를 확인하세요.")
+                ui.show_repair_report(repair_report)
+                ui.show_validation_report(validation_report)
 
             except Exception as e:
+                stream_box.empty()
                 st.error(f"생성 중 오류 발생: {e}")
+                if preview_rows:
+                    # AI가 느리거나 응답하지 않을 때도 표준 데이터 기반 표로 작업을 이어갈 수 있게 함
+                    df = pd.DataFrame(preview_rows)
+                    df["위험성"] = df["빈도"] * df["강도"]
+                    df["등급"] = df["위험성"].apply(lambda x: "🔴 상" if x>=6 else ("🟡 중" if x>=3 else "🟢 하"))
+                    st.session_state.result_df = df
+                    st.session_state.generation_args = stage2_args[1:10]
+                    st.warning("⚠️ AI 대신 표준 데이터로 만든 미리보기 표를 넣었습니다. 현장에 맞게 수정한 뒤 사용하거나 다시 생성하세요.")
 
 if 'result_df' in st.session_state:
     st.divider()
@@ -235,11 +533,18 @@ if 'result_df' in st.session_state:
         
         # 작업단계 별로 그룹화
         grouped_by_step = current_df.groupby('단계', sort=False)
+        regenerate_target = None  # (단계, 위험요인, 위젯 키 이름) - 위험요인이 None이면 단계 전체 다시 생성
         
         for step_name, step_group in grouped_by_step:
             with st.expander(f"📁 {step_name}", expanded=True):
                 # 단계 이름 수정 기능
-                new_step_name = st.text_input("현재 그룹 단계명 수정", value=step_name, key=f"step_rename_{step_name}")
+                col_step_name, col_step_regen = st.columns([8.8, 1.2])
+                new_step_name = col_step_name.text_input("현재 그룹 단계명 수정", value=step_name, key=f"step_rename_{step_name}")
+                col_step_regen.markdown("<br>", unsafe_allow_html=True)
+                if col_step_regen.button("🔄 단계 다시 생성", key=f"btn_regen_step_{step_name}", use_container_width=True,
+                                         help="이 단계의 위험요인과 대책만 AI로 다시 작성합니다. 다른 단계의 수정 내용은 그대로 유지됩니다."):
+                    # 위젯 키는 이번 화면을 그릴 때의 (수정 전) 단계/위험요인 이름으로 만들어졌으므로 그 이름을 함께 기록
+                    regenerate_target = (new_step_name, None, [(step_name, f) for f in step_group['위험요인'].unique()])
                 
                 # 다시 위험요인 별로 그룹화
                 grouped_by_factor = step_group.groupby('위험요인', sort=False)
@@ -285,7 +590,11 @@ if 'result_df' in st.session_state:
                         )
                         
                         # 명시적인 행 추가/삭제 버튼 제공
-                        _, add_col, del_col = st.columns([7.6, 1.2, 1.2])
+                        _, regen_col, add_col, del_col = st.columns([6.4, 1.2, 1.2, 1.2])
+                        
+                        if regen_col.button("다시 생성", key=f"btn_regen_{step_name}_{factor_name}", use_container_width=True,
+                                            help="이 위험요인만 AI로 다시 작성합니다."):
+                            regenerate_target = (new_step_name, new_factor_name, [(step_name, factor_name)])
                         
                         if add_col.button("추가", key=f"btn_add_{step_name}_{factor_name}", use_container_width=True):
                             # 새 빈 행 추가 
@@ -319,6 +628,32 @@ if 'result_df' in st.session_state:
         if updated_data_frames:
             st.session_state.result_df = pd.concat(updated_data_frames, ignore_index=True)
             
+            # 부분 재생성: 지금까지의 수정 내용을 반영한 표에서 해당 단계/위험요인만 새로 생성해 같은 위치에 끼워 넣음
+            if regenerate_target and st.session_state.get('generation_args'):
+                regen_step, regen_factor, widget_names = regenerate_target
+                with st.spinner(f"'{regen_factor or regen_step}' 부분을 다시 생성하고 있습니다... 🔄"):
+                    try:
+                        current_rows = st.session_state.result_df.to_dict("records")
+                        generation_args = st.session_state.generation_args
+                        new_rows = ui.run_cancellable(
+                            lambda cancel_event: ai.regenerate_rows(
+                                api_key, current_rows, regen_step, regen_factor, *generation_args,
+                                cancel_event=cancel_event
+                            ),
+                            "cancel_regen"
+                        )
+                        df = pd.DataFrame(validator.splice_rows(current_rows, new_rows, regen_step, regen_factor))
+                        df["위험성"] = df["빈도"] * df["강도"]
+                        df["등급"] = df["위험성"].apply(lambda x: "🔴 상" if x>=6 else ("🟡 중" if x>=3 else "🟢 하"))
+                        st.session_state.result_df = df
+                        # 다시 생성한 부분의 위젯 상태는 버려서 새 값이 보이게 함 (수정 전 이름으로 만든 키)
+                        for widget_step, widget_factor in widget_names:
+                            for prefix in ("editor_", "freq_", "sev_", "factor_rename_"):
+                                st.session_state.pop(f"{prefix}{widget_step}_{widget_factor}", None)
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"다시 생성 중 오류 발생: {e}")
+            
             # 명시적 버튼(추가/삭제)이 눌린 경우, widget state 오류 방지를 위해 에디터 세션을 날리고 새로고침
             if st.session_state.get('needs_rerun', False):
                 st.session_state['needs_rerun'] = False
@@ -330,6 +665,18 @@ if 'result_df' in st.session_state:
     # A4 출력 로직
     st.divider()
     st.markdown("### 📋 위험성평가 결과 (A4 출력용)")
+    # 확정한 평가를 저장해 두면 다음에 비슷한 작업을 입력할 때 AI 호출 없이 바로 불러옴
+    if st.button("✅ 이 평가표를 승인 목록에 저장 (다음에 같은 작업은 바로 불러오기)", key="btn_save_approved"):
+        try:
+            library.save_approved(approved_db, {
+                "task_name": task_name, "location": location, "risk_factors": risk_factors,
+                "risk_context_manual": risk_context_manual, "site_name": site_name,
+                "protectors": ', '.join(protectors), "safety_equip": ', '.join(safety_equip),
+                "tools": ', '.join(tools), "docs": ', '.join(materials),
+            }, st.session_state.result_df.to_dict("records"))
+            st.success(f"✅ **{task_name}** 평가표를 승인 목록에 저장했습니다.")
+        except Exception as e:
+            st.error(f"저장 실패: {e}")
     
     df = st.session_state.result_df.copy()
     
@@ -0,0 +1,100 @@
+import copy
+import json
+import os
+
+import numpy as np
+import pytest
+
+from modules import safety_data_handler as data_handler
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), data_handler.DATA_PATH)
+
+
+@pytest.fixture(scope="module")
+def data():
+    with open(DATA_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _comparable(value):
+    if isinstance(value, np.ndarray):
+        return ("ndarray", value.dtype.str, value.tolist())
+    if isinstance(value, dict):
+        return {k: _comparable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_comparable(v) for v in value]
+    return value
+
+
+def assert_same_index(incremental, full):
+    assert set(incremental) == set(full)
+    for key in full:
+        if key == "keyword_index":
+            assert {kw: sorted(ids) for kw, ids in incremental[key].items()} == \
+                   {kw: sorted(ids) for kw, ids in full[key].items()}
+        else:
+            assert _comparable(incremental[key]) == _comparable(full[key]), key
+
+
+def _reload(data, new_data):
+    previous = data_handler.compile_safety_index(data)
+    return data_handler.update_compiled_index(previous, new_data), data_handler.compile_safety_index(new_data)
+
+
+def test_reorder_divisions_matches_full_compile(data):
+    reordered = dict(reversed(list(data.items())))
+    incremental, full = _reload(data, reordered)
+    assert_same_index(incremental, full)
+
+
+def test_reorder_unit_works_matches_full_compile(data):
+    reordered = copy.deepcopy(data)
+    division = next(iter(reordered))
+    reordered[division] = dict(reversed(list(reordered[division].items())))
+    incremental, full = _reload(data, reordered)
+    assert_same_index(incremental, full)
+
+
+def test_add_unit_work_matches_full_compile(data):
+    changed = copy.deepcopy(data)
+    division = next(iter(changed))
+    template = next(iter(changed[division].values()))
+    items = list(changed[division].items())
+    items.insert(1, ("(0) 신규 가설 울타리 설치", dict(copy.deepcopy(template), tools="지게차, 카고크레인")))
+    changed[division] = dict(items)
+    incremental, full = _reload(data, changed)
+    assert_same_index(incremental, full)
+
+
+def test_remove_unit_work_matches_full_compile(data):
+    changed = copy.deepcopy(data)
+    division = next(iter(changed))
+    del changed[division][next(iter(changed[division]))]
+    incremental, full = _reload(data, changed)
+    assert_same_index(incremental, full)
+
+
+def _best_match_name(compiled, task_name):
+    entry, _ = data_handler.find_best_match(
+        task_name, compiled["entries"], compiled["synonym_map"], compiled["keyword_index"], compiled["name_matcher"])
+    return entry["name"]
+
+
+def test_reordered_reload_keeps_positional_structures_in_sync(data):
+    reordered = dict(reversed(list(data.items())))
+    incremental, full = _reload(data, reordered)
+    assert _best_match_name(incremental, "콘크리트 타설") == _best_match_name(full, "콘크리트 타설")
+    for row in incremental["risk_search"]["rows"]:
+        assert incremental["entries"][row["entry_id"]]["name"] == row["entry_name"]
+    assert incremental["recommender"]["entry_work_types"] == [e["work_type"] for e in incremental["entries"]]
+
+
+def test_entry_is_found_by_path_after_reload_changes_ids(data):
+    previous = data_handler.compile_safety_index(data)
+    entry = previous["entries"][0]
+    reordered = dict(reversed(list(data.items())))
+    reloaded = data_handler.update_compiled_index(previous, reordered)
+    found = data_handler.find_entry(reloaded["entries"], entry["path"])
+    assert found["id"] != entry["id"]
+    assert (found["name"], found["data"]) == (entry["name"], entry["data"])
+    assert data_handler.find_entry(reloaded["entries"], "없는 > 경로") is None
@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+from modules import safety_ai as ai
+from modules import safety_latency as latency
+
+STEPS = ["1) 작업준비", "2) 설치", "3) 정리"]
+
+
+def test_parallel_steps_fail_fast_and_cancel_the_rest(monkeypatch):
+    started, cancelled = [], []
+
+    def fake_generate(api_key, prompt, parse, use_cache=True, op="generate", deadline=None, cancel_event=None,
+                      report=None, generation_config=None):
+        if op == "plan":
+            return list(STEPS)
+        step = next(s for s in STEPS if f"'{s}' 단계의 행만" in prompt)
+        started.append(step)
+        if step == "2) 설치":
+            raise RuntimeError("단계 실패")
+        # 나머지 단계는 취소될 때까지 응답하지 않음
+        if cancel_event.wait(10):
+            cancelled.append(step)
+            raise latency.GenerationCancelled("취소")
+        return []
+
+    monkeypatch.setattr(ai, "_generate", fake_generate)
+    begin = time.monotonic()
+    with pytest.raises(RuntimeError):
+        ai.generate_risk_assessment_parallel("", "비계 설치", "", [], "", "", "", "", "", "", "", max_workers=3)
+    assert time.monotonic() - begin < 5
+    # 시작된 다른 단계는 모두 취소되고, 시작 전이던 단계는 실행되지 않음
+    deadline = time.monotonic() + 5
+    while len(cancelled) < len(started) - 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(cancelled) == sorted(s for s in started if s != "2) 설치")
+
+
+def _regenerate(monkeypatch, response_rows, step, factor):
+    monkeypatch.setattr(ai, "_generate", lambda *args, **kwargs: [dict(row) for row in response_rows])
+    return ai.regenerate_rows("", [], step, factor, "비계 설치", "", [], "", ["안전모"], "", "", "", "")
+
+
+def test_regenerating_the_prep_step_keeps_the_ppe_row(monkeypatch):
+    response = [{"단계": "1) 작업준비", "위험요인": "자재 반입 중 낙하", "대책": "- a", "빈도": 1, "강도": 2},
+                {"단계": "1) 작업준비", "위험요인": "자재 반입 중 낙하", "대책": "- b", "빈도": 1, "강도": 2}]
+    rows = _regenerate(monkeypatch, response, "1) 작업준비", None)
+    assert rows[0]["위험요인"] == ai.validator.PPE_FACTOR
+    rows = _regenerate(monkeypatch, response, "2) 설치", None)
+    assert {row["위험요인"] for row in rows} == {"자재 반입 중 낙하"}
+
+
+def test_regenerating_a_factor_without_a_named_factor_raises(monkeypatch):
+    response = [{"단계": "2) 설치", "위험요인": "", "대책": "- a", "빈도": 1, "강도": 2}]
+    with pytest.raises(ValueError):
+        _regenerate(monkeypatch, response, "2) 설치", "추락")
+
+
+COMBINED_RESPONSE = (
+    '```json\n{"equipment": {"protectors": "안전모, 안전화", "safety_equip": "라바콘", "tools": "지게차", "docs": "작업계획서"},'
+    ' "risks": [{"n": "1) 작업준비", "r": [{"h": "보호구 미착용", "l": 2, "s": 2, "t": ["- 보호구 착용 확인", "복장 점검"]}]},'
+    ' {"n": "2) 하역", "r": [{"h": "자재 낙하", "l": 2, "s": 3, "t": ["하부 통제", "결속 확인", "신호수 배치"]}]}]}\n```'
+)
+
+
+def test_parse_combined_returns_draft_and_rows_per_measure():
+    result = ai.parse_combined(COMBINED_RESPONSE)
+    assert result["draft"]["tools"] == "지게차"
+    assert [(r["단계"], r["위험요인"], r["대책"]) for r in result["rows"]] == [
+        ("1) 작업준비", "보호구 미착용", "- 보호구 착용 확인"), ("1) 작업준비", "보호구 미착용", "- 복장 점검"),
+        ("2) 하역", "자재 낙하", "- 하부 통제"), ("2) 하역", "자재 낙하", "- 결속 확인"), ("2) 하역", "자재 낙하", "- 신호수 배치")]
+
+
+def test_parse_combined_keeps_rows_before_a_truncation():
+    report = {}
+    result = ai.parse_combined(COMBINED_RESPONSE[:COMBINED_RESPONSE.index('"결속 확인"')], report)
+    assert [r["대책"] for r in result["rows"]] == ["- 보호구 착용 확인", "- 복장 점검", "- 하부 통제"]
+    assert report["dropped"]
+
+
+@pytest.mark.parametrize("text", [
+    '{"equipment": {"protectors": "안전모"}}',
+    '{"risks": [{"n": "1) 작업준비", "r": [{"h": "추락", "l": 1, "s": 2, "t": ["a"]}]}]}',
+    '{"equipment": {"protectors": "안전모"}, "risks": []}',
+])
+def test_parse_combined_rejects_incomplete_responses(text):
+    with pytest.raises(ValueError):
+        ai.parse_combined(text)
+
+
+def test_combined_prompt_includes_the_reference_vocab_once():
+    vocab_text = ai.build_ref_vocab_text({"protectors": ["안전모"], "tools": ["지게차"]})
+    prompt = ai.build_combined_prompt("자재 하역", "야적장", [], "", vocab_text, "", "")
+    assert prompt.count("[현장 표준 용어 참고") == 1
+    assert '"equipment"' in prompt and '"risks"' in prompt
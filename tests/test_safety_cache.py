@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import types
+from collections import OrderedDict
+
+import pytest
+
+from modules import safety_cache as cache
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    """임시 디스크 캐시 + 직접 움직이는 시계"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(cache, "DISK_CACHE_PATH", os.path.join(str(tmp_path), "responses.db"))
+    monkeypatch.setattr(cache, "_disk_ready", False)
+    monkeypatch.setattr(cache, "_memory", OrderedDict())
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def _disk_keys():
+    conn = sqlite3.connect(cache.DISK_CACHE_PATH)
+    try:
+        return {row[0] for row in conn.execute("SELECT key FROM responses")}
+    finally:
+        conn.close()
+
+
+def test_cache_key_ignores_whitespace_but_not_config():
+    key = cache.make_cache_key("m", "  작업명:  비계\n\n  규칙 ")
+    assert key == cache.make_cache_key("m", "작업명: 비계\n규칙")
+    assert key != cache.make_cache_key("m", "작업명: 비계\n규칙", {"temperature": 0.2})
+    assert key != cache.make_cache_key("other", "작업명: 비계\n규칙")
+
+
+def test_memory_lru_evicts_least_recently_used(clock, monkeypatch):
+    monkeypatch.setattr(cache, "MEMORY_CACHE_SIZE", 2)
+    cache.store_response("a", "A")
+    cache.store_response("b", "B")
+    assert cache.get_cached_response("a") == "A"
+    cache.store_response("c", "C")
+    assert list(cache._memory) == ["a", "c"]
+    # 메모리에서 밀려나도 디스크에서 다시 읽어 옴
+    assert cache.get_cached_response("b") == "B"
+
+
+def test_expired_entries_are_not_returned(clock):
+    cache.store_response("a", "A")
+    clock[0] += cache.DISK_CACHE_TTL_SECONDS + 1
+    assert cache.get_cached_response("a") is None
+    assert "a" not in cache._memory
+    cache.store_response("b", "B")
+    assert _disk_keys() == {"b"}
+
+
+def test_disk_size_cap_drops_least_recently_accessed(clock, monkeypatch):
+    monkeypatch.setattr(cache, "DISK_CACHE_MAX_BYTES", 25)
+    for key in ("a", "b"):
+        cache.store_response(key, "x" * 10)
+        clock[0] += 1
+    cache._memory.clear()
+    assert cache.get_cached_response("a") is not None  # a를 최근에 읽었으므로 b가 먼저 삭제됨
+    clock[0] += 1
+    cache.store_response("c", "x" * 10)
+    assert _disk_keys() == {"a", "c"}
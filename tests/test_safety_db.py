@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from modules import safety_data_handler as data_handler
+from modules import safety_db
+from modules import safety_search as search
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), data_handler.DATA_PATH)
+
+
+@pytest.fixture(scope="module")
+def library(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp("db") / "safety.db")
+    safety_db.import_library(DATA_FILE, db_path)
+    return db_path, data_handler.load_compiled_index(DATA_FILE)
+
+
+@pytest.mark.parametrize("task_name", ["비게 해체", "외부비계해체", "콘크리트 타설", "크래인 조립", "배관 용접 작업"])
+def test_top_matches_equal_in_memory_index(library, task_name):
+    db_path, compiled = library
+    expected = data_handler.find_top_matches(
+        task_name, compiled["entries"], compiled["synonym_map"], compiled["keyword_index"], k=5,
+        name_matcher=compiled["name_matcher"])
+    actual = safety_db.find_top_matches(db_path, task_name, safety_db.load_synonym_map(db_path), k=5)
+    assert [(e["name"], round(s, 6)) for e, s in actual] == [(e["name"], round(s, 6)) for e, s in expected]
+
+
+def test_connection_is_reopened_after_the_file_is_replaced(library, tmp_path):
+    db_path = str(tmp_path / "swap.db")
+    safety_db.import_library(DATA_FILE, db_path)
+    first = safety_db.connect(db_path)
+    assert safety_db.connect(db_path) is first
+    safety_db.import_library(DATA_FILE, db_path)
+    second = safety_db.connect(db_path)
+    assert second is not first
+    assert second.execute("SELECT COUNT(*) FROM unit_works").fetchone()[0] > 0
+
+
+def test_unit_work_is_found_by_path(library):
+    db_path, compiled = library
+    entry = compiled["entries"][3]
+    found = safety_db.find_unit_work(db_path, entry["path"], with_risks=True)
+    assert (found["name"], found["data"]) == (entry["name"], entry["data"])
+    assert len(found["risks"]) == len(entry["risks"])
+    assert safety_db.find_unit_work(db_path, "없는 > 경로") is None
+
+
+def test_fuzzy_match_reads_only_the_query_grams(library):
+    db_path, compiled = library
+    expected = search.fuzzy_match(compiled["name_matcher"], "비게 해체", k=10)
+    actual = safety_db.fuzzy_match_units(db_path, "비게 해체", k=10)
+    assert [(i, round(s, 6)) for i, s in actual] == [(i, round(s, 6)) for i, s in expected]
@@ -0,0 +1,70 @@
+from modules import safety_json
+
+
+def test_unquoted_korean_word_drops_only_that_row():
+    rows, report = safety_json.repair_json_array('[{"a": 1}, {"b": 2, 설명}, {"c":3}]')
+    assert rows == [{"a": 1}, {"c": 3}]
+    assert report["recovered"] == 2
+    assert len(report["dropped"]) == 1
+
+
+def test_stream_keeps_rows_around_bad_object():
+    chunks = ['```json\n[{"a": 1}, {"b": 2, 설', '명}, {"c": True,}]\n```']
+    report = safety_json.new_report()
+    assert list(safety_json.iter_array_objects(chunks, report)) == [{"a": 1}, {"c": True}]
+    assert report["repaired"] == 1
+    assert len(report["dropped"]) == 1
+
+
+def test_trailing_comma_and_python_literals_are_repaired():
+    rows, report = safety_json.repair_json_array('[{"a": None, "b": [1, 2,],}, ]')
+    assert rows == [{"a": None, "b": [1, 2]}]
+    assert report["repaired"] == 1
+
+
+def test_truncated_array_keeps_complete_rows():
+    rows, report = safety_json.repair_json_array('[{"a": 1}, {"b": 2}, {"c": "잘린')
+    assert rows == [{"a": 1}, {"b": 2}]
+    assert report["dropped"][0]["reason"] == "응답이 중간에 끊긴 행"
+
+
+def test_brackets_inside_strings_are_not_structure():
+    rows, _ = safety_json.repair_json_array('[{"a": "x } ] {"}, {"b": "\\"q\\""}]')
+    assert rows == [{"a": "x } ] {"}, {"b": '"q"'}]
+
+
+def test_object_with_korean_bare_word_raises_value_error():
+    try:
+        safety_json.repair_json_object('{"a": 1, 설명}')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_truncated_object_keeps_complete_keys():
+    obj, report = safety_json.repair_json_object('{"protectors": "안전모", "tools": "지게')
+    assert obj == {"protectors": "안전모", "tools": "지게"}
+    assert report["dropped"]
+
+
+def test_nested_items_stream_before_their_row_closes():
+    text = '[{"n": "1) 준비", "r": [{"h": "a ]", "t": ["m"]}, {"h": "b"}]}, {"r": [{"h": "c"}], "n": "2"}, {"단계": "3"}]'
+    received = []
+
+    def chunks():
+        for ch in text:
+            received.append(ch)
+            yield ch
+
+    items = []
+    for head, item in safety_json.iter_nested_objects(chunks(), "r"):
+        items.append((head, item, len(received)))
+    assert [(head, item) for head, item, _ in items] == [
+        ({"n": "1) 준비"}, {"h": "a ]", "t": ["m"]}),
+        ({"n": "1) 준비"}, {"h": "b"}),
+        (None, {"r": [{"h": "c"}], "n": "2"}),
+        (None, {"단계": "3"}),
+    ]
+    # 첫 항목은 단계 객체가 닫히기 전에 나옴
+    assert items[0][2] < text.index('}]}')
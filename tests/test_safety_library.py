@@ -0,0 +1,39 @@
+import pytest
+
+from modules import safety_library as library
+
+ROWS = [{"단계": "1) 작업준비", "위험요인": "보호구 미착용", "대책": "- 착용 확인", "빈도": 1, "강도": 2}]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "approved.db")
+    library.save_approved(path, {"task_name": "외부 비계 해체 작업", "location": "A동 외벽",
+                                 "risk_factors": ["고소작업 (추락 위험)"]}, ROWS)
+    return path
+
+
+def _score(db_path, task_name, location="", risk_factors=()):
+    return library.find_approved(db_path, task_name, location, risk_factors)[0][1]
+
+
+def test_spacing_and_generic_suffix_do_not_lower_similarity(db_path):
+    assert _score(db_path, "외부비계 해체", "A동 외벽", ["고소작업 (추락 위험)"]) >= library.REUSE_THRESHOLD
+
+
+def test_one_word_difference_stays_below_the_reuse_threshold(db_path):
+    assert _score(db_path, "내부 비계 해체 작업", "A동 외벽", ["고소작업 (추락 위험)"]) < library.REUSE_THRESHOLD
+    assert _score(db_path, "외부 비계 설치 작업", "A동 외벽", ["고소작업 (추락 위험)"]) < library.REUSE_THRESHOLD
+
+
+def test_missing_location_is_not_compared(db_path):
+    assert _score(db_path, "외부 비계 해체 작업", "", ["고소작업 (추락 위험)"]) == pytest.approx(1.0)
+
+
+def test_reuse_does_not_rebuild_the_summaries(db_path):
+    approved_id = library.find_approved(db_path, "외부 비계 해체")[0][0]
+    summaries = library._load_summaries(db_path)
+    assert library.load_approved(db_path, approved_id)["rows"] == ROWS
+    assert library._load_summaries(db_path) is summaries
+    library.save_approved(db_path, {"task_name": "거푸집 설치"}, ROWS)
+    assert library.count_approved(db_path) == 2
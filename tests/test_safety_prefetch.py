@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from modules import safety_latency as latency
+from modules import safety_prefetch as prefetch
+
+
+def _job(result, started=None, release=None, cancel_event=None):
+    if started is not None:
+        started.set()
+    if release is not None:
+        while not release.is_set():
+            if cancel_event.is_set():
+                raise latency.GenerationCancelled("취소")
+            time.sleep(0.01)
+    return result
+
+
+def test_same_key_returns_the_prefetched_result():
+    key = prefetch.make_prefetch_key(["작업"], False)
+    handle = prefetch.start_prefetch(key, _job, "결과")
+    assert prefetch.take_prefetch(handle, key, timeout=5) == "결과"
+
+
+def test_key_mismatch_discards_and_cancels_the_running_job():
+    started, release = threading.Event(), threading.Event()
+    handle = prefetch.start_prefetch("old", _job, "결과", started, release)
+    started.wait(5)
+    assert prefetch.take_prefetch(handle, "new") is None
+    assert handle["cancel_event"].is_set()
+    with pytest.raises(latency.GenerationCancelled):
+        handle["future"].result(timeout=5)
+
+
+def test_discard_sets_the_cancel_event():
+    started, release = threading.Event(), threading.Event()
+    handle = prefetch.start_prefetch("key", _job, "결과", started, release)
+    started.wait(5)
+    prefetch.discard_prefetch(handle)
+    with pytest.raises(latency.GenerationCancelled):
+        handle["future"].result(timeout=5)
+
+
+def test_waiting_for_a_running_prefetch_honours_cancel():
+    started, release = threading.Event(), threading.Event()
+    handle = prefetch.start_prefetch("key", _job, "결과", started, release)
+    started.wait(5)
+    cancel_event = threading.Event()
+    threading.Timer(0.2, cancel_event.set).start()
+    with pytest.raises(latency.GenerationCancelled):
+        prefetch.take_prefetch(handle, "key", timeout=5, cancel_event=cancel_event)
+    assert handle["cancel_event"].is_set()
+
+
+def test_queued_prefetch_is_dropped_instead_of_waited_for():
+    release = threading.Event()
+    blockers = [prefetch.start_prefetch("busy", _job, None, None, release) for _ in range(prefetch.PREFETCH_MAX_WORKERS)]
+    handle = prefetch.start_prefetch("key", _job, "결과")
+    try:
+        assert prefetch.take_prefetch(handle, "key") is None
+        assert handle["future"].cancelled()
+    finally:
+        release.set()
+        for blocker in blockers:
+            blocker["future"].result(timeout=5)
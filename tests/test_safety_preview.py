@@ -0,0 +1,50 @@
+from modules import safety_preview as preview
+from modules import safety_validate as validator
+
+ENTRY = {"risks": [
+    {"step": "1) 작업준비", "factor": "작업 전 점검 미흡 [관련 사고이력] 2019 추락", "measure": "- 점검표 작성 - 작업 전 TBM 실시"},
+    {"step": "2) 하역", "factor": "자재 낙하", "measure": "- 하부 통제\n- 결속 확인\n- 신호수 배치"},
+]}
+REF_ROWS = ([{"step": "2) 하역", "factor": "자재 낙하", "measure": "- 중복 대책"}]
+            + [{"step": "2) 하역", "factor": f"참고 위험 {i}", "measure": "- 대책 가 - 대책 나"} for i in range(20)])
+
+
+def _factors(rows):
+    factors = []
+    for row in rows:
+        if row["위험요인"] not in factors:
+            factors.append(row["위험요인"])
+    return factors
+
+
+def test_split_measures_accepts_both_layouts():
+    assert preview.split_measures("- 하부 통제\n- 결속 확인") == ["하부 통제", "결속 확인"]
+    assert preview.split_measures("- 점검표 작성 - 작업 전 TBM 실시") == ["점검표 작성", "작업 전 TBM 실시"]
+
+
+def test_risk_to_row_strips_accident_history_and_scores_by_measure_count():
+    row = preview.risk_to_row(ENTRY["risks"][0])
+    assert row["위험요인"] == "작업 전 점검 미흡"
+    assert (row["빈도"], row["강도"]) == preview.default_scores(2)
+    assert preview.risk_to_row(ENTRY["risks"][1])["대책"] == "- 하부 통제\n- 결속 확인\n- 신호수 배치"
+
+
+def test_preview_fills_up_to_min_factors_from_reference_rows():
+    rows = preview.build_preview_rows(ENTRY, REF_ROWS, ["안전모", "안전화"])
+    factors = _factors(rows)
+    assert len(factors) >= validator.MIN_FACTORS
+    assert factors[1:3] == ["작업 전 점검 미흡", "자재 낙하"]
+    # 표준 데이터에 이미 있는 위험요인은 참고 행으로 다시 넣지 않음
+    assert "- 중복 대책" not in [row["대책"] for row in rows]
+    assert all("\n" not in row["대책"] for row in rows)
+
+
+def test_preview_starts_with_the_ppe_row():
+    rows = preview.build_preview_rows(ENTRY, REF_ROWS, ["안전모", "안전화"])
+    assert rows[0]["단계"] == "1) 작업준비"
+    assert rows[0]["대책"] == "- 작업 전 안전모, 안전화 착용 상태 확인"
+
+
+def test_preview_is_empty_without_any_reference():
+    assert preview.build_preview_rows(None, []) == []
+    assert preview.build_preview_rows({"risks": []}, None) == []
@@ -0,0 +1,55 @@
+from modules import safety_ai as ai
+from modules import safety_prompt as prompt_builder
+
+VOCAB = {
+    "protectors": ["안전모", "안전화", "안전장갑", "보안경", "방진마스크", "귀마개"],
+    "safety_equip": ["라바콘", "신호봉"],
+    "tools": ["지게차", "카고트럭", "크레인", "고소작업대", "굴착기"],
+    "docs": ["작업계획서"],
+}
+
+
+def _category_terms(text):
+    return {line.split(':')[0].strip(): [t.strip() for t in line.split(':', 1)[1].split(',') if t.strip()]
+            for line in text.split('\n') if line.strip().startswith('-')}
+
+
+def test_per_category_trim_keeps_every_category():
+    text = ai.build_ref_vocab_text(VOCAB)
+    limit = prompt_builder.count_tokens(text) - 15
+    trimmed = prompt_builder._trim_lines(text, limit, per_category=True)
+    terms = _category_terms(trimmed)
+    assert prompt_builder.count_tokens(trimmed) <= limit
+    assert len(terms) == 4 and all(terms.values())
+    # 뒤쪽(우선순위가 낮은) 용어부터 빠짐
+    assert terms["- 보호구 용어"] == VOCAB["protectors"][:len(terms["- 보호구 용어"])]
+    assert terms["- 준비자료 용어"] == ["작업계획서"]
+
+
+def test_plain_trim_drops_trailing_lines():
+    text = "[참고]\n- 1번 항목\n- 2번 항목\n- 3번 항목"
+    trimmed = prompt_builder._trim_lines(text, prompt_builder.count_tokens("[참고]\n- 1번 항목"))
+    assert trimmed == "[참고]\n- 1번 항목"
+    assert prompt_builder._trim_lines(text, 1) == ''
+
+
+def test_build_prompt_trims_low_priority_first_and_records_report():
+    reports = {}
+    vocab_text = ai.build_ref_vocab_text(VOCAB)
+    sections = [
+        prompt_builder.section("task", "작업명: 자재 하역"),
+        prompt_builder.section("ref_vocab", vocab_text, 2, per_category=True),
+        prompt_builder.section("ref_risks", "[예시]\n- 낙하 위험\n- 협착 위험\n- 전도 위험", 1),
+    ]
+    full = sum(prompt_builder.count_tokens(sec["text"]) for sec in sections)
+    prompt, report = prompt_builder.build_prompt("risk", sections, full - 5, reports)
+    assert reports == {"risk": report}
+    assert report["trimmed"] == ["ref_risks"]
+    assert "작업명: 자재 하역" in prompt and vocab_text in prompt
+
+
+def test_build_prompt_never_trims_required_sections():
+    sections = [prompt_builder.section("task", "작업명: 자재 하역 " * 20)]
+    prompt, report = prompt_builder.build_prompt("draft", sections, 5)
+    assert prompt == sections[0]["text"]
+    assert report["trimmed"] == []
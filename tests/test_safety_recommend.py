@@ -0,0 +1,30 @@
+from modules import safety_recommend as recommend
+
+
+def test_items_follow_the_equipment_prompt_rules():
+    assert recommend.normalize_item("CCTV 2대") == "CCTV"
+    assert recommend.normalize_item("안전Belt") == "전체식 안전벨트"
+    assert recommend.normalize_item("안전대(전체식)") == "전체식 안전벨트"
+    assert recommend.normalize_item("작업허가서") == "안전작업 허가서"
+    for item in ("수공구", "공기구", "스패너 등 공기구 및 수공구", "슬링벨트", "용접봉", "100톤"):
+        assert recommend.normalize_item(item) == ""
+    assert recommend.normalize_item("전동공기구") == "전동공기구"
+
+
+def _recommender(tools, safety_equip):
+    entry = {"id": 0, "name": "배관 설치", "work_type": "배관",
+             "data": {"tools": tools, "safety_equip": safety_equip}, "risks": []}
+    return entry, recommend.build_equipment_recommender([entry])
+
+
+def test_recommendation_drops_hand_tools_and_normalizes_names():
+    entry, recommender = _recommender("수공구, 용접기, 그라인더", "안전Belt, CCTV 2대, 소화기")
+    draft = recommend.recommend_equipment(recommender, [(entry, 1.0)])
+    assert draft["tools"] == "그라인더, 용접기"
+    assert draft["safety_equip"] == "CCTV, 전체식 안전벨트"
+
+
+def test_fire_extinguisher_only_for_hot_work():
+    entry, recommender = _recommender("용접기", "소화기")
+    draft = recommend.recommend_equipment(recommender, [(entry, 1.0)], ["화기작업 (화재/폭발)"])
+    assert draft["safety_equip"] == "소화기"
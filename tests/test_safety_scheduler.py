@@ -0,0 +1,157 @@
+import threading
+import time
+
+import pytest
+
+from modules import safety_latency as latency
+from modules import safety_scheduler as scheduler
+
+
+class Busy(Exception):
+    code = 429
+
+
+@pytest.fixture(autouse=True)
+def long_backoff(monkeypatch):
+    # 재시도 대기가 항상 최대값이 되도록 고정
+    monkeypatch.setattr(scheduler.random, "uniform", lambda low, high: high)
+    monkeypatch.setattr(scheduler, "BACKOFF_BASE_SECONDS", 30.0)
+
+
+def _always_busy():
+    raise Busy()
+
+
+def test_backoff_stops_at_the_deadline():
+    deadline = time.monotonic() + 0.2
+    check = lambda: latency.check_deadline("test", deadline)
+    started = time.monotonic()
+    with pytest.raises(latency.DeadlineExceeded):
+        scheduler.call("backoff-deadline", _always_busy, check, deadline)
+    assert time.monotonic() - started < 2
+
+
+def test_backoff_wakes_up_on_cancel():
+    cancel_event = threading.Event()
+    check = lambda: latency.check_deadline("test", None, cancel_event)
+    threading.Timer(0.2, cancel_event.set).start()
+    started = time.monotonic()
+    with pytest.raises(latency.GenerationCancelled):
+        scheduler.call("backoff-cancel", _always_busy, check, cancel_event=cancel_event)
+    assert time.monotonic() - started < 2
+
+
+def test_stalled_stream_hits_the_deadline():
+    release = threading.Event()
+
+    def stalled():
+        yield "첫 조각"
+        release.wait(5)
+        yield "늦은 조각"
+
+    received = []
+    started = time.monotonic()
+    with pytest.raises(latency.DeadlineExceeded):
+        for text in latency.iter_with_deadline(scheduler.stream(stalled), "test", time.monotonic() + 0.3):
+            received.append(text)
+    release.set()
+    assert received == ["첫 조각"]
+    assert time.monotonic() - started < 2
+
+
+def _wait_for_coalesced(before):
+    limit = time.monotonic() + 2
+    while scheduler.get_scheduler_stats()["coalesced"] == before and time.monotonic() < limit:
+        time.sleep(0.01)
+
+
+def _run_leader_and_follower(key, leader_fn):
+    """리더가 leader_fn 실행 중일 때 같은 key로 팔로워가 들어오게 한 뒤 두 결과(또는 예외)를 반환"""
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return leader_fn()
+
+    outcomes = {}
+
+    def run(name):
+        try:
+            outcomes[name] = scheduler.call(key, fn)
+        except Exception as e:
+            outcomes[name] = e
+
+    before = scheduler.get_scheduler_stats()["coalesced"]
+    leader = threading.Thread(target=run, args=("leader",))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=run, args=("follower",))
+    follower.start()
+    _wait_for_coalesced(before)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    return calls, outcomes
+
+
+def test_same_key_calls_share_one_upstream_call():
+    calls, outcomes = _run_leader_and_follower("single-flight", lambda: "응답")
+    assert len(calls) == 1
+    assert outcomes == {"leader": "응답", "follower": "응답"}
+    assert "single-flight" not in scheduler._inflight
+
+
+def test_followers_receive_the_leaders_exception():
+    def fail():
+        raise ValueError("실패")
+
+    calls, outcomes = _run_leader_and_follower("single-flight-error", fail)
+    assert len(calls) == 1
+    assert outcomes["follower"] is outcomes["leader"]
+    assert isinstance(outcomes["leader"], ValueError)
+
+
+def test_follower_can_cancel_without_stopping_the_leader():
+    release = threading.Event()
+    leader = threading.Thread(target=scheduler.call, args=("single-flight-cancel", lambda: release.wait(5)))
+    leader.start()
+    while "single-flight-cancel" not in scheduler._inflight:
+        time.sleep(0.01)
+    cancel_event = threading.Event()
+    cancel_event.set()
+    with pytest.raises(latency.GenerationCancelled):
+        scheduler.call("single-flight-cancel", lambda: None, lambda: latency.check_deadline("test", None, cancel_event))
+    assert leader.is_alive()
+    release.set()
+    leader.join(5)
+
+
+def test_retryable_errors_are_retried_with_backoff(monkeypatch):
+    monkeypatch.setattr(scheduler.random, "uniform", lambda low, high: 0.0)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise Busy()
+        return "성공"
+
+    before = scheduler.get_scheduler_stats()["retries"]
+    assert scheduler.call("retry-then-succeed", flaky) == "성공"
+    assert len(attempts) == 3
+    assert scheduler.get_scheduler_stats()["retries"] - before == 2
+
+
+def test_non_retryable_errors_fail_immediately():
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise ValueError("잘못된 요청")
+
+    with pytest.raises(ValueError):
+        scheduler.call("no-retry", broken)
+    assert len(attempts) == 1
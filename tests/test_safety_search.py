@@ -0,0 +1,101 @@
+import json
+import os
+
+import pytest
+
+from modules import safety_data_handler as data_handler
+from modules import safety_db
+from modules import safety_search as search
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), data_handler.DATA_PATH)
+
+# 첫 단위작업은 같은 위험요인의 대책 행이 후보 수(k*4)보다 많아 중복 제거 뒤 후보가 모자라는 경우
+DATA = {
+    "가설공사": {
+        "(1) 비계 해체": {
+            "protectors": "안전모",
+            "risks": [{"step": "본작업: 비계 해체", "factor": "비계 해체 중 추락 위험", "measure": f"비계 해체 전 안전대 체결 확인 {i}"}
+                      for i in range(40)],
+        },
+        "(2) 비계 설치": {
+            "protectors": "안전모",
+            "risks": [
+                {"step": "본작업: 비계 설치", "factor": "비계 자재 낙하 위험", "measure": "비계 해체 구간 하부 통제"},
+                {"step": "본작업: 비계 설치", "factor": "비계 전도 위험", "measure": "비계 해체 순서 준수"},
+                {"step": "작업종료", "factor": "용접 불꽃 화재", "measure": "소화기 비치"},
+            ],
+        },
+    },
+}
+
+
+@pytest.fixture(scope="module")
+def risk_index():
+    entries = [data_handler.build_entry(path, node, i, {}, "")
+               for i, (path, node) in enumerate(data_handler.iter_unit_works(DATA))]
+    return search.build_risk_search_index(entries)
+
+
+@pytest.fixture(scope="module")
+def library(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("search")
+    json_path = directory / "safety_data.json"
+    json_path.write_text(json.dumps(DATA, ensure_ascii=False), encoding="utf-8")
+    db_path = str(directory / "safety.db")
+    safety_db.import_library(str(json_path), db_path)
+    return db_path
+
+
+def test_search_returns_k_distinct_factors_past_duplicate_rows(risk_index):
+    results = search.search_risks(risk_index, "비계 해체", k=3)
+    assert len(results) == 3
+    assert results[0]["factor"] == "비계 해체 중 추락 위험"
+    assert len({r["factor"] for r in results}) == 3
+
+
+def test_search_ranks_by_score_and_skips_unrelated_rows(risk_index):
+    results = search.search_risks(risk_index, "비계 해체", k=10)
+    assert "용접 불꽃 화재" not in [r["factor"] for r in results]
+    assert [r["score"] for r in results] == sorted((r["score"] for r in results), reverse=True)
+
+
+def test_boost_moves_the_matched_entry_up(risk_index):
+    plain = search.search_risks(risk_index, "비계 전도", k=3)
+    boosted = search.search_risks(risk_index, "비계 전도", k=3, boost_entry_id=0, boost=10.0)
+    assert [r["entry_id"] for r in plain] == [1, 1, 0]
+    assert [r["entry_id"] for r in boosted] == [1, 0, 1]
+    assert boosted[1]["score"] == pytest.approx(plain[2]["score"] * 10.0, rel=1e-5)
+
+
+def test_sqlite_search_returns_k_distinct_factors_past_duplicate_rows(library):
+    results = safety_db.search_risks(library, "비계 해체", k=3)
+    assert len(results) == 3
+    assert len({r["factor"] for r in results}) == 3
+
+
+@pytest.fixture(scope="module")
+def compiled():
+    return data_handler.load_compiled_index(DATA_FILE)
+
+
+@pytest.mark.parametrize("task_name", ["비게 해체", "비계해체", "외부비계 해체"])
+def test_fuzzy_match_tolerates_spacing_and_typos(compiled, task_name):
+    entry_id, similarity = search.fuzzy_match(compiled["name_matcher"], task_name, k=1)[0]
+    assert compiled["entries"][entry_id]["name"] == "(4) 비계 설치/ 해체"
+    assert similarity >= data_handler.FUZZY_MIN_SIMILARITY
+
+
+def _top_names(compiled, task_name):
+    return [entry["name"] for entry, _ in data_handler.find_top_matches(
+        task_name, compiled["entries"], compiled["synonym_map"], compiled["keyword_index"], k=5,
+        name_matcher=compiled["name_matcher"])]
+
+
+def test_fuzzy_matches_below_threshold_are_dropped(compiled, monkeypatch):
+    weak = [(i, s) for i, s in search.fuzzy_match(compiled["name_matcher"], "회의록 작성", k=5)
+            if s < data_handler.FUZZY_MIN_SIMILARITY]
+    assert weak
+    names = _top_names(compiled, "회의록 작성")
+    assert not {compiled["entries"][i]["name"] for i, _ in weak} & set(names)
+    monkeypatch.setattr(data_handler, "FUZZY_MIN_SIMILARITY", 0.5)
+    assert _top_names(compiled, "회의록 작성") == []
@@ -0,0 +1,83 @@
+from modules import safety_validate as validator
+
+
+def _rows(step, factor, measures, frequency=1, severity=2):
+    return [{"단계": step, "위험요인": factor, "대책": m, "빈도": frequency, "강도": severity} for m in measures]
+
+
+TABLE = (_rows("1) 작업준비", "보호구 미착용", ["- a", "- b"])
+         + _rows("2) 설치", "추락", ["- c", "- d"])
+         + _rows("2) 설치", "낙하", ["- e", "- f"])
+         + _rows("3) 정리", "전도", ["- g", "- h"]))
+
+
+def test_splice_rows_replaces_a_factor_in_place():
+    new = _rows("2) 설치", "추락 (새로 작성)", ["- x", "- y"])
+    result = validator.splice_rows(TABLE, new, "2) 설치", "추락")
+    assert [(r["위험요인"], r["대책"]) for r in result] == [
+        ("보호구 미착용", "- a"), ("보호구 미착용", "- b"),
+        ("추락 (새로 작성)", "- x"), ("추락 (새로 작성)", "- y"),
+        ("낙하", "- e"), ("낙하", "- f"), ("전도", "- g"), ("전도", "- h")]
+
+
+def test_splice_rows_replaces_a_whole_step_in_place():
+    new = _rows("2) 설치", "협착", ["- z", "- w"])
+    result = validator.splice_rows(TABLE, new, "2) 설치")
+    assert [r["위험요인"] for r in result] == ["보호구 미착용"] * 2 + ["협착"] * 2 + ["전도"] * 2
+
+
+def test_splice_rows_appends_an_unknown_target():
+    new = _rows("4) 작업종료", "정리 미흡", ["- z"])
+    result = validator.splice_rows(TABLE, new, "4) 작업종료")
+    assert result[-1]["위험요인"] == "정리 미흡" and len(result) == len(TABLE) + 1
+
+
+def test_normalize_rows_restores_the_ppe_row_for_the_prep_step():
+    rows, report = validator.normalize_rows(_rows("1) 작업준비", "자재 낙하", ["- a", "- b"]),
+                                            protectors=["안전모"], ppe_row=True)
+    assert rows[0]["위험요인"] == validator.PPE_FACTOR
+    assert "안전모" in rows[0]["대책"]
+    assert report["fixed"]
+
+
+def test_added_ppe_row_uses_the_prompt_wording():
+    rows, _ = validator.validate_and_fix(_rows("1) 작업준비", "자재 낙하", ["- a", "- b"]))
+    ppe = [row["대책"] for row in rows if row["위험요인"] == validator.PPE_FACTOR]
+    assert any(validator.SAFETY_BELT in measure for measure in ppe)
+    assert not any("안전대" in measure for measure in ppe)
+
+
+def test_scores_are_clipped_and_capped():
+    rows, report = validator.validate_and_fix(_rows("1) 작업준비", "보호구 미착용", ["- a", "- b"])
+                                              + _rows("2) 설치", "추락", ["- c", "- d", "- e", "- f"], 7, 9))
+    fall = [row for row in rows if row["위험요인"] == "추락"]
+    assert {(row["빈도"], row["강도"]) for row in fall} == {(2, 4)}
+    assert any("점수 범위" in line for line in report["fixed"])
+
+
+def test_misplaced_ppe_row_moves_to_the_front():
+    rows, report = validator.validate_and_fix(_rows("1) 작업준비", "자재 낙하", ["- a", "- b"])
+                                              + _rows("1) 작업준비", "보호구 미착용", ["- c", "- d"]))
+    assert rows[0]["위험요인"] == "보호구 미착용"
+    assert any("이동" in line for line in report["fixed"])
+
+
+def test_excess_measures_are_trimmed_and_missing_ones_padded():
+    reference = [{"factor": "자재 낙하 위험", "measure": "- 낙하물 방지망 설치\n- 하부 출입 통제"}]
+    rows, report = validator.validate_and_fix(
+        _rows("1) 작업준비", "보호구 미착용", ["- a", "- b", "- c", "- d"])
+        + _rows("2) 설치", "자재 낙하", ["- e"], 1, 3), reference)
+    assert [row["대책"] for row in rows if row["위험요인"] == "보호구 미착용"] == ["- a", "- b"]
+    assert [row["대책"] for row in rows if row["위험요인"] == "자재 낙하"] == ["- e", "- 낙하물 방지망 설치", "- 하부 출입 통제"]
+    assert report["unfixed"][0]["rule"] == "factor_count"
+
+
+def test_too_many_factors_are_dropped_from_the_largest_step():
+    rows = _rows("1) 작업준비", "보호구 미착용", ["- a", "- b"])
+    for i in range(validator.MAX_FACTORS + 2):
+        rows += _rows("2) 설치", f"위험 {i}", ["- x", "- y"])
+    fixed, report = validator.validate_and_fix(rows)
+    names = list(dict.fromkeys(row["위험요인"] for row in fixed))
+    assert len(names) == validator.MAX_FACTORS
+    assert names[0] == "보호구 미착용"
+    assert report["unfixed"] == []
@@ -0,0 +1,31 @@
+import threading
+
+import pytest
+
+from modules import safety_data_handler as data_handler
+
+
+@pytest.fixture
+def fresh_index(monkeypatch):
+    monkeypatch.setattr(data_handler, "_shared_index", None)
+    monkeypatch.setattr(data_handler, "_index_stats", dict.fromkeys(data_handler._index_stats, 0))
+    monkeypatch.setattr(data_handler, "load_compiled_index", lambda path: {"entries": [{"id": 0, "name": "비계"}]})
+
+
+def test_shared_index_is_loaded_once_and_frozen(fresh_index):
+    first = data_handler.get_safety_index()
+    assert data_handler.get_safety_index() is first
+    with pytest.raises(TypeError):
+        first["entries"] = []
+    stats = data_handler.get_index_stats()
+    assert (stats["loads"], stats["hits"]) == (1, 1)
+
+
+def test_concurrent_hits_are_all_counted(fresh_index):
+    data_handler.get_safety_index()
+    threads = [threading.Thread(target=lambda: [data_handler.get_safety_index() for _ in range(500)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert data_handler.get_index_stats()["hits"] == 8 * 500